@@ -1,19 +1,35 @@
 import sys
 import pandas as pd
 import pendulum
-import requests
-from requests_kerberos import HTTPKerberosAuth, OPTIONAL
 from urllib3 import disable_warnings
 import os
 import subprocess
 import time
 from bs4 import BeautifulSoup
 from tabulate import tabulate
+import re
 import json
 import traceback
 import logging
-
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from typing import Dict, List, NamedTuple, Optional
+
+from monitor_channel import channel
+from http_cassette import recorder
+from http_client import Session, current_deadline, http_settings, start_cycle
+from history_store import HistoryRow, HistoryStore
+from monitor_clock import clock
+from monitor_config import load_config, get_setting
+from monitor_logging import setup_logging
+from negotiate_auth import NegotiateAuth, negotiated_hosts
+from sampling_profiler import profile_command
+from heap_snapshots import heap_command, start_tracking_from_config
+from parse_cache import ParseCache
+from report_diff import ReportDiff, diff_tables
+from report_scheduler import ReportScheduler, parse_quarters, quarter_timetable
+from tracing import span, start_span
+
+# Webhook posts share one session so connections are reused between reports
+webhook_session = Session('send')
 
 # Universal column index map for all tables
 STANDARD_INDEX_MAP = {
@@ -63,9 +79,13 @@ class FCLM:
 
     def authenticate(self):
         self.cookie = self.mw_cookie()
-        self.session = requests.Session()
+        if getattr(self, 'session', None) is not None:
+            # Re-authenticating before a quarter; the old session's pooled connections go with it
+            self.session.close()
+        self.session = Session('fetch', hedge=True)
+        recorder.attach(self.session)
         self.session.cookies.update(self.cookie)
-        self.session.auth = HTTPKerberosAuth(mutual_authentication=OPTIONAL)
+        self.session.auth = NegotiateAuth()
         self.session.verify = False
 
         try:
@@ -74,9 +94,9 @@ class FCLM:
                 self.reset_mw_cookie()
                 self.session.cookies.update(self.cookie)
                 response = self.session.get("https://fclm-portal.amazon.com/reports/functionRollup")
-            print("Authenticated to FCLM portal")
+            logging.info("Authenticated to FCLM portal")
         except Exception as e:
-            print(f"Failed to authenticate to FCLM portal: {e}")
+            logging.error(f"Failed to authenticate to FCLM portal: {e}")
             raise
 
     def reset_mw_cookie(self, flags: list = None):
@@ -93,7 +113,7 @@ class FCLM:
             os.remove(cookie)
 
         if not os.path.exists(cookie):
-            print("Running mwinit for authentication...")
+            logging.info("Running mwinit for authentication...")
             subprocess.run(["mwinit"] + flags, check=True)
 
         with open(cookie, "rt") as c:
@@ -103,7 +123,7 @@ class FCLM:
         now = time.time()
         for line in range(4, len(cookie_file)):
             if int(cookie_file[line].split("\t")[4]) < now:
-                print("Cookie expired, refreshing...")
+                logging.info("Cookie expired, refreshing...")
                 subprocess.run(["mwinit"] + flags, check=True)
                 return self.mw_cookie(flags=flags)
             cookies[cookie_file[line].split("\t")[5]] = str.replace(
@@ -125,22 +145,27 @@ class FCLM:
             "maxIntradayDays": 2
         }
         logging.info(f"Fetching data for process_id: {process_id}")
-        logging.info(f"Parameters: {params}")
+        logging.debug(f"Parameters: {params}")
 
+        channel.heartbeat('fetch')
         try:
-            response = self.session.get("https://fclm-portal.amazon.com/reports/functionRollup", params=params)
-            response.raise_for_status()
+            with channel.timed('fclm_fetch_seconds', failure_metric='fclm_fetch_failures_total', process_id=process_id), \
+                    span('fetch', process_id=process_id) as fetch_span:
+                response = self.session.get("https://fclm-portal.amazon.com/reports/functionRollup", params=params)
+                response.raise_for_status()
+                fetch_span.set(bytes=len(response.content))
             logging.info(f"Successfully fetched data. Response length: {len(response.text)}")
             return response.text
         except Exception as e:
             logging.error(f"Failed to fetch HTML data: {e}")
             return None
 
-def parse_receive_html_data(html_content):
+def parse_rate_rows(html_content, table_id, table_name):
+    """Unrounded per-associate rows for one function table, or None if the table is missing"""
     soup = BeautifulSoup(html_content, 'html.parser')
-    table = soup.find('table', {'id': lambda x: x and x.startswith('function-4300006787')})
+    table = soup.find('table', {'id': table_id})
     if not table:
-        logging.warning("Table not found in HTML content for Receive ProblemSolve")
+        logging.warning(f"Table not found in HTML content for {table_name}")
         return None
 
     data = []
@@ -152,12 +177,30 @@ def parse_receive_html_data(html_content):
             if name and not name.replace(',', '').replace('.', '').isdigit():
                 row_data = build_dynamic_row(cells, employee_id, name, STANDARD_INDEX_MAP)
                 data.append(row_data)
-
-    if not data:
-        logging.warning("No valid data found for Receive ProblemSolve")
+    return data
+
+def merge_rate_rows(base_rows, delta_rows):
+    """Add the rows of a later time slice onto earlier ones, matching associates by Employee ID"""
+    merged = {row['Employee ID']: dict(row) for row in base_rows}
+    for row in delta_rows:
+        existing = merged.get(row['Employee ID'])
+        if existing is None:
+            merged[row['Employee ID']] = dict(row)
+            continue
+        for key, value in row.items():
+            if key not in ('Employee ID', 'Name', 'Rate'):
+                existing[key] = existing.get(key, 0) + value
+    for row in merged.values():
+        row['Rate'] = row['Grand Total'] / row['Paid Hours'] if row['Paid Hours'] > 0 else 0
+    return list(merged.values())
+
+def rates_frame(rows, table_name):
+    """Sorted, rounded report table for parsed rows"""
+    if not rows:
+        logging.warning(f"No valid data found for {table_name}")
         return None
 
-    df = pd.DataFrame(data)
+    df = pd.DataFrame(rows)
     df = df.sort_values('Rate', ascending=False)
     df['Grand Total'] = df['Grand Total'].round(0)
     df['Paid Hours'] = df['Paid Hours'].round(2)
@@ -165,90 +208,23 @@ def parse_receive_html_data(html_content):
     result_columns = ['Employee ID', 'Name', 'Grand Total', 'Paid Hours', 'Rate']
     return df[result_columns]
 
-def parse_stow_psolve_html_data(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    table = soup.find('table', {'id': 'function-4300035067'})
-    if not table:
-        logging.warning("Table not found in HTML content for Stow Psolve Backlog")
-        return None
+# The receive table id carries a suffix; a regex (unlike a lambda) can be sent to parse worker processes
+RECEIVE_TABLE_ID = re.compile(r'^function-4300006787')
+STOW_PSOLVE_TABLE_ID = 'function-4300035067'
+RC_SORT_PSOLVE_TABLE_ID = 'function-4300006776'
+OUTBOUND_TABLE_ID = 'function-4300006849'
 
-    data = []
-    for row in table.find_all('tr', class_='empl-all'):
-        cells = row.find_all('td')
-        if len(cells) >= 3:
-            employee_id = cells[1].text.strip()
-            name = cells[2].text.strip()
-            if name and not name.replace(',', '').replace('.', '').isdigit():
-                row_data = build_dynamic_row(cells, employee_id, name, STANDARD_INDEX_MAP)
-                data.append(row_data)
+def parse_receive_html_data(html_content):
+    return rates_frame(parse_rate_rows(html_content, RECEIVE_TABLE_ID, "Receive ProblemSolve"), "Receive ProblemSolve")
 
-    if not data:
-        logging.warning("No valid data found for Stow Psolve Backlog")
-        return None
-    df = pd.DataFrame(data)
-    df = df.sort_values('Rate', ascending=False)
-    df['Grand Total'] = df['Grand Total'].round(0)
-    df['Paid Hours'] = df['Paid Hours'].round(2)
-    df['Rate'] = df['Rate'].round(2)
-    result_columns = ['Employee ID', 'Name', 'Grand Total', 'Paid Hours', 'Rate']
-    return df[result_columns]
+def parse_stow_psolve_html_data(html_content):
+    return rates_frame(parse_rate_rows(html_content, STOW_PSOLVE_TABLE_ID, "Stow Psolve Backlog"), "Stow Psolve Backlog")
 
 def parse_rc_sort_psolve_html_data(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    table = soup.find('table', {'id': 'function-4300006776'})
-    if not table:
-        logging.warning("Table not found in HTML content for RC Sort ProblemSolve")
-        return None
-
-    data = []
-    for row in table.find_all('tr', class_='empl-all'):
-        cells = row.find_all('td')
-        if len(cells) >= 3:
-            employee_id = cells[1].text.strip()
-            name = cells[2].text.strip()
-            if name and not name.replace(',', '').replace('.', '').isdigit():
-                row_data = build_dynamic_row(cells, employee_id, name, STANDARD_INDEX_MAP)
-                data.append(row_data)
-
-    if not data:
-        logging.warning("No valid data found for RC Sort ProblemSolve")
-        return None
-    df = pd.DataFrame(data)
-    df = df.sort_values('Rate', ascending=False)
-    df['Grand Total'] = df['Grand Total'].round(0)
-    df['Paid Hours'] = df['Paid Hours'].round(2)
-    df['Rate'] = df['Rate'].round(2)
-    result_columns = ['Employee ID', 'Name', 'Grand Total', 'Paid Hours', 'Rate']
-    return df[result_columns]
+    return rates_frame(parse_rate_rows(html_content, RC_SORT_PSOLVE_TABLE_ID, "RC Sort ProblemSolve"), "RC Sort ProblemSolve")
 
 def parse_outbound_html_data(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    table = soup.find('table', {'id': 'function-4300006849'})
-    if not table:
-        logging.warning("Table not found in HTML content for TransferOut PSolve")
-        return None
-
-    data = []
-    for row in table.find_all('tr', class_='empl-all'):
-        cells = row.find_all('td')
-        if len(cells) >= 3:
-            employee_id = cells[1].text.strip()
-            name = cells[2].text.strip()
-            if name and not name.replace(',', '').replace('.', '').isdigit():
-                row_data = build_dynamic_row(cells, employee_id, name, STANDARD_INDEX_MAP)
-                data.append(row_data)
-
-    if not data:
-        logging.warning("No valid data found for TransferOut PSolve")
-        return None
-
-    df = pd.DataFrame(data)
-    df = df.sort_values('Rate', ascending=False)
-    df['Grand Total'] = df['Grand Total'].round(0)
-    df['Paid Hours'] = df['Paid Hours'].round(2)
-    df['Rate'] = df['Rate'].round(2)
-    result_columns = ['Employee ID', 'Name', 'Grand Total', 'Paid Hours', 'Rate']
-    return df[result_columns]
+    return rates_frame(parse_rate_rows(html_content, OUTBOUND_TABLE_ID, "TransferOut PSolve"), "TransferOut PSolve")
 
 def send_slack_message(workflow_url, title, metrics, footer):
     data = {
@@ -257,164 +233,270 @@ def send_slack_message(workflow_url, title, metrics, footer):
         "footer": footer,
     }
     headers = {"Content-Type": "application/json"}
-    print("Payload to be sent:")
-    print(json.dumps(data, indent=2))
-    resp = requests.post(workflow_url, json=data, headers=headers)
-    print(f"Data sent to workflow. Response status code: {resp.status_code}")
-
-def get_quarters():
-    return [
-        ("Quarter 1 Days", (7, 30), (9, 30)),
-        ("Quarter 2 Days", (9, 45), (11, 45)),
-        ("Quarter 3 Days", (12, 15), (15, 0)),
-        ("Quarter 4 Days", (15, 15), (17, 30)),
-        ("Quarter 1 Nights", (18, 30), (21, 0)),
-        ("Quarter 2 Nights", (21, 15), (23, 15)),
-        ("Quarter 3 Nights", (23, 45), (2, 30)),
-        ("Quarter 4 Nights", (2, 45), (5, 0))
-    ]
-
-def get_current_quarter(now):
-    quarters = get_quarters()
-    for quarter, start, end in quarters:
-        start_time = now.replace(hour=start[0], minute=start[1])
-        end_time = now.replace(hour=end[0], minute=end[1])
-        if start[0] > end[0]:
-            if now.hour < end[0] or (now.hour == end[0] and now.minute <= end[1]):
-                start_time = start_time.subtract(days=1)
-            else:
-                end_time = end_time.add(days=1)
-        if start_time <= now < end_time:
-            return quarter, start_time, end_time
-    return None, None, None
+    channel.heartbeat('send')
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f"Payload to be sent: {json.dumps(data, indent=2)}")
+    with channel.timed('webhook_send_seconds', failure_metric='webhook_failures_total', webhook='quarter_report'), \
+            span('send', payload_chars=len(metrics)) as send_span:
+        resp = webhook_session.post(workflow_url, json=data, headers=headers)
+        send_span.set(status=resp.status_code)
+    if resp.status_code >= 400:
+        channel.increment('webhook_failures_total', webhook='quarter_report')
+    logging.info(f"Data sent to workflow. Response status code: {resp.status_code}")
+    return resp.status_code < 400
+
+DEFAULT_QUARTERS = [
+    ("Quarter 1 Days", (7, 30), (9, 30)),
+    ("Quarter 2 Days", (9, 45), (11, 45)),
+    ("Quarter 3 Days", (12, 15), (15, 0)),
+    ("Quarter 4 Days", (15, 15), (17, 30)),
+    ("Quarter 1 Nights", (18, 30), (21, 0)),
+    ("Quarter 2 Nights", (21, 15), (23, 15)),
+    ("Quarter 3 Nights", (23, 45), (2, 30)),
+    ("Quarter 4 Nights", (2, 45), (5, 0))
+]
+
+def get_quarters(config=None):
+    entries = get_setting(config or {}, 'schedules', 'quarters', {}).get('quarters')
+    if not entries:
+        return DEFAULT_QUARTERS
+    return parse_quarters(entries)
+
+# Report sections in posting order: (process id, table, emoji, table id).
+# Sections sharing a process id are parsed from the same fetched page.
+QUARTER_REPORT_SECTIONS = [
+    ("1002980", "Receive ProblemSolve", "🟦", RECEIVE_TABLE_ID),
+    ("01002980", "Stow Psolve Backlog", "🟧", STOW_PSOLVE_TABLE_ID),
+    ("1003018", "RC Sort ProblemSolve", "🟨", RC_SORT_PSOLVE_TABLE_ID),
+    ("1003018", "TransferOut PSolve", "🟩", OUTBOUND_TABLE_ID),
+]
+
+class PrewarmedQuarter(NamedTuple):
+    cut_time: pendulum.DateTime
+    rows: Dict[str, Optional[List[Dict]]]  # table name -> unrounded rows for start..cut_time
+
+def render_rates_section(table_name, emoji, rates):
+    if rates is None or rates.empty:
+        return f"{emoji} **{table_name} Rates:** No valid data.\n\n"
+    with span('render', table=table_name) as render_span:
+        table = tabulate(
+            rates, headers='keys', tablefmt='pipe', showindex=False,
+            numalign='right', stralign='left', floatfmt=(".0f", "", ".0f", ".2f", ".2f")
+        )
+        render_span.set(chars=len(table))
+    return f"{emoji} **{table_name} Rates**\n```\n{table}\n```\n\n"
+
+parse_cache = ParseCache("WorkingRate")
+
+# Columns compared when only changes are reported (config.json report_diff)
+RATE_COLUMNS = ['Employee ID', 'Name', 'Grand Total', 'Paid Hours', 'Rate']
+DIFF_COLUMNS = ('Grand Total', 'Paid Hours', 'Rate')
+
+def display_rate_rows(rates):
+    """Rows keyed by Employee ID with values formatted as in the posted table"""
+    rows = {}
+    if rates is None:
+        return rows
+    for record in rates.to_dict('records'):
+        rows[str(record['Employee ID'])] = {
+            'Employee ID': str(record['Employee ID']),
+            'Name': record['Name'],
+            'Grand Total': f"{record['Grand Total']:.0f}",
+            'Paid Hours': f"{record['Paid Hours']:.2f}",
+            'Rate': f"{record['Rate']:.2f}",
+        }
+    return rows
+
+def render_changes_section(table_name, emoji, result):
+    if result.empty:
+        return ""
+    with span('render', table=table_name) as render_span:
+        parts = []
+        for heading, rows in diff_tables(result, RATE_COLUMNS, DIFF_COLUMNS):
+            table = tabulate(rows, headers=RATE_COLUMNS, tablefmt='pipe', disable_numparse=True)
+            parts.append(f"{heading} ({len(rows)})\n```\n{table}\n```")
+        render_span.set(chars=sum(len(part) for part in parts))
+    return f"{emoji} **{table_name} Rate Changes**\n" + "\n".join(parts) + "\n\n"
+
+def quarter_history_rows(section_rows, start_time, end_time):
+    """History store rows for every associate in the parsed quarter tables"""
+    for process_id, table_name, emoji, table_id in QUARTER_REPORT_SECTIONS:
+        for row in section_rows.get(table_name) or []:
+            yield HistoryRow(
+                "WorkingRate", process_id, None, table_name, start_time, end_time,
+                str(row['Employee ID']), row['Name'], row['Grand Total'], row['Paid Hours'], row['Rate'])
+
+def collect_section_rows(fclm, sections, start_time, end_time):
+    """Fetch each page once and parse the given sections' rows for start_time..end_time"""
+    pages = {}
+    rows = {}
+    deadline = current_deadline()
+    for process_id, table_name, emoji, table_id in sections:
+        if process_id not in pages:
+            pages[process_id] = fclm.get_html_data(process_id, start_time, end_time)
+        html = pages[process_id]
+        if not html or not deadline.allows('parse'):
+            rows[table_name] = None
+            continue
+
+        channel.heartbeat('parse')
+        with channel.timed('parse_seconds', table=table_name), span('parse', table=table_name) as parse_span:
+            # Identical pages (retries, an FCLM page that hasn't refreshed) reuse the last parse
+            rows[table_name] = parse_cache.get_or_parse(
+                (process_id, table_name), html, lambda page: parse_rate_rows(page, table_id, table_name))
+            parse_span.set(rows=len(rows[table_name] or []))
+    return rows
+
+def prewarm_quarter(fclm, quarter, start_time, cut_time):
+    """Refresh auth and fetch the quarter up to cut_time so only the tail is left for the boundary"""
+    logging.info(f"Pre-warming {quarter}: fetching {start_time} to {cut_time}")
+    with span('prewarm', quarter=quarter):
+        channel.heartbeat('fetch')
+        try:
+            # Re-reads the Midway cookie and opens a fresh authenticated connection
+            fclm.authenticate()
+        except Exception as e:
+            logging.error(f"Pre-warm authentication failed for {quarter}: {e}")
+            return None
+        return PrewarmedQuarter(cut_time, collect_section_rows(fclm, QUARTER_REPORT_SECTIONS, start_time, cut_time))
+
+def record_report_latency(quarter, end_time, slo_seconds):
+    """Report time from quarter end to Slack delivery against the latency SLO"""
+    latency = clock.time() - end_time.timestamp()
+    channel.observe('quarter_report_latency_seconds', latency)
+    if slo_seconds and latency > slo_seconds:
+        channel.increment('quarter_report_slo_misses_total')
+        logging.warning(f"{quarter} report delivered {latency:.0f}s after quarter end, over the {slo_seconds}s SLO")
+    else:
+        logging.info(f"{quarter} report delivered {latency:.0f}s after quarter end")
 
-def run_quarter(fclm, workflow_url, quarter, start_time, end_time):
+def run_quarter(fclm, workflow_url, quarter, start_time, end_time, prewarmed=None, slo_seconds=None, differ=None, history=None):
     logging.info(f"Processing {quarter} from {start_time} to {end_time}")
 
     if end_time < start_time:
         end_time = end_time.add(days=1)
 
+    cycle_span = start_span('run_quarter', quarter=quarter, prewarmed=prewarmed is not None)
+    deadline = start_cycle('quarter')
     try:
-        metrics = ""
+        if prewarmed is None:
+            section_rows = collect_section_rows(fclm, QUARTER_REPORT_SECTIONS, start_time, end_time)
+        else:
+            # Only the slice after the pre-warm cut is fetched now; it is added onto the cached rows
+            cached = [s for s in QUARTER_REPORT_SECTIONS if prewarmed.rows.get(s[1]) is not None]
+            section_rows = collect_section_rows(fclm, cached, prewarmed.cut_time, end_time)
+            for table_name, delta_rows in list(section_rows.items()):
+                if delta_rows is not None:
+                    section_rows[table_name] = merge_rate_rows(prewarmed.rows[table_name], delta_rows)
+            # Sections whose cached or tail fetch failed are fetched whole
+            missing = [s for s in QUARTER_REPORT_SECTIONS if section_rows.get(s[1]) is None]
+            if missing:
+                logging.warning(f"Fetching full quarter for {len(missing)} section(s) without pre-warmed data")
+                section_rows.update(collect_section_rows(fclm, missing, start_time, end_time))
+
+        if history is not None:
+            history.record(quarter_history_rows(section_rows, start_time, end_time))
 
-        # Receive ProblemSolve
-        receive_html = fclm.get_html_data("1002980", start_time, end_time)
-        if receive_html:
-            receive_rates = parse_receive_html_data(receive_html)
-            if receive_rates is not None and not receive_rates.empty:
-                receive_table = tabulate(
-                    receive_rates, headers='keys', tablefmt='pipe', showindex=False,
-                    numalign='right', stralign='left', floatfmt=(".0f", "", ".0f", ".2f", ".2f")
-                )
-                metrics += f"🟦 **Receive ProblemSolve Rates**\n```\n{receive_table}\n```\n\n"
-            else:
-                metrics += "🟦 **Receive ProblemSolve Rates:** No valid data.\n\n"
-
-        # Stow Psolve Backlog
-        stow_html = fclm.get_html_data("01002980", start_time, end_time)
-        if stow_html:
-            stow_rates = parse_stow_psolve_html_data(stow_html)
-            if stow_rates is not None and not stow_rates.empty:
-                stow_table = tabulate(
-                    stow_rates, headers='keys', tablefmt='pipe', showindex=False,
-                    numalign='right', stralign='left', floatfmt=(".0f", "", ".0f", ".2f", ".2f")
-                )
-                metrics += f"🟧 **Stow Psolve Backlog Rates**\n```\n{stow_table}\n```\n\n"
-            else:
-                metrics += "🟧 **Stow Psolve Backlog Rates:** No valid data.\n\n"
-
-        # RC Sort & TransferOut PSolve (BOTH from processId 1003018, different tables)
-        psolve_html = fclm.get_html_data("1003018", start_time, end_time)
-        if psolve_html:
-            # RC Sort ProblemSolve (yellow)
-            rc_sort_rates = parse_rc_sort_psolve_html_data(psolve_html)
-            if rc_sort_rates is not None and not rc_sort_rates.empty:
-                rc_sort_table = tabulate(
-                    rc_sort_rates, headers='keys', tablefmt='pipe', showindex=False,
-                    numalign='right', stralign='left', floatfmt=(".0f", "", ".0f", ".2f", ".2f")
-                )
-                metrics += f"🟨 **RC Sort ProblemSolve Rates**\n```\n{rc_sort_table}\n```\n\n"
-            else:
-                metrics += "🟨 **RC Sort ProblemSolve Rates:** No valid data.\n\n"
-
-            # TransferOut PSolve (green)
-            transferout_rates = parse_outbound_html_data(psolve_html)
-            if transferout_rates is not None and not transferout_rates.empty:
-                transferout_table = tabulate(
-                    transferout_rates, headers='keys', tablefmt='pipe', showindex=False,
-                    numalign='right', stralign='left', floatfmt=(".0f", "", ".0f", ".2f", ".2f")
-                )
-                metrics += f"🟩 **TransferOut PSolve Rates**\n```\n{transferout_table}\n```\n\n"
+        metrics = ""
+        diffs = []
+        for process_id, table_name, emoji, table_id in QUARTER_REPORT_SECTIONS:
+            rows = section_rows.get(table_name)
+            if rows is None:
+                deadline.mark_missing(table_name)
+                continue
+            rates = rates_frame(rows, table_name)
+            if differ is None:
+                metrics += render_rates_section(table_name, emoji, rates)
             else:
-                metrics += "🟩 **TransferOut PSolve Rates:** No valid data.\n\n"
-
-        title = f"PSC2 {quarter} Problem Solve Rates"
+                table_rows = display_rate_rows(rates)
+                result = differ.diff(table_name, table_rows, DIFF_COLUMNS)
+                diffs.append((table_name, table_rows, result))
+                metrics += render_changes_section(table_name, emoji, result)
+
+        # Sections that made it are posted rather than nothing, marked with what is missing
+        partial = " (partial)" if deadline.partial and metrics.strip() else ""
+        title = f"PSC2 {quarter} Problem Solve Rates{partial}"
         footer = f"Created by pucpetey for PSC2\nTime Range: {start_time.format('YYYY-MM-DD HH:mm')} to {end_time.format('YYYY-MM-DD HH:mm')}"
-
-        if metrics.strip():
+        if partial:
+            footer += f"\n{deadline.partial_note()}"
+
+        if differ is not None:
+            if not metrics.strip():
+                if not deadline.partial:
+                    logging.info(f"No rate changes for {quarter} since the last report, nothing posted")
+                    return
+                # Nothing changed in the sections that came through, but the missing ones are still announced
+                logging.warning(f"No rate changes for {quarter} in the sections fetched, reporting missing sections")
+                footer += f"\n{deadline.partial_note()}"
+                send_slack_message(workflow_url, f"PSC2 {quarter} Problem Solve Rate Changes (partial)",
+                                   f"No rate changes in the sections fetched for {quarter}", footer)
+            elif send_slack_message(workflow_url, f"PSC2 {quarter} Problem Solve Rate Changes{partial}", metrics.strip(), footer):
+                for table_name, table_rows, result in diffs:
+                    differ.commit(table_name, table_rows, result, 'Employee ID')
+        elif metrics.strip():
             send_slack_message(workflow_url, title, metrics.strip(), footer)
             logging.info("Slack message sent successfully")
         else:
             logging.warning(f"No data available for {quarter}")
             send_slack_message(workflow_url, title, f"No data available for {quarter}", footer)
             logging.info("Slack message sent (no data available)")
+        record_report_latency(quarter, end_time, slo_seconds)
 
     except Exception as e:
         error_message = f"Error processing {quarter}: {str(e)}"
+        cycle_span.set(error=error_message)
         logging.error(error_message)
         logging.error(traceback.format_exc())
         send_slack_message(workflow_url, "Error in Problem Solve Rates Script", f"```\n{error_message}\n```", "An error occurred while processing data")
         logging.info("Slack message sent (error notification)")
-
-def normal_run(fclm, workflow_url):
-    # Track quarters sent today to prevent duplicates on restart
-    quarters_sent_today = set()
-    last_notification_date = None
-    
-    while True:
-        now = pendulum.now('America/Los_Angeles')
-        current_date = now.date()
-        
-        # Reset quarters sent tracker on new day
-        if last_notification_date != current_date:
-            quarters_sent_today.clear()
-            last_notification_date = current_date
-            logging.info(f"New day detected: {current_date}. Clearing quarters sent tracker.")
-        
-        current_quarter, start_time, end_time = get_current_quarter(now)
-
-        if current_quarter is None:
-            time.sleep(30)
-            continue
-
-        if end_time < start_time:
-            end_time = end_time.add(days=1)
-
-        # Create unique quarter identifier with date and quarter name
-        quarter_id = f"{current_date}_{current_quarter}"
-        
-        time_to_wait = (end_time - now) + pendulum.duration(minutes=1)
-        if time_to_wait.total_seconds() > 0:
-            logging.info(f"Waiting {time_to_wait.total_seconds()} seconds until 1 minute after {current_quarter} ends")
-            time.sleep(time_to_wait.total_seconds())
-
-        # Only send if we haven't sent for this quarter today
-        if quarter_id not in quarters_sent_today:
-            logging.info(f"Processing {current_quarter} for {current_date} (first time today)")
-            run_quarter(fclm, workflow_url, current_quarter, start_time, end_time)
-            quarters_sent_today.add(quarter_id)
-            logging.info(f"Completed {current_quarter}. Added to sent tracker.")
-        else:
-            logging.info(f"Quarter {current_quarter} for {current_date} already processed today - skipping")
-
-        time.sleep(10)
+    finally:
+        deadline.finish()
+        cycle_span.finish()
+
+def normal_run(fclm, workflow_url, config=None):
+    # The scheduler persists the last report sent, so restarts neither duplicate
+    # a quarter nor lose one that ended while the script was down
+    config = config or {}
+    parse_cache.configure(config)
+    http_settings.configure(config)
+    settings = get_setting(config, 'schedules', 'quarters', {})
+    delay_minutes = settings.get('delay_minutes', 1)
+    prewarm_minutes = settings.get('prewarm_minutes', 5)
+    slo_seconds = settings.get('latency_slo_seconds', 120)
+    differ = ReportDiff.from_config("WorkingRate", config)
+    history = HistoryStore.from_config(config)
+
+    # With pre-warming the scheduler fires prewarm_minutes before the quarter ends
+    scheduler = ReportScheduler.from_config(
+        "WorkingRate", quarter_timetable(get_quarters(config), delay_minutes - prewarm_minutes), config, 'quarters')
+
+    def handle(run):
+        prewarmed = None
+        now = clock.now(scheduler.tz)
+        if prewarm_minutes > 0 and now < run.window_end:
+            prewarmed = prewarm_quarter(fclm, run.name, run.window_start, now.replace(second=0, microsecond=0))
+            publish_at = run.window_end.add(minutes=delay_minutes)
+            # Not a 'sleep' phase, so the token monitor won't recycle the script and drop the cached rows
+            channel.sleep(max((publish_at - clock.now(scheduler.tz)).total_seconds(), 0), phase='prewarm')
+        run_quarter(fclm, workflow_url, run.name, run.window_start, run.window_end, prewarmed, slo_seconds, differ, history)
+        logging.info(f"Completed {run.name}")
+
+    scheduler.run_forever(handle)
 
 def main():
     # HARDCODED VALUES - No user input needed
     fc = "PSC2"
     workflow_url = "https://hooks.slack.com/triggers/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"
     
+    config = load_config()
+    setup_logging(config, "WorkingRate")
     logging.info("🚀 Starting WorkingRate in automated normal mode for PSC2")
+    recorder.configure(config, "WorkingRate")
+    negotiated_hosts.configure(config)
+    recorder.attach(webhook_session)
+    channel.add_command_handler('profile', profile_command)
+    channel.add_command_handler('heap', heap_command)
+    start_tracking_from_config(config)
     
     # Send startup notification
     try:
@@ -432,7 +514,7 @@ def main():
     # AUTOMATICALLY RUN IN NORMAL MODE - No user choice needed
     logging.info("Running in automated normal mode. Monitoring quarters...")
     try:
-        normal_run(fclm, workflow_url)
+        normal_run(fclm, workflow_url, config)
     except KeyboardInterrupt:
         logging.info("Normal mode interrupted.")
     except Exception as e:
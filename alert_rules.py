@@ -0,0 +1,157 @@
+import logging
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Comparison operators allowed in a rule condition, applied to a whole column at once
+OPERATORS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+    "in": lambda column, values: np.isin(column, values),
+    "not in": lambda column, values: ~np.isin(column, values),
+}
+
+# Columns of the hourly table and the rolling window that a condition can test
+COLUMNS = ('Login ID', 'Associate Name', 'Manager', 'Hours', 'Jobs', 'UPH')
+
+# Matches the original hardcoded fluid load check
+DEFAULT_RULES = [
+    {
+        "name": "low_uph",
+        "label": "Below 190 UPH",
+        "when": [["UPH", "<", 190]],
+        "reason": "UPH {UPH:.2f} below 190",
+    }
+]
+
+
+class RuleError(ValueError):
+    pass
+
+
+class Condition(NamedTuple):
+    column: str
+    op: str
+    value: object
+
+
+class CompiledRule(NamedTuple):
+    name: str
+    label: str
+    conditions: Tuple[Condition, ...]
+    reason: str
+    exclude: bool
+    process_paths: Optional[frozenset]
+
+
+def _compile_condition(rule_name: str, condition) -> Condition:
+    try:
+        column, op, value = condition
+    except (TypeError, ValueError):
+        raise RuleError(f"Rule {rule_name}: condition {condition!r} must be [column, operator, value]")
+    if column not in COLUMNS:
+        raise RuleError(f"Rule {rule_name}: unknown column {column!r} (expected one of {', '.join(COLUMNS)})")
+    if op not in OPERATORS:
+        raise RuleError(f"Rule {rule_name}: unknown operator {op!r} (expected one of {', '.join(OPERATORS)})")
+    if op in ("in", "not in"):
+        if not isinstance(value, list):
+            raise RuleError(f"Rule {rule_name}: {op!r} needs a list value")
+        value = tuple(value)
+    elif op not in ("==", "!=") and not isinstance(value, (int, float)):
+        raise RuleError(f"Rule {rule_name}: {op!r} needs a numeric value, got {value!r}")
+    return Condition(column, op, value)
+
+
+def compile_rule(rule: Dict) -> CompiledRule:
+    name = rule.get('name') or "unnamed"
+    conditions = tuple(_compile_condition(name, c) for c in rule.get('when', []))
+    if not conditions:
+        raise RuleError(f"Rule {name}: needs at least one condition in 'when'")
+    process_paths = rule.get('process_paths')
+    return CompiledRule(
+        name=name,
+        label=rule.get('label', name),
+        conditions=conditions,
+        reason=rule.get('reason', name),
+        exclude=bool(rule.get('exclude', False)),
+        process_paths=frozenset(process_paths) if process_paths else None,
+    )
+
+
+class RuleSet:
+    """Alert rules from config.json, compiled once and evaluated column-wise over a whole table.
+
+    A row is flagged when every condition of at least one alert rule holds and no exclude rule
+    matches it. Conditions shared between rules are evaluated only once per table.
+    """
+
+    def __init__(self, rules: Sequence[Dict] = None):
+        compiled = [compile_rule(rule) for rule in (rules if rules is not None else DEFAULT_RULES)]
+        self.rules = [rule for rule in compiled if not rule.exclude]
+        self.excludes = [rule for rule in compiled if rule.exclude]
+
+    @classmethod
+    def from_config(cls, config: Dict, section: str = 'alert_rules') -> "RuleSet":
+        rules = config.get(section)
+        try:
+            return cls(rules or None)
+        except RuleError as e:
+            logging.error(f"Invalid {section} in config.json, using the default rule: {e}")
+            return cls()
+
+    @property
+    def label(self) -> str:
+        """Short description of what gets flagged, for alert titles"""
+        if len(self.rules) == 1:
+            return self.rules[0].label
+        return "Flagged by Alert Rules"
+
+    def _applies(self, rule: CompiledRule, process_path: Optional[str]) -> bool:
+        return rule.process_paths is None or process_path in rule.process_paths
+
+    def _mask(self, rule: CompiledRule, columns: Dict[str, np.ndarray], cache: Dict, rows: int) -> np.ndarray:
+        mask = np.ones(rows, dtype=bool)
+        for condition in rule.conditions:
+            result = cache.get(condition)
+            if result is None:
+                if condition.column not in columns:
+                    raise RuleError(f"Rule {rule.name}: unknown column {condition.column!r}")
+                result = OPERATORS[condition.op](columns[condition.column], condition.value)
+                cache[condition] = result
+            mask &= result
+        return mask
+
+    def evaluate(self, columns: Dict[str, np.ndarray], process_path: str = None) -> List[Tuple[int, List[str]]]:
+        """Indices of flagged rows, in table order, each with the reasons from every matching rule"""
+        rows = len(next(iter(columns.values()))) if columns else 0
+        if rows == 0:
+            return []
+        cache = {}
+        excluded = np.zeros(rows, dtype=bool)
+        for rule in self.excludes:
+            if self._applies(rule, process_path):
+                excluded |= self._mask(rule, columns, cache, rows)
+
+        matches = [(rule, self._mask(rule, columns, cache, rows) & ~excluded)
+                   for rule in self.rules if self._applies(rule, process_path)]
+        if not matches:
+            return []
+        flagged = np.flatnonzero(np.logical_or.reduce([mask for _, mask in matches]))
+
+        results = []
+        for index in flagged:
+            row = {name: column[index] for name, column in columns.items()}
+            reasons = [self._reason(rule, row) for rule, mask in matches if mask[index]]
+            results.append((int(index), reasons))
+        return results
+
+    @staticmethod
+    def _reason(rule: CompiledRule, row: Dict) -> str:
+        try:
+            return rule.reason.format(**row)
+        except (KeyError, ValueError, IndexError):
+            return rule.name
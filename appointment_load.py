@@ -0,0 +1,292 @@
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, NamedTuple, Optional
+
+import pendulum
+
+from http_cassette import DEFAULT_BENCH_DIR, replay_fclm, replay_session
+from monitor_clock import VirtualClock, clock
+
+APPOINTMENT_PATH = "/appointment/bySearchParams"
+
+CARRIERS = ["SWIFT", "JBHUNT", "SCHNEIDER", "WERNER", "LANDSTAR", "AMZL FREIGHT"]
+
+
+class AppointmentPlan(NamedTuple):
+    appointment_id: int
+    live: bool
+    palletized: bool
+    pallet_count: int
+    carton_count: int
+    unit_count: int
+    carrier: str
+    door: str
+    scheduled: float
+    arrived: Optional[float]  # None for no-shows
+    checked_in: Optional[float]
+    closed: Optional[float]
+
+
+def generate_day(day: pendulum.Date, count: int, seed: int = 0, live_share: float = 0.4,
+                 palletized_share: float = 0.5, no_show_share: float = 0.05, tz: str = "local") -> List[AppointmentPlan]:
+    """A day of appointments with realistic lifecycles, deterministic for a given seed"""
+    rng = random.Random(seed)
+    midnight = pendulum.datetime(day.year, day.month, day.day, tz=tz).timestamp()
+    plans = []
+    for index in range(count):
+        live = rng.random() < live_share
+        palletized = rng.random() < palletized_share
+        scheduled = midnight + rng.uniform(0, 22 * 3600)
+        arrived = checked_in = closed = None
+        if rng.random() >= no_show_share:
+            arrived = scheduled + rng.gauss(0, 20 * 60)
+            checked_in = arrived + rng.uniform(5 * 60, 60 * 60)
+            # Unloading runs around the LUCY threshold, so both met and missed loads show up
+            typical = 2.5 * 3600 if palletized else 5 * 3600
+            closed = checked_in + max(rng.gauss(typical, typical / 3), 15 * 60)
+        plans.append(AppointmentPlan(
+            appointment_id=700000000 + seed * 100000 + index,
+            live=live,
+            palletized=palletized,
+            pallet_count=rng.randint(10, 26) if palletized else 0,
+            carton_count=rng.randint(200, 2500),
+            unit_count=rng.randint(1000, 20000),
+            carrier=rng.choice(CARRIERS),
+            door=f"DD{rng.randint(1, 60):03d}",
+            scheduled=scheduled,
+            arrived=arrived,
+            checked_in=checked_in,
+            closed=closed,
+        ))
+    return plans
+
+
+def status_at(plan: AppointmentPlan, now: float) -> str:
+    if plan.closed is not None and now >= plan.closed:
+        return "CLOSED"
+    if plan.checked_in is not None and now >= plan.checked_in:
+        return "CHECKED_IN"
+    if plan.arrived is not None and now >= plan.arrived:
+        return "ARRIVED"
+    return "ARRIVAL_SCHEDULED"
+
+
+def appointment_payload(plans: List[AppointmentPlan], now: float) -> Dict:
+    """The bySearchParams response for the given plans as of now"""
+    appointments = []
+    for plan in plans:
+        status = status_at(plan, now)
+        appointment = {
+            "inboundShipmentAppointmentId": plan.appointment_id,
+            "status": status,
+            "carrierName": plan.carrier,
+            "doorNumber": plan.door,
+            "comments": [],
+            "cartonCount": plan.carton_count,
+            "unitCount": plan.unit_count,
+            "palletCount": plan.pallet_count,
+            "attributes": {
+                "CARRIER_LOAD_TYPE": {"value": "LIVE" if plan.live else "DROP"},
+                "IS_PALLETIZED": {"value": "Yes" if plan.palletized else "No"},
+            },
+            "arrivalDates": {"localStartDate": {"utcMillis": int(plan.scheduled * 1000)}},
+        }
+        if status != "ARRIVAL_SCHEDULED":
+            appointment["arrivalDate"] = {"utcMillis": int(plan.arrived * 1000)}
+        appointments.append(appointment)
+    return {"AppointmentList": appointments}
+
+
+class AppointmentServer:
+    """Local stand-in for the dock appointment API and the alert webhook.
+
+    Appointment searches are answered with the plans' statuses at monitor_clock time, so a
+    virtual clock walks them through their lifecycles, gzipped like the real API when the
+    client accepts it. Webhook posts are counted and accepted.
+    """
+
+    def __init__(self, plans: List[AppointmentPlan], host: str = "127.0.0.1", port: int = 0, compress: bool = True):
+        self.plans = plans
+        self.compress = compress
+        self.posts = 0
+        self.last_payload_bytes = 0
+        self.last_wire_bytes = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.address = "%s:%d" % self.httpd.server_address[:2]
+        self.thread: Optional[threading.Thread] = None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.partition("?")[0] != APPOINTMENT_PATH:
+                    self._reply(404, "text/plain", b"Not found\n")
+                    return
+                data = json.dumps(appointment_payload(server.plans, clock.time())).encode("utf-8")
+                server.last_payload_bytes = len(data)
+                headers = {}
+                if server.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+                    data = gzip.compress(data, compresslevel=6)
+                    headers["Content-Encoding"] = "gzip"
+                server.last_wire_bytes = len(data)
+                self._reply(200, "application/json", data, headers)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with server.lock:
+                    server.posts += 1
+                self._reply(200, "text/plain", b"ok")
+
+            def _reply(self, status: int, content_type: str, data: bytes, headers: Dict[str, str] = None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logging.debug(f"Stand-in request: {format % args}")
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="appointment-server", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def bench_volume(count: int, day: pendulum.Date, poll_seconds: int = 60, alloc_every: int = 60, seed: int = 0,
+                 compress: bool = True) -> Dict:
+    """Poll one simulated day of count appointments through ArrivalsMonitor and measure each poll.
+
+    Poll times and allocations include the stand-in answering the search, as the real API would.
+    """
+    import collect_arrivals
+
+    plans = generate_day(day, count, seed)
+    server = AppointmentServer(plans, compress=compress)
+    server.start()
+    fclm = replay_fclm(collect_arrivals.FCLM, server)
+    replay_session(collect_arrivals.webhook_session, server)
+    monitor = collect_arrivals.ArrivalsMonitor(fclm.fc)
+
+    start = pendulum.datetime(day.year, day.month, day.day, tz="local").timestamp()
+    virtual = VirtualClock(start)
+    clock.use(virtual)
+    timings, alloc_peaks, alloc_blocks = [], [], []
+    payload_bytes = wire_bytes = 0
+    timed_posts = 0  # alerts from the timed polls, to go with their busy time
+    try:
+        for poll in range(86400 // poll_seconds):
+            traced = alloc_every and poll % alloc_every == 0
+            if traced:
+                # Traced polls run slower, so they only feed the allocation figures
+                tracemalloc.start()
+                before = tracemalloc.take_snapshot()
+                monitor.poll(fclm)
+                after = tracemalloc.take_snapshot()
+                alloc_peaks.append(tracemalloc.get_traced_memory()[1])
+                alloc_blocks.append(sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0))
+                tracemalloc.stop()
+            else:
+                posts = server.posts
+                started = time.perf_counter()
+                monitor.poll(fclm)
+                timings.append(time.perf_counter() - started)
+                timed_posts += server.posts - posts
+            payload_bytes = max(payload_bytes, server.last_payload_bytes)
+            wire_bytes = max(wire_bytes, server.last_wire_bytes)
+            virtual.sleep(poll_seconds)
+    finally:
+        clock.use(None)
+        server.stop()
+
+    busy = sum(timings)
+    return {
+        'appointments': count,
+        'live_loads': sum(plan.live for plan in plans),
+        'polls': len(timings) + len(alloc_peaks),
+        # With --alloc-every 1 every poll is traced, so there are no untraced times to report
+        'poll_seconds': {
+            'mean': busy / len(timings),
+            'p50': _percentile(timings, 0.5),
+            'p95': _percentile(timings, 0.95),
+            'max': max(timings),
+        } if timings else None,
+        'alloc_peak_kb': {
+            'p50': _percentile(alloc_peaks, 0.5) / 1024,
+            'max': max(alloc_peaks) / 1024,
+        } if alloc_peaks else None,
+        'alloc_new_blocks_per_poll': _percentile(alloc_blocks, 0.5) if alloc_blocks else None,
+        'alerts': server.posts,
+        'alerts_per_busy_second': timed_posts / busy if busy else None,
+        'max_payload_kb': payload_bytes / 1024,
+        'max_wire_kb': wire_bytes / 1024,
+        'tracked_appointments': len(monitor.lucy_trackers),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure collect_arrivals polls as daily appointment volume grows")
+    parser.add_argument("--volumes", type=int, nargs="+", default=[250, 500, 1000, 2000], help="Appointments per day")
+    parser.add_argument("--day", help="Simulated day, YYYY-MM-DD (default: today)")
+    parser.add_argument("--poll-seconds", type=int, default=60, help="Poll interval (default 60, like collect_arrivals)")
+    parser.add_argument("--alloc-every", type=int, default=60, help="Trace allocations on every Nth poll; 0 disables")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-compression", action="store_true", help="Serve searches uncompressed")
+    parser.add_argument("--output", help="JSON file to write (default: bench_output/appointments_<time>.json)")
+    args = parser.parse_args()
+
+    # The monitor logs every alert; keep the console for the results
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    day = pendulum.parse(args.day).date() if args.day else pendulum.today().date()
+    results = []
+    for count in args.volumes:
+        result = bench_volume(count, day, args.poll_seconds, args.alloc_every, args.seed, not args.no_compression)
+        results.append(result)
+        timing = result['poll_seconds']
+        polls = (f"poll p50 {timing['p50'] * 1000:.1f} ms, p95 {timing['p95'] * 1000:.1f} ms"
+                 if timing else "every poll traced")
+        print(f"{count:>6} appointments: {polls}, {result['alerts']} alerts", file=sys.stderr)
+
+    report = {
+        'day': day.to_date_string(),
+        'poll_seconds': args.poll_seconds,
+        'seed': args.seed,
+        'compression': not args.no_compression,
+        'volumes': results,
+        'recorded_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    output = args.output or os.path.join(DEFAULT_BENCH_DIR, f"appointments_{datetime.now().strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "wt", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import os
+import gzip
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+import pendulum
+from requests.adapters import HTTPAdapter
+
+from history_store import HistoryRow, HistoryStore
+from http_client import http_settings
+from monitor_config import load_config, get_setting
+from monitor_logging import setup_logging
+from report_scheduler import DEFAULT_TIMEZONE, quarter_timetable
+from WorkingRate import FCLM, QUARTER_REPORT_SECTIONS, get_quarters, merge_rate_rows, parse_rate_rows, rates_frame
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(MODULE_DIR, "cache", "fclm")
+DEFAULT_OUTPUT_DIR = os.path.join(MODULE_DIR, "backfill_output")
+
+# Slices ending less than this long ago may still change in FCLM, so they are never cached
+CACHE_SETTLE_HOURS = 2
+
+RESULT_COLUMNS = ['Date', 'Quarter', 'Table', 'Employee ID', 'Name', 'Grand Total', 'Paid Hours', 'Rate']
+
+
+class Slice(NamedTuple):
+    process_id: str
+    start: pendulum.DateTime
+    end: pendulum.DateTime
+
+
+class QuarterWindow(NamedTuple):
+    date: str
+    quarter: str
+    start: pendulum.DateTime
+    end: pendulum.DateTime
+
+
+def hour_slices(start: pendulum.DateTime, end: pendulum.DateTime) -> List[Tuple[pendulum.DateTime, pendulum.DateTime]]:
+    """Split a window on clock-hour boundaries so slices can be cached and shared between runs"""
+    slices = []
+    cursor = start
+    while cursor < end:
+        next_hour = cursor.start_of('hour').add(hours=1)
+        slice_end = min(next_hour, end)
+        slices.append((cursor, slice_end))
+        cursor = slice_end
+    return slices
+
+
+def quarter_windows(first_day: pendulum.Date, last_day: pendulum.Date, quarters, names=None, tz: str = DEFAULT_TIMEZONE) -> List[QuarterWindow]:
+    """Every quarter ending between first_day and last_day, optionally limited to the named quarters"""
+    timetable = quarter_timetable(quarters, delay_minutes=0)
+    windows = []
+    day = first_day
+    while day <= last_day:
+        for run in timetable(day, tz):
+            if names is None or run.name in names:
+                windows.append(QuarterWindow(day.to_date_string(), run.name, run.window_start, run.window_end))
+        day = day.add(days=1)
+    return windows
+
+
+class SliceCache:
+    """Gzipped FCLM pages on disk, one file per process id and clock-hour slice"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, page: Slice) -> str:
+        stamp = f"{page.start.in_timezone('UTC').format('YYYYMMDDTHHmm')}_{page.end.in_timezone('UTC').format('YYYYMMDDTHHmm')}"
+        return os.path.join(self.directory, f"{page.process_id}_{stamp}.html.gz")
+
+    def get(self, page: Slice) -> Optional[str]:
+        try:
+            with gzip.open(self.path(page), "rt", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError) as e:
+            logging.warning(f"Ignoring unreadable cache entry {self.path(page)}: {e}")
+            return None
+
+    def put(self, page: Slice, html: str):
+        if page.end > pendulum.now().subtract(hours=CACHE_SETTLE_HOURS):
+            return
+        path = self.path(page)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            f.write(html)
+        os.replace(tmp_path, path)
+
+
+def parse_page(html: str, sections: List[Tuple[str, object]]) -> Dict[str, Optional[List[Dict]]]:
+    """Parse every requested table out of one page; runs in a worker process"""
+    return {table_name: parse_rate_rows(html, table_id, table_name) for table_name, table_id in sections}
+
+
+def fetch_slice(fclm, cache: SliceCache, page: Slice) -> Tuple[Optional[str], bool]:
+    html = cache.get(page)
+    if html is not None:
+        return html, True
+    html = fclm.get_html_data(page.process_id, page.start, page.end)
+    if html:
+        cache.put(page, html)
+    return html, False
+
+
+def backfill(fclm, windows: List[QuarterWindow], cache: SliceCache, fetch_workers: int = 8, parse_workers: int = None,
+             history: HistoryStore = None) -> pd.DataFrame:
+    """Rebuild run_quarter tables for past quarters without sending anything to Slack"""
+    sections_by_process: Dict[str, List[Tuple[str, object]]] = {}
+    for process_id, table_name, emoji, table_id in QUARTER_REPORT_SECTIONS:
+        sections_by_process.setdefault(process_id, []).append((table_name, table_id))
+
+    pages = sorted({
+        Slice(process_id, start, end)
+        for window in windows
+        for start, end in hour_slices(window.start, window.end)
+        for process_id in sections_by_process
+    }, key=lambda page: (page.start, page.process_id))
+    logging.info(f"Backfilling {len(windows)} quarters from {len(pages)} hourly page slices")
+
+    parsed: Dict[Slice, Dict[str, Optional[List[Dict]]]] = {}
+    cache_hits = 0
+    failures = 0
+    # Page downloads wait on the network, so they use threads. Parsing is CPU bound, so it uses processes.
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, \
+            ProcessPoolExecutor(max_workers=parse_workers) as parse_pool:
+        fetches = {fetch_pool.submit(fetch_slice, fclm, cache, page): page for page in pages}
+        parses = {}
+        for future in as_completed(fetches):
+            page = fetches[future]
+            try:
+                html, from_cache = future.result()
+            except Exception as e:
+                logging.error(f"Fetch failed for {page.process_id} {page.start} to {page.end}: {e}")
+                html, from_cache = None, False
+            cache_hits += from_cache
+            if not html:
+                failures += 1
+                continue
+            parses[parse_pool.submit(parse_page, html, sections_by_process[page.process_id])] = page
+
+        for future in as_completed(parses):
+            page = parses[future]
+            try:
+                parsed[page] = future.result()
+            except Exception as e:
+                logging.error(f"Parse failed for {page.process_id} {page.start} to {page.end}: {e}")
+    logging.info(f"Fetched {len(pages) - cache_hits} slices, {cache_hits} from cache, {failures} failed")
+
+    results = []
+    for window in windows:
+        for process_id, table_name, emoji, table_id in QUARTER_REPORT_SECTIONS:
+            rows = []
+            complete = True
+            for start, end in hour_slices(window.start, window.end):
+                slice_rows = parsed.get(Slice(process_id, start, end), {}).get(table_name)
+                if slice_rows is None:
+                    complete = False
+                    break
+                rows = merge_rate_rows(rows, slice_rows)
+            if not complete:
+                logging.warning(f"Skipping {table_name} for {window.date} {window.quarter}: missing page slices")
+                continue
+            if history is not None:
+                history.record(HistoryRow(
+                    "WorkingRate", process_id, None, table_name, window.start, window.end,
+                    str(row['Employee ID']), row['Name'], row['Grand Total'], row['Paid Hours'], row['Rate'])
+                    for row in rows)
+            rates = rates_frame(rows, table_name)
+            if rates is None:
+                continue
+            rates.insert(0, 'Table', table_name)
+            rates.insert(0, 'Quarter', window.quarter)
+            rates.insert(0, 'Date', window.date)
+            results.append(rates)
+
+    if not results:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    return pd.concat(results, ignore_index=True)[RESULT_COLUMNS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate problem solve rates for past quarters")
+    parser.add_argument("start", help="First day, YYYY-MM-DD")
+    parser.add_argument("end", nargs="?", help="Last day, YYYY-MM-DD (defaults to start)")
+    parser.add_argument("--quarters", nargs="+", help='Quarter names to include, e.g. "Quarter 1 Days" (default: all)')
+    parser.add_argument("--fc", default="PSC2")
+    parser.add_argument("--fetch-workers", type=int, default=8, help="Concurrent FCLM requests")
+    parser.add_argument("--parse-workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--output", help="CSV file to write (default: backfill_output/rates_<start>_<end>.csv)")
+    parser.add_argument("--history", action="store_true", help="Also add the rows to the history store")
+    args = parser.parse_args()
+
+    config = load_config()
+    setup_logging(config, "backfill", structured_console=False)
+    # Backfill runs no report cycles, so only the default request timeouts apply
+    http_settings.configure(config)
+    tz = get_setting(config, 'schedules', 'timezone', DEFAULT_TIMEZONE)
+    first_day = pendulum.parse(args.start).date()
+    last_day = pendulum.parse(args.end).date() if args.end else first_day
+    windows = [w for w in quarter_windows(first_day, last_day, get_quarters(config), args.quarters, tz)
+               if w.end <= pendulum.now(tz)]
+    if not windows:
+        parser.error("No finished quarters match the given dates and names")
+
+    fclm = FCLM(args.fc)
+    # Let every fetch thread keep its own pooled connection
+    adapter = HTTPAdapter(pool_connections=args.fetch_workers, pool_maxsize=args.fetch_workers)
+    fclm.session.mount("https://", adapter)
+
+    started = pendulum.now()
+    history = None
+    if args.history:
+        # Backfill waits for the writer at the end, so its queue is left unbounded rather than dropping rows
+        history = HistoryStore(get_setting(config, 'history', 'path'), get_setting(config, 'history', 'batch_size', 500),
+                               max_queued_rows=0)
+    results = backfill(fclm, windows, SliceCache(args.cache_dir), args.fetch_workers, args.parse_workers, history)
+    if history is not None:
+        history.close(timeout=None)
+
+    output = args.output or os.path.join(DEFAULT_OUTPUT_DIR, f"rates_{first_day}_{last_day}.csv")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    results.to_csv(output, index=False)
+    elapsed = (pendulum.now() - started).total_seconds()
+    logging.info(f"Wrote {len(results)} rows for {len(windows)} quarters to {output} in {elapsed:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,25 @@
 import time
 import logging
 import traceback
-import requests
 from datetime import datetime, timedelta
-from requests_kerberos import HTTPKerberosAuth, OPTIONAL
 from urllib3 import disable_warnings
 import os
 import subprocess
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from history_store import HistoryStore, LucyOutcome
+from http_cassette import recorder
+from http_client import Session, http_settings, read_json, start_cycle
+from monitor_channel import channel
+from monitor_clock import clock
+from monitor_config import load_config
+from monitor_logging import setup_logging
+from negotiate_auth import NegotiateAuth, negotiated_hosts
+from sampling_profiler import profile_command
+from heap_snapshots import heap_command, start_tracking_from_config
+from tracing import span, start_span
+
+# Webhook posts share one session so connections are reused between alerts
+webhook_session = Session('send')
 
 def send_webhook_alert(title, content, footer, appointment_details=None):
     webhook_url = "https://hooks.slack.com/triggers/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"
@@ -26,9 +36,12 @@ def send_webhook_alert(title, content, footer, appointment_details=None):
         "appointment_details": ""
     }
     headers = {"Content-Type": "application/json"}
+    channel.heartbeat('send')
     try:
-        response = requests.post(webhook_url, json=payload, headers=headers)
-        response.raise_for_status()
+        with channel.timed('webhook_send_seconds', failure_metric='webhook_failures_total', webhook='lucy_alert'), \
+                span('send', title=title, payload_chars=len(full_content)):
+            response = webhook_session.post(webhook_url, json=payload, headers=headers)
+            response.raise_for_status()
         logging.info(f"Webhook alert sent: {title}")
     except Exception as e:
         logging.error(f"Failed to send webhook alert: {e}")
@@ -47,9 +60,10 @@ class FCLM:
 
     def authenticate(self):
         self.cookie = self.mw_cookie()
-        self.session = requests.Session()
+        self.session = Session('fetch', hedge=True)
+        recorder.attach(self.session)
         self.session.cookies.update(self.cookie)
-        self.session.auth = HTTPKerberosAuth(mutual_authentication=OPTIONAL)
+        self.session.auth = NegotiateAuth()
         self.session.verify = False
         try:
             response = self.session.get("https://fclm-portal.amazon.com/reports/functionRollup")
@@ -105,7 +119,6 @@ class FCLM:
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:128.0) Gecko/20100101 Firefox/128.0",
             "Accept": "application/json, text/plain, */*",
             "Accept-Language": "en-US,en;q=0.5",
-            "Accept-Encoding": "gzip, deflate, br, zstd",
             "Origin": "https://fc-inbound-dock-hub-na.aka.amazon.com",
             "DNT": "1",
             "Connection": "keep-alive",
@@ -117,11 +130,18 @@ class FCLM:
             "Cache-Control": "no-cache",
             "TE": "trailers"
         }
+        channel.heartbeat('fetch')
         try:
-            response = self.session.get(url, params=params, headers=headers)
-            response.raise_for_status()
+            # The body is decompressed and decoded as it arrives, so the transfer and the parse are timed together
+            with channel.timed('appointment_fetch_seconds', failure_metric='appointment_fetch_failures_total'), \
+                    span('fetch', warehouse_id=warehouse_id) as fetch_span:
+                with self.session.get(url, params=params, headers=headers, stream=True) as response:
+                    response.raise_for_status()
+                    data, sizes = read_json(response)
+                fetch_span.set(bytes=sizes.decoded, wire_bytes=sizes.wire,
+                               rows=len(data.get('AppointmentList', [])) if isinstance(data, dict) else 0)
             logging.info(f"Successfully fetched appointment data for {warehouse_id}")
-            return response.json()
+            return data
         except Exception as e:
             logging.error(f"Failed to fetch appointment data for {warehouse_id}: {e}")
             return None
@@ -144,10 +164,300 @@ def get_appointment_details(appointment):
         "Unit Count": unit_count
     }
 
+class ArrivalsMonitor:
+    """LUCY compliance state carried from one appointment poll to the next"""
+
+    def __init__(self, fc: str, history=None):
+        self.fc = fc
+        self.history = history
+        self.previous_status = {}
+        self.lucy_trackers = {}  # Track compliance state per appointment
+        # Track notifications sent today to prevent duplicates on restart
+        self.notifications_sent_today = set()
+        self.last_notification_date = None
+        self.seen_today = set()  # Appointment IDs returned by any poll since the last day change
+
+    def prune(self):
+        """Forget appointments that dropped out of the daily search, unless their LUCY timer is still running"""
+        running = {appt_id for appt_id, tracker in self.lucy_trackers.items()
+                   if tracker['status'] == 'ARRIVED' and not tracker['notifications']['missed']}
+        keep = self.seen_today | running
+        before = len(self.previous_status) + len(self.lucy_trackers)
+        self.previous_status = {appt_id: status for appt_id, status in self.previous_status.items() if appt_id in keep}
+        self.lucy_trackers = {appt_id: tracker for appt_id, tracker in self.lucy_trackers.items() if appt_id in keep}
+        self.seen_today = set()
+        dropped = before - len(self.previous_status) - len(self.lucy_trackers)
+        if dropped:
+            logging.info(f"Dropped {dropped} status/tracker entries for appointments no longer searched")
+
+    def poll(self, fclm):
+        """Fetch today's appointments once and send any LUCY alerts that are due; returns the appointment count"""
+        now = clock.local_now()
+        current_date = now.date()
+        
+        # Reset notification tracker on new day
+        if self.last_notification_date != current_date:
+            self.notifications_sent_today.clear()
+            self.last_notification_date = current_date
+            self.prune()
+            logging.info(f"New day detected: {current_date}. Clearing notification tracker.")
+        
+        today = clock.local_now()
+        start_date = today.strftime("%Y-%m-%dT00:00:00")
+        end_date = today.strftime("%Y-%m-%dT23:59:59")
+        appointment_data = fclm.get_appointment_data(self.fc, start_date, end_date)
+        
+        if appointment_data and 'AppointmentList' in appointment_data:
+            channel.heartbeat('parse')
+            appointments = appointment_data['AppointmentList']
+            
+            # Process appointments
+            for appt in appointments:
+                appt_id = str(appt['inboundShipmentAppointmentId'])
+                status = appt['status']
+                self.seen_today.add(appt_id)
+                prev = self.previous_status.get(appt_id, None)
+                attrs = appt.get('attributes', {})
+                is_live = attrs.get('CARRIER_LOAD_TYPE', {}).get('value') == 'LIVE'
+                is_palletized_val = attrs.get('IS_PALLETIZED', {}).get('value') == 'Yes'
+                pallet_count = appt.get('palletCount', None)
+                dock_door = appt.get('doorNumber', 'N/A')
+                
+                if not is_live:
+                    self.previous_status[appt_id] = status
+                    continue
+                
+                load_type = 'Palletized' if is_palletized_val and (pallet_count and pallet_count > 0) else 'Floor Load'
+                threshold = timedelta(hours=3, minutes=30) if load_type == 'Palletized' else timedelta(hours=7)
+                
+                arrival_time = None
+                if appt.get('arrivalDate') and 'utcMillis' in appt['arrivalDate']:
+                    arrival_time = datetime.fromtimestamp(appt['arrivalDate']['utcMillis'] / 1000)
+                elif 'arrivalDates' in appt and appt['arrivalDates'].get('localStartDate') and 'utcMillis' in appt['arrivalDates']['localStartDate']:
+                    arrival_time = datetime.fromtimestamp(appt['arrivalDates']['localStartDate']['utcMillis'] / 1000)
+                
+                # Lucy tracker management
+                if appt_id not in self.lucy_trackers and arrival_time:
+                    self.lucy_trackers[appt_id] = {
+                        'status': status,
+                        'start_time': arrival_time,
+                        'load_type': load_type,
+                        'threshold': threshold,
+                        'notifications': {
+                            'initial': False,
+                            'halfway': False,
+                            '30min': False,
+                            'missed': False,
+                            'checked_in': False,
+                            'closed': False,
+                            'compliance': False
+                        }
+                    }
+                
+                # Always update status in tracker
+                if appt_id in self.lucy_trackers:
+                    self.lucy_trackers[appt_id]['status'] = status
+                
+                # Build details
+                details = get_appointment_details(appt)
+                details['Arrival Timestamp'] = arrival_time.strftime('%Y-%m-%d %H:%M:%S') if arrival_time else 'N/A'
+                details['Load Type'] = load_type
+                details['Is Palletized'] = 'Yes' if is_palletized_val and (pallet_count and pallet_count > 0) else 'No'
+                details['Is Live Load'] = 'Yes' if is_live else 'No'
+                details['Status'] = status
+                details['Dock Door'] = dock_door
+                details['LUCY Timer Started'] = arrival_time.strftime('%Y-%m-%d %H:%M:%S') if arrival_time else 'N/A'
+                details['Threshold'] = str(threshold)
+                details['Appointment Details Link'] = f'https://fc-inbound-dock-hub-na.aka.amazon.com/en_US/#/dockmaster/appointment/{self.fc}/view/{appt_id}/appointmentDetail'
+                
+                notifications = self.lucy_trackers[appt_id]['notifications'] if appt_id in self.lucy_trackers else {}
+                
+                # Create unique notification identifiers to prevent duplicates
+                checked_in_id = f"{current_date}_{appt_id}_checked_in"
+                closed_id = f"{current_date}_{appt_id}_closed" 
+                arrived_id = f"{current_date}_{appt_id}_arrived"
+                
+                # Status change notifications (only if not sent today)
+                if (prev == 'ARRIVED' and status == 'CHECKED_IN' and 
+                    not notifications.get('checked_in') and 
+                    checked_in_id not in self.notifications_sent_today):
+                    
+                    now_time = clock.local_now()
+                    elapsed = (now_time - arrival_time) if arrival_time else timedelta(0)
+                    remaining = threshold - elapsed
+                    details['Elapsed Time'] = format_time_delta(elapsed)
+                    details['Time to Threshold'] = format_time_delta(remaining) if remaining > timedelta(0) else 'EXCEEDED'
+                    send_webhook_alert(
+                        title="Live Load Checked In",
+                        content=(f"Load Type: {load_type}\nAppointment ID: {appt_id}\nYou have {details['Time to Threshold']} to be LUCY compliant.\nDock Door: {dock_door}"),
+                        footer=f"FC: {self.fc}",
+                        appointment_details=details
+                    )
+                    notifications['checked_in'] = True
+                    self.notifications_sent_today.add(checked_in_id)
+                
+                if (prev == 'CHECKED_IN' and status == 'CLOSED' and 
+                    not notifications.get('closed') and 
+                    closed_id not in self.notifications_sent_today):
+                    
+                    now_time = clock.local_now()
+                    elapsed = (now_time - arrival_time) if arrival_time else timedelta(0)
+                    details['Elapsed Time'] = format_time_delta(elapsed)
+                    details['Time to Threshold'] = format_time_delta(threshold - elapsed) if threshold - elapsed > timedelta(0) else 'EXCEEDED'
+                    if elapsed <= threshold:
+                        time_remaining = threshold - elapsed
+                        time_remaining_str = format_time_delta(time_remaining)
+                        send_webhook_alert(
+                            title="Live Load LUCY Compliance Met",
+                            content=(f"Load Type: {load_type}\nAppointment ID: {appt_id}\nClosed with {time_remaining_str} remaining to LUCY compliance.\nDock Door: {dock_door}"),
+                            footer=f"FC: {self.fc}",
+                            appointment_details=details
+                        )
+                        notifications['compliance'] = True
+                    else:
+                        time_exceeded = elapsed - threshold
+                        time_exceeded_str = format_time_delta(time_exceeded)
+                        send_webhook_alert(
+                            title="Live Load LUCY Compliance Missed",
+                            content=(f"Load Type: {load_type}\nAppointment ID: {appt_id}\nClosed {time_exceeded_str} after LUCY compliance threshold.\nDock Door: {dock_door}"),
+                            footer=f"FC: {self.fc}",
+                            appointment_details=details
+                        )
+                        notifications['missed'] = True
+                    if self.history is not None and arrival_time:
+                        self.history.record([LucyOutcome(
+                            self.fc, appt_id, load_type, str(dock_door), arrival_time, now_time,
+                            threshold.total_seconds(), elapsed.total_seconds(), elapsed <= threshold)])
+                    notifications['closed'] = True
+                    self.notifications_sent_today.add(closed_id)
+                
+                if (status == 'ARRIVED' and 
+                    not notifications.get('initial') and 
+                    arrived_id not in self.notifications_sent_today):
+                    
+                    now_time = clock.local_now()
+                    elapsed = now_time - arrival_time if arrival_time else timedelta(0)
+                    remaining = threshold - elapsed
+                    details['Elapsed Time'] = format_time_delta(elapsed)
+                    details['Time to Threshold'] = format_time_delta(remaining) if remaining > timedelta(0) else 'EXCEEDED'
+                    send_webhook_alert(
+                        title="LUCY Timer Started - Live Load Arrived",
+                        content=(f"Load Type: {load_type}\nAppointment ID: {appt_id}\nDock Door: {dock_door}\nYou have {details['Time to Threshold']} to be LUCY compliant."),
+                        footer=f"FC: {self.fc}",
+                        appointment_details=details
+                    )
+                    notifications['initial'] = True
+                    self.notifications_sent_today.add(arrived_id)
+                
+                self.previous_status[appt_id] = status
+            
+            # Check ongoing timers (with duplicate prevention)
+            now_time = clock.local_now()
+            for appt_id, tracker in list(self.lucy_trackers.items()):
+                if tracker['status'] != 'ARRIVED':
+                    continue
+                start_time = tracker['start_time']
+                threshold = tracker['threshold']
+                elapsed = now_time - start_time
+                remaining = threshold - elapsed
+                halfway = threshold / 2
+                
+                details = {
+                    'Appointment ID': appt_id,
+                    'Load Type': tracker['load_type'],
+                    'Is Palletized': 'Yes' if tracker['load_type'] == 'Palletized' else 'No',
+                    'Is Live Load': 'Yes',
+                    'Status': tracker['status'],
+                    'LUCY Timer Started': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'Elapsed Time': format_time_delta(elapsed),
+                    'Time to Threshold': format_time_delta(threshold - elapsed) if threshold - elapsed > timedelta(0) else 'EXCEEDED',
+                    'Threshold': str(threshold),
+                    'Expected Completion Time': (start_time + threshold).strftime('%Y-%m-%d %H:%M:%S'),
+                    'Appointment Details Link': f'https://fc-inbound-dock-hub-na.aka.amazon.com/en_US/#/dockmaster/appointment/{self.fc}/view/{appt_id}/appointmentDetail'
+                }
+                
+                notifications = tracker['notifications']
+                
+                # Create unique notification identifiers
+                halfway_id = f"{current_date}_{appt_id}_halfway"
+                thirty_min_id = f"{current_date}_{appt_id}_30min"
+                missed_id = f"{current_date}_{appt_id}_missed"
+                
+                # Time-based notifications (only if not sent today)
+                if (not notifications['halfway'] and elapsed >= halfway and 
+                    halfway_id not in self.notifications_sent_today):
+                    send_webhook_alert(
+                        title="LUCY Compliance Halfway",
+                        content=(f"Load Type: {tracker['load_type']}\nAppointment ID: {appt_id}\nHalfway to LUCY compliance threshold."),
+                        footer=f"FC: {self.fc}",
+                        appointment_details=details
+                    )
+                    notifications['halfway'] = True
+                    self.notifications_sent_today.add(halfway_id)
+                
+                if (not notifications['30min'] and threshold - elapsed <= timedelta(minutes=30) and 
+                    threshold - elapsed > timedelta(seconds=0) and 
+                    thirty_min_id not in self.notifications_sent_today):
+                    send_webhook_alert(
+                        title="LUCY Compliance Approaching (30 min)",
+                        content=(f"Load Type: {tracker['load_type']}\nAppointment ID: {appt_id}\n30 minutes remaining to LUCY compliance threshold."),
+                        footer=f"FC: {self.fc}",
+                        appointment_details=details
+                    )
+                    notifications['30min'] = True
+                    self.notifications_sent_today.add(thirty_min_id)
+                
+                if (not notifications['missed'] and elapsed > threshold and 
+                    missed_id not in self.notifications_sent_today):
+                    hours, remainder = divmod(elapsed.total_seconds(), 3600)
+                    minutes = remainder // 60
+                    send_webhook_alert(
+                        title="Live Load LUCY Compliance Missed",
+                        content=(f"Load Type: {tracker['load_type']}\nAppointment ID: {appt_id}\nMissed by: {int(hours)} hours and {int(minutes)} minutes"),
+                        footer=f"FC: {self.fc}",
+                        appointment_details=details
+                    )
+                    notifications['missed'] = True
+                    self.notifications_sent_today.add(missed_id)
+            channel.gauge('arrivals_tracked_appointments', len(self.previous_status))
+            return len(appointments)
+        logging.warning("No appointment data found or unexpected format.")
+        return None
+
+def run_monitor(fclm, monitor, refresh_interval=60):
+    """Poll appointments every refresh_interval seconds, forever"""
+    while True:
+        poll_span = start_span('arrivals_poll')
+        deadline = start_cycle('arrivals')
+        try:
+            channel.next_iteration()
+            appointments = monitor.poll(fclm)
+            if appointments is not None:
+                poll_span.set(appointments=appointments)
+            deadline.finish()
+            poll_span.finish()
+            channel.sleep(refresh_interval)
+            
+        except Exception as e:
+            deadline.finish()
+            poll_span.finish(error=str(e))
+            logging.error(f"Error in monitoring loop: {e}")
+            logging.error(traceback.format_exc())
+            channel.sleep(60)
+
 def main():
     # HARDCODED - No user input needed
     fc = "PSC2"
+    config = load_config()
+    setup_logging(config, "collect_arrivals")
     logging.info(f"Starting automated monitoring for FC {fc}")
+    http_settings.configure(config)
+    recorder.configure(config, "collect_arrivals")
+    negotiated_hosts.configure(config)
+    recorder.attach(webhook_session)
+    channel.add_command_handler('profile', profile_command)
+    channel.add_command_handler('heap', heap_command)
+    start_tracking_from_config(config)
     
     # Send startup notification only once per session
     startup_sent = False
@@ -164,256 +474,10 @@ def main():
             logging.error(f"Failed to send startup notification: {e}")
     
     fclm = FCLM(fc)
-    refresh_interval = 60  # in seconds
-    previous_status = {}
-    lucy_trackers = {}  # Track compliance state per appointment
-    
-    # Track notifications sent today to prevent duplicates on restart
-    notifications_sent_today = set()
-    last_notification_date = None
+    monitor = ArrivalsMonitor(fc, HistoryStore.from_config(config))
     
     logging.info(f"Monitoring for ARRIVAL_SCHEDULED -> ARRIVED transitions at FC {fc}...")
-    
-    while True:
-        try:
-            now = datetime.now()
-            current_date = now.date()
-            
-            # Reset notification tracker on new day
-            if last_notification_date != current_date:
-                notifications_sent_today.clear()
-                last_notification_date = current_date
-                logging.info(f"New day detected: {current_date}. Clearing notification tracker.")
-            
-            today = datetime.now()
-            start_date = today.strftime("%Y-%m-%dT00:00:00")
-            end_date = today.strftime("%Y-%m-%dT23:59:59")
-            appointment_data = fclm.get_appointment_data(fc, start_date, end_date)
-            
-            if appointment_data and 'AppointmentList' in appointment_data:
-                appointments = appointment_data['AppointmentList']
-                
-                # Helper functions
-                def is_live_load(appt):
-                    attrs = appt.get('attributes', {})
-                    return attrs.get('CARRIER_LOAD_TYPE', {}).get('value') == 'LIVE'
-                
-                def is_palletized(appt):
-                    attrs = appt.get('attributes', {})
-                    return attrs.get('IS_PALLETIZED', {}).get('value') == 'Yes'
-                
-                # Process appointments
-                for appt in appointments:
-                    appt_id = str(appt['inboundShipmentAppointmentId'])
-                    status = appt['status']
-                    prev = previous_status.get(appt_id, None)
-                    attrs = appt.get('attributes', {})
-                    is_live = attrs.get('CARRIER_LOAD_TYPE', {}).get('value') == 'LIVE'
-                    is_palletized_val = attrs.get('IS_PALLETIZED', {}).get('value') == 'Yes'
-                    pallet_count = appt.get('palletCount', None)
-                    dock_door = appt.get('doorNumber', 'N/A')
-                    
-                    if not is_live:
-                        previous_status[appt_id] = status
-                        continue
-                    
-                    load_type = 'Palletized' if is_palletized_val and (pallet_count and pallet_count > 0) else 'Floor Load'
-                    threshold = timedelta(hours=3, minutes=30) if load_type == 'Palletized' else timedelta(hours=7)
-                    
-                    arrival_time = None
-                    if appt.get('arrivalDate') and 'utcMillis' in appt['arrivalDate']:
-                        arrival_time = datetime.fromtimestamp(appt['arrivalDate']['utcMillis'] / 1000)
-                    elif 'arrivalDates' in appt and appt['arrivalDates'].get('localStartDate') and 'utcMillis' in appt['arrivalDates']['localStartDate']:
-                        arrival_time = datetime.fromtimestamp(appt['arrivalDates']['localStartDate']['utcMillis'] / 1000)
-                    
-                    # Lucy tracker management
-                    if appt_id not in lucy_trackers and arrival_time:
-                        lucy_trackers[appt_id] = {
-                            'status': status,
-                            'start_time': arrival_time,
-                            'load_type': load_type,
-                            'threshold': threshold,
-                            'notifications': {
-                                'initial': False,
-                                'halfway': False,
-                                '30min': False,
-                                'missed': False,
-                                'checked_in': False,
-                                'closed': False,
-                                'compliance': False
-                            }
-                        }
-                    
-                    # Always update status in tracker
-                    if appt_id in lucy_trackers:
-                        lucy_trackers[appt_id]['status'] = status
-                    
-                    # Build details
-                    details = get_appointment_details(appt)
-                    details['Arrival Timestamp'] = arrival_time.strftime('%Y-%m-%d %H:%M:%S') if arrival_time else 'N/A'
-                    details['Load Type'] = load_type
-                    details['Is Palletized'] = 'Yes' if is_palletized_val and (pallet_count and pallet_count > 0) else 'No'
-                    details['Is Live Load'] = 'Yes' if is_live else 'No'
-                    details['Status'] = status
-                    details['Dock Door'] = dock_door
-                    details['LUCY Timer Started'] = arrival_time.strftime('%Y-%m-%d %H:%M:%S') if arrival_time else 'N/A'
-                    details['Threshold'] = str(threshold)
-                    details['Appointment Details Link'] = f'https://fc-inbound-dock-hub-na.aka.amazon.com/en_US/#/dockmaster/appointment/{fc}/view/{appt_id}/appointmentDetail'
-                    
-                    notifications = lucy_trackers[appt_id]['notifications'] if appt_id in lucy_trackers else {}
-                    
-                    # Create unique notification identifiers to prevent duplicates
-                    checked_in_id = f"{current_date}_{appt_id}_checked_in"
-                    closed_id = f"{current_date}_{appt_id}_closed" 
-                    arrived_id = f"{current_date}_{appt_id}_arrived"
-                    
-                    # Status change notifications (only if not sent today)
-                    if (prev == 'ARRIVED' and status == 'CHECKED_IN' and 
-                        not notifications.get('checked_in') and 
-                        checked_in_id not in notifications_sent_today):
-                        
-                        now_time = datetime.now()
-                        elapsed = (now_time - arrival_time) if arrival_time else timedelta(0)
-                        remaining = threshold - elapsed
-                        details['Elapsed Time'] = format_time_delta(elapsed)
-                        details['Time to Threshold'] = format_time_delta(remaining) if remaining > timedelta(0) else 'EXCEEDED'
-                        send_webhook_alert(
-                            title="Live Load Checked In",
-                            content=(f"Load Type: {load_type}\nAppointment ID: {appt_id}\nYou have {details['Time to Threshold']} to be LUCY compliant.\nDock Door: {dock_door}"),
-                            footer=f"FC: {fc}",
-                            appointment_details=details
-                        )
-                        notifications['checked_in'] = True
-                        notifications_sent_today.add(checked_in_id)
-                    
-                    if (prev == 'CHECKED_IN' and status == 'CLOSED' and 
-                        not notifications.get('closed') and 
-                        closed_id not in notifications_sent_today):
-                        
-                        now_time = datetime.now()
-                        elapsed = (now_time - arrival_time) if arrival_time else timedelta(0)
-                        details['Elapsed Time'] = format_time_delta(elapsed)
-                        details['Time to Threshold'] = format_time_delta(threshold - elapsed) if threshold - elapsed > timedelta(0) else 'EXCEEDED'
-                        if elapsed <= threshold:
-                            time_remaining = threshold - elapsed
-                            time_remaining_str = format_time_delta(time_remaining)
-                            send_webhook_alert(
-                                title="Live Load LUCY Compliance Met",
-                                content=(f"Load Type: {load_type}\nAppointment ID: {appt_id}\nClosed with {time_remaining_str} remaining to LUCY compliance.\nDock Door: {dock_door}"),
-                                footer=f"FC: {fc}",
-                                appointment_details=details
-                            )
-                            notifications['compliance'] = True
-                        else:
-                            time_exceeded = elapsed - threshold
-                            time_exceeded_str = format_time_delta(time_exceeded)
-                            send_webhook_alert(
-                                title="Live Load LUCY Compliance Missed",
-                                content=(f"Load Type: {load_type}\nAppointment ID: {appt_id}\nClosed {time_exceeded_str} after LUCY compliance threshold.\nDock Door: {dock_door}"),
-                                footer=f"FC: {fc}",
-                                appointment_details=details
-                            )
-                            notifications['missed'] = True
-                        notifications['closed'] = True
-                        notifications_sent_today.add(closed_id)
-                    
-                    if (status == 'ARRIVED' and 
-                        not notifications.get('initial') and 
-                        arrived_id not in notifications_sent_today):
-                        
-                        now_time = datetime.now()
-                        elapsed = now_time - arrival_time if arrival_time else timedelta(0)
-                        remaining = threshold - elapsed
-                        details['Elapsed Time'] = format_time_delta(elapsed)
-                        details['Time to Threshold'] = format_time_delta(remaining) if remaining > timedelta(0) else 'EXCEEDED'
-                        send_webhook_alert(
-                            title="LUCY Timer Started - Live Load Arrived",
-                            content=(f"Load Type: {load_type}\nAppointment ID: {appt_id}\nDock Door: {dock_door}\nYou have {details['Time to Threshold']} to be LUCY compliant."),
-                            footer=f"FC: {fc}",
-                            appointment_details=details
-                        )
-                        notifications['initial'] = True
-                        notifications_sent_today.add(arrived_id)
-                    
-                    previous_status[appt_id] = status
-                
-                # Check ongoing timers (with duplicate prevention)
-                now_time = datetime.now()
-                for appt_id, tracker in list(lucy_trackers.items()):
-                    if tracker['status'] != 'ARRIVED':
-                        continue
-                    start_time = tracker['start_time']
-                    threshold = tracker['threshold']
-                    elapsed = now_time - start_time
-                    remaining = threshold - elapsed
-                    halfway = threshold / 2
-                    
-                    details = {
-                        'Appointment ID': appt_id,
-                        'Load Type': tracker['load_type'],
-                        'Is Palletized': 'Yes' if tracker['load_type'] == 'Palletized' else 'No',
-                        'Is Live Load': 'Yes',
-                        'Status': tracker['status'],
-                        'LUCY Timer Started': start_time.strftime('%Y-%m-%d %H:%M:%S'),
-                        'Elapsed Time': format_time_delta(elapsed),
-                        'Time to Threshold': format_time_delta(threshold - elapsed) if threshold - elapsed > timedelta(0) else 'EXCEEDED',
-                        'Threshold': str(threshold),
-                        'Expected Completion Time': (start_time + threshold).strftime('%Y-%m-%d %H:%M:%S'),
-                        'Appointment Details Link': f'https://fc-inbound-dock-hub-na.aka.amazon.com/en_US/#/dockmaster/appointment/{fc}/view/{appt_id}/appointmentDetail'
-                    }
-                    
-                    notifications = tracker['notifications']
-                    
-                    # Create unique notification identifiers
-                    halfway_id = f"{current_date}_{appt_id}_halfway"
-                    thirty_min_id = f"{current_date}_{appt_id}_30min"
-                    missed_id = f"{current_date}_{appt_id}_missed"
-                    
-                    # Time-based notifications (only if not sent today)
-                    if (not notifications['halfway'] and elapsed >= halfway and 
-                        halfway_id not in notifications_sent_today):
-                        send_webhook_alert(
-                            title="LUCY Compliance Halfway",
-                            content=(f"Load Type: {tracker['load_type']}\nAppointment ID: {appt_id}\nHalfway to LUCY compliance threshold."),
-                            footer=f"FC: {fc}",
-                            appointment_details=details
-                        )
-                        notifications['halfway'] = True
-                        notifications_sent_today.add(halfway_id)
-                    
-                    if (not notifications['30min'] and threshold - elapsed <= timedelta(minutes=30) and 
-                        threshold - elapsed > timedelta(seconds=0) and 
-                        thirty_min_id not in notifications_sent_today):
-                        send_webhook_alert(
-                            title="LUCY Compliance Approaching (30 min)",
-                            content=(f"Load Type: {tracker['load_type']}\nAppointment ID: {appt_id}\n30 minutes remaining to LUCY compliance threshold."),
-                            footer=f"FC: {fc}",
-                            appointment_details=details
-                        )
-                        notifications['30min'] = True
-                        notifications_sent_today.add(thirty_min_id)
-                    
-                    if (not notifications['missed'] and elapsed > threshold and 
-                        missed_id not in notifications_sent_today):
-                        hours, remainder = divmod(elapsed.total_seconds(), 3600)
-                        minutes = remainder // 60
-                        send_webhook_alert(
-                            title="Live Load LUCY Compliance Missed",
-                            content=(f"Load Type: {tracker['load_type']}\nAppointment ID: {appt_id}\nMissed by: {int(hours)} hours and {int(minutes)} minutes"),
-                            footer=f"FC: {fc}",
-                            appointment_details=details
-                        )
-                        notifications['missed'] = True
-                        notifications_sent_today.add(missed_id)
-            else:
-                logging.warning("No appointment data found or unexpected format.")
-            
-            time.sleep(refresh_interval)
-            
-        except Exception as e:
-            logging.error(f"Error in monitoring loop: {e}")
-            logging.error(traceback.format_exc())
-            time.sleep(60)
+    run_monitor(fclm, monitor)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -29,9 +29,14 @@ echo ------------------------------------------
 wmic process where "name='python.exe' and commandline like '%%collect_arrivals.py%%'" get processid,commandline,creationdate,parentprocessid /format:table
 echo.
 
+echo [5b] Warm spare processes (standby, or scripts started on a spare)...
+echo ---------------------------------------------------------------------
+wmic process where "name='python.exe' and commandline like '%%warm_spare.py%%'" get processid,commandline,creationdate,parentprocessid /format:table
+echo.
+
 echo [6] Process tree view (showing parent-child relationships)...
 echo ----------------------------------------------------------
-for /f "skip=1 tokens=1,2" %%a in ('wmic process where "name='python.exe' and (commandline like '%%token_monitor.py%%' or commandline like '%%WorkingRate.py%%' or commandline like '%%fluid_load_monitor.py%%' or commandline like '%%collect_arrivals.py%%')" get processid,parentprocessid') do (
+for /f "skip=1 tokens=1,2" %%a in ('wmic process where "name='python.exe' and (commandline like '%%token_monitor.py%%' or commandline like '%%WorkingRate.py%%' or commandline like '%%fluid_load_monitor.py%%' or commandline like '%%collect_arrivals.py%%' or commandline like '%%warm_spare.py%%')" get processid,parentprocessid') do (
     if "%%a" neq "" (
         echo PID: %%a ^| Parent PID: %%b
     )
@@ -63,6 +68,7 @@ for /f %%i in ('wmic process where "name='python.exe' and commandline like '%%to
 for /f %%i in ('wmic process where "name='python.exe' and commandline like '%%WorkingRate.py%%'" get processid /format:value ^| find "ProcessId" ^| find /c "="') do echo WorkingRate.py processes: %%i
 for /f %%i in ('wmic process where "name='python.exe' and commandline like '%%fluid_load_monitor.py%%'" get processid /format:value ^| find "ProcessId" ^| find /c "="') do echo fluid_load_monitor.py processes: %%i
 for /f %%i in ('wmic process where "name='python.exe' and commandline like '%%collect_arrivals.py%%'" get processid /format:value ^| find "ProcessId" ^| find /c "="') do echo collect_arrivals.py processes: %%i
+for /f %%i in ('wmic process where "name='python.exe' and commandline like '%%warm_spare.py%%'" get processid /format:value ^| find "ProcessId" ^| find /c "="') do echo warm_spare.py processes: %%i
 echo.
 
 echo [9] Check recent log entries for clues...
@@ -1,5 +1,4 @@
-import requests
-from requests_kerberos import HTTPKerberosAuth, OPTIONAL
+import pendulum
 from urllib3 import disable_warnings
 import os
 import subprocess
@@ -10,9 +9,45 @@ from tabulate import tabulate
 import json
 import traceback
 import logging
-
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from alert_rules import RuleSet
+from monitor_channel import channel
+from http_cassette import recorder
+from http_client import Session, current_deadline, cycle_deadline, http_settings
+from history_store import AlertRow, HistoryRow, HistoryStore
+from monitor_clock import clock
+from monitor_config import load_config, get_setting
+from monitor_logging import setup_logging
+from negotiate_auth import NegotiateAuth, negotiated_hosts
+from sampling_profiler import profile_command
+from heap_snapshots import heap_command, start_tracking_from_config
+from parse_cache import ParseCache
+from report_diff import ReportDiff, diff_tables
+from report_scheduler import ReportScheduler, hourly_timetable, interval_timetable
+from rolling_uph import RollingUPH, SliceTotals
+from tracing import span
+
+PROCESS_PATH = "RECEIVE"
+FCLM_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.000"
+MAX_CONCURRENT_FETCHES = 8
+parse_cache = ParseCache("FluidLoadMonitor")
+
+# Webhook posts share one session so connections are reused between reports
+webhook_session = Session('send')
+
+# Columns compared when only changes are reported (config.json report_diff)
+DIFF_COLUMNS = ('Hours', 'UPH')
+
+DEFAULT_WORKFLOW_URL = "https://hooks.slack.com/triggers/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"
+DEFAULT_TARGETS = [
+    {"name": "Fluid Load", "process_id": "01003021", "process_path": PROCESS_PATH, "table_id": "4300032947"},
+]
 
 class FCLM:
     def __init__(self, fc: str):
@@ -22,9 +57,10 @@ class FCLM:
 
     def authenticate(self):
         self.cookie = self.mw_cookie()
-        self.session = requests.Session()
+        self.session = Session('fetch', hedge=True)
+        recorder.attach(self.session)
         self.session.cookies.update(self.cookie)
-        self.session.auth = HTTPKerberosAuth(mutual_authentication=OPTIONAL)
+        self.session.auth = NegotiateAuth()
         self.session.verify = False
 
         try:
@@ -70,7 +106,7 @@ class FCLM:
             )
         return cookies
 
-    def get_html_data(self, process_id: str, start_time: str, end_time: str):
+    def get_html_data(self, process_id: str, start_time: str, end_time: str, process_path: str = PROCESS_PATH):
         params = {
             "warehouseId": self.fc,
             "spanType": "Intraday",
@@ -78,66 +114,146 @@ class FCLM:
             "endDate": end_time,
             "reportFormat": "HTML",
             "processId": process_id,
-            "processPath": "RECEIVE"
+            "processPath": process_path
         }
 
+        channel.heartbeat('fetch')
         try:
-            response = self.session.get("https://fclm-portal.amazon.com/reports/functionRollup", params=params)
-            response.raise_for_status()
+            with channel.timed('fclm_fetch_seconds', failure_metric='fclm_fetch_failures_total', process_id=process_id), \
+                    span('fetch', process_id=process_id, process_path=process_path) as fetch_span:
+                response = self.session.get("https://fclm-portal.amazon.com/reports/functionRollup", params=params)
+                response.raise_for_status()
+                fetch_span.set(bytes=len(response.content))
             return response.text
         except Exception as e:
             logging.error(f"Failed to fetch HTML data: {e}")
             return None
 
 
-def parse_table(html_content, table_id):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    table = soup.find('table', {'id': 'function-4300032947'})
-
-    if not table:
-        logging.warning(f"Table {table_id} not found in the response")
-        return None
+def _display_number(text):
+    try:
+        return f"{float(text):.2f}" if text and text != '-' else '-'
+    except ValueError:
+        return '-'
 
-    columns = ['Login ID', 'Associate Name', 'Manager', 'Hours', 'Jobs', 'UPH']
-    data = []
 
+def _associate_rows(table):
     for row in table.find_all('tr', class_='empl-all'):
         cells = row.find_all(['td', 'th'])
-        if cells[0].text.strip().lower() == 'total':
+        if len(cells) < 23 or cells[0].text.strip().lower() == 'total':
             continue
+        yield cells
 
-        if len(cells) >= 22:
-            try:
-                case_uph = cells[22].text.strip()
-                case_uph_value = float(case_uph) if case_uph else 0
-                if case_uph_value >= 190:
-                    continue
-            except ValueError:
-                case_uph_value = 0
 
-            paid_hours = cells[8].text.strip()
-            jph = cells[10].text.strip()
-            name = ' '.join(word.capitalize() for word in cells[2].text.strip().split(',')[::-1])
-            manager = ' '.join(word.capitalize() for word in cells[3].text.strip().split(',')[::-1])
+def _display_name(cell):
+    return ' '.join(word.capitalize() for word in cell.text.strip().split(',')[::-1])
 
-            row_data = [
-                cells[1].text.strip(),
-                name,
-                manager,
-                f"{float(paid_hours):.2f}" if paid_hours and paid_hours != '-' else '-',
-                cells[9].text.strip(),
-                f"{float(case_uph):.2f}" if case_uph and case_uph != '-' else '-'
-            ]
 
-            row_data = ['-' if not cell else cell for cell in row_data]
-            if any(cell != '-' for cell in row_data):
-                data.append(row_data)
+def find_tables(html_content, table_ids):
+    """Parse a page once and pick out each requested function table (None where missing)"""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    tables = {}
+    for table_id in table_ids:
+        tables[table_id] = soup.find('table', {'id': f'function-{table_id}'})
+        if tables[table_id] is None:
+            logging.warning(f"Table {table_id} not found in the response")
+    return tables
+
+
+def table_columns(table):
+    """Every associate row of the table as numpy columns plus the cells' original text"""
+    logins, names, managers, hours, jobs, uph = [], [], [], [], [], []
+    for cells in _associate_rows(table):
+        logins.append(cells[1].text.strip())
+        names.append(_display_name(cells[2]))
+        managers.append(_display_name(cells[3]))
+        hours.append(cells[8].text.strip())
+        jobs.append(cells[9].text.strip())
+        uph.append(cells[22].text.strip())
+
+    columns = {
+        'Login ID': np.array(logins, dtype=object),
+        'Associate Name': np.array(names, dtype=object),
+        'Manager': np.array(managers, dtype=object),
+        'Hours': pd.to_numeric(pd.Series(hours, dtype=object), errors='coerce').to_numpy(dtype=float),
+        'Jobs': pd.to_numeric(pd.Series(jobs, dtype=object), errors='coerce').to_numpy(dtype=float),
+        # A blank or unreadable UPH counts as 0, so the associate is still reported
+        'UPH': pd.to_numeric(pd.Series(uph, dtype=object), errors='coerce').fillna(0).to_numpy(dtype=float),
+    }
+    return columns, {'Hours': hours, 'Jobs': jobs, 'UPH': uph}
 
-    return columns, data
+
+def extract_tables(html_content, table_ids):
+    """Parse a page once into (columns, text) for each requested table, None where it is missing"""
+    return {table_id: None if table is None else table_columns(table)
+            for table_id, table in find_tables(html_content, table_ids).items()}
+
+
+def flagged_rows(parsed, rules, process_path=PROCESS_PATH, flagged=None):
+    """Headers and display rows for the associates flagged by the alert rules.
+
+    flagged, if given, is the rules' evaluation of these columns, so it is not repeated.
+    """
+    columns, text = parsed
+    if flagged is None:
+        flagged = rules.evaluate(columns, process_path=process_path)
+
+    headers = ['Login ID', 'Associate Name', 'Manager', 'Hours', 'Jobs', 'UPH']
+    show_reasons = len(rules.rules) > 1
+    if show_reasons:
+        headers.append('Reason')
+
+    data = []
+    for index, reasons in flagged:
+        row_data = [
+            columns['Login ID'][index],
+            columns['Associate Name'][index],
+            columns['Manager'][index],
+            _display_number(text['Hours'][index]),
+            text['Jobs'][index],
+            _display_number(text['UPH'][index]),
+        ]
+        row_data = ['-' if not cell else cell for cell in row_data]
+        if not any(cell != '-' for cell in row_data):
+            continue
+        if show_reasons:
+            row_data.append('; '.join(reasons))
+        data.append(row_data)
+
+    return headers, data
+
+
+def associate_totals(parsed):
+    """Paid hours, jobs and case units per associate for one slice"""
+    columns, _ = parsed
+    hours = np.nan_to_num(columns['Hours'])
+    jobs = np.nan_to_num(columns['Jobs'])
+    # The page only has case UPH, so units are recovered from it to keep the window additive
+    units = columns['UPH'] * hours
+    totals = {}
+    for index, login in enumerate(columns['Login ID']):
+        if login:
+            totals[login] = SliceTotals(
+                columns['Associate Name'][index], columns['Manager'][index],
+                float(hours[index]), float(jobs[index]), float(units[index]))
+    return totals
+
+
+def parse_table(html_content, table_id, rules=None, process_path=PROCESS_PATH):
+    parsed = extract_tables(html_content, [table_id])[table_id]
+    if parsed is None:
+        return None
+    return flagged_rows(parsed, rules or RuleSet(), process_path)
+
+
+def parse_associate_totals(html_content, table_id):
+    """Per-associate slice totals, or None if the table is missing"""
+    parsed = extract_tables(html_content, [table_id])[table_id]
+    return None if parsed is None else associate_totals(parsed)
 
 
 def get_time_range():
-    now = datetime.now()
+    now = clock.local_now()
     end_time = now.replace(minute=0, second=0, microsecond=0)
     start_time = end_time - timedelta(hours=1)
     return start_time.strftime("%Y-%m-%dT%H:%M:%S.000"), end_time.strftime("%Y-%m-%dT%H:%M:%S.000")
@@ -149,101 +265,335 @@ def send_slack_message(workflow_url, title, metrics, footer):
         "metrics": metrics,
         "footer": footer
     }
+    channel.heartbeat('send')
     try:
-        response = requests.post(workflow_url, json=payload)
-        response.raise_for_status()
+        with channel.timed('webhook_send_seconds', failure_metric='webhook_failures_total', webhook='uph_alert'), \
+                span('send', payload_chars=len(metrics)):
+            response = webhook_session.post(workflow_url, json=payload)
+            response.raise_for_status()
         logging.info("Slack notification sent successfully")
+        return True
     except Exception as e:
         logging.error(f"Failed to send Slack notification: {e}")
+        return False
+
+
+class FluidTarget(NamedTuple):
+    name: str
+    process_id: str
+    process_path: str
+    table_id: str
+    workflow_url: str
+    rules: RuleSet
+
+
+def load_targets(config):
+    """Monitored (process id, process path, table) targets from config.json fluid_targets"""
+    global_rules = RuleSet.from_config(config)
+    targets = []
+    for entry in config.get('fluid_targets') or DEFAULT_TARGETS:
+        targets.append(FluidTarget(
+            name=entry.get('name') or f"{entry['process_id']} {entry.get('process_path', PROCESS_PATH)} {entry['table_id']}",
+            process_id=str(entry['process_id']),
+            process_path=entry.get('process_path', PROCESS_PATH),
+            table_id=str(entry['table_id']),
+            workflow_url=entry.get('workflow_url') or DEFAULT_WORKFLOW_URL,
+            # Targets may carry their own thresholds; otherwise the global alert_rules apply
+            rules=RuleSet.from_config(entry) if entry.get('alert_rules') else global_rules,
+        ))
+    # Rolling windows, change-only baselines and history rows are all keyed by target name
+    names = [target.name for target in targets]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"fluid_targets names must be unique, repeated: {', '.join(duplicates)}")
+    return targets
+
+
+def fetch_pages(fclm, targets, start_time, end_time):
+    """Fetch every distinct (process id, process path) page once, concurrently over the shared session"""
+    keys = list(dict.fromkeys((target.process_id, target.process_path) for target in targets))
+    if len(keys) == 1:
+        process_id, process_path = keys[0]
+        return {keys[0]: fclm.get_html_data(process_id, start_time, end_time, process_path)}
+    with ThreadPoolExecutor(max_workers=min(len(keys), MAX_CONCURRENT_FETCHES)) as pool:
+        # Each fetch runs in a copy of this context, so it sees the cycle's deadline
+        futures = {key: pool.submit(contextvars.copy_context().run, fclm.get_html_data, key[0], start_time, end_time, key[1])
+                   for key in keys}
+        return {key: future.result() for key, future in futures.items()}
+
+
+def parse_pages(pages, targets):
+    """Yield each target with its parsed table, parsing every fetched page only once"""
+    deadline = current_deadline()
+    for (process_id, process_path), html_content in pages.items():
+        page_targets = [t for t in targets if (t.process_id, t.process_path) == (process_id, process_path)]
+        if not html_content:
+            logging.warning(f"No HTML content retrieved for {process_id} {process_path}.")
+            continue
+        if not deadline.allows('parse'):
+            logging.warning(f"Out of parse budget, skipping {process_id} {process_path}.")
+            deadline.mark_missing(", ".join(t.name for t in page_targets))
+            continue
+        table_ids = [target.table_id for target in page_targets]
+        channel.heartbeat('parse')
+        with channel.timed('parse_seconds', table=",".join(table_ids)), span('parse', process_id=process_id, tables=len(table_ids)):
+            # An unchanged page (retry, overlapping window, FCLM not yet refreshed) reuses its last parse
+            tables = parse_cache.get_or_parse(
+                (process_id, process_path, tuple(table_ids)), html_content,
+                lambda html: extract_tables(html, table_ids))
+        for target in page_targets:
+            yield target, tables[target.table_id]
+
+
+def time_range_footer(start_time, end_time):
+    """Report footer, naming any targets this cycle had to leave out"""
+    footer = f"Time Range: {start_time} to {end_time}"
+    deadline = current_deadline()
+    return f"{footer}\n{deadline.partial_note()}" if deadline.partial else footer
+
+
+def mark_missing_pages(pages, targets):
+    """Record targets whose page could not be fetched, before anything is posted"""
+    deadline = current_deadline()
+    for target in targets:
+        if not pages.get((target.process_id, target.process_path)):
+            deadline.mark_missing(target.name)
+
+
+def local_time(fclm_time):
+    """FCLM request time string as a timezone-aware local datetime"""
+    return pendulum.instance(datetime.strptime(fclm_time, FCLM_TIME_FORMAT), tz=pendulum.local_timezone())
+
+
+def target_history_rows(target, parsed, window_start, window_end):
+    """History store rows for every associate in a target's parsed table"""
+    columns, _ = parsed
+    hours = np.nan_to_num(columns['Hours'])
+    jobs = np.nan_to_num(columns['Jobs'])
+    units = columns['UPH'] * hours
+    for index, login in enumerate(columns['Login ID']):
+        if login:
+            yield HistoryRow(
+                "FluidLoadMonitor", target.process_id, target.process_path, target.name, window_start, window_end,
+                login, columns['Associate Name'][index], float(units[index]), float(hours[index]),
+                float(columns['UPH'][index]), float(jobs[index]))
+
+
+def target_alert_rows(target, columns, flagged, window_start, window_end):
+    """History store rows for the associates the alert rules flagged"""
+    for index, reasons in flagged:
+        yield AlertRow(
+            "FluidLoadMonitor", target.process_id, target.process_path, target.name, window_start, window_end,
+            columns['Login ID'][index], columns['Associate Name'][index], columns['Manager'][index],
+            float(columns['Hours'][index]), float(columns['Jobs'][index]), float(columns['UPH'][index]),
+            '; '.join(reasons))
+
+
+def report_target_changes(target, headers, data, start_time, end_time, prefix, differ):
+    """Post only associates newly flagged, resolved or materially changed since the last post"""
+    rows = {str(row[0]): dict(zip(headers, row)) for row in data}
+    result = differ.diff(target.name, rows, DIFF_COLUMNS)
+    if result.empty:
+        logging.info(f"{target.name}: no changes since the last report, nothing posted")
+        return
+
+    with span('render', table=target.table_id, rows=len(result.new) + len(result.changed) + len(result.resolved)) as render_span:
+        sections = [f"{heading} ({len(section_rows)}):\n\n{tabulate(section_rows, headers=headers, tablefmt='pipe', disable_numparse=True)}"
+                    for heading, section_rows in diff_tables(result, headers, DIFF_COLUMNS)]
+        metrics = "```\n" + "\n\n".join(sections) + "\n```"
+        render_span.set(chars=len(metrics))
+    title = (f"{prefix} UPH Changes ({target.rules.label}) - {len(result.new)} New, "
+             f"{len(result.changed)} Changed, {len(result.resolved)} Resolved")
+    if send_slack_message(target.workflow_url, title, metrics, time_range_footer(start_time, end_time)):
+        differ.commit(target.name, rows, result, 'Login ID')
+
+
+def report_target(target, parsed, start_time, end_time, prefix, differ=None, flagged=None):
+    if parsed is None:
+        logging.warning(f"No table data parsed for {target.name}.")
+        return
+    rules = target.rules
+    headers, data = flagged_rows(parsed, rules, target.process_path, flagged)
+    if differ is not None:
+        report_target_changes(target, headers, data, start_time, end_time, prefix, differ)
+        return
+    if data:
+        logging.info(f"{target.name}: found {len(data)} associates {rules.label.lower()}")
+        with span('render', table=target.table_id, rows=len(data)) as render_span:
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(tabulate(data, headers=headers, tablefmt='fancy_grid'))
+            table_str = tabulate(data, headers=headers, tablefmt='pipe')
+            render_span.set(chars=len(table_str))
+
+        title = f"{prefix} Low UPH Alert - {len(data)} Associates {rules.label}"
+        metrics = f"```\nAssociates {rules.label} Case:\n\n{table_str}\n```"
+        footer = time_range_footer(start_time, end_time)
+        send_slack_message(target.workflow_url, title, metrics, footer)
+    else:
+        logging.info(f"✅ {target.name}: no associates {rules.label.lower()}.")
+        send_slack_message(
+            target.workflow_url,
+            f"{prefix} UPH Status - All Clear",
+            f"No associates {rules.label} Case",
+            time_range_footer(start_time, end_time)
+        )
+
+
+def report_prefix(target, targets):
+    # Only name the target in titles when several targets share the monitor
+    return "PSC2" if len(targets) == 1 else f"PSC2 {target.name}"
+
+
+def run_hour(fclm, targets, start_time, end_time, differ=None, history=None):
+    with span('uph_hour', start=start_time, end=end_time, targets=len(targets)), cycle_deadline('hourly'):
+        pages = fetch_pages(fclm, targets, start_time, end_time)
+        mark_missing_pages(pages, targets)
+        for target, parsed in parse_pages(pages, targets):
+            flagged = None
+            if parsed is not None:
+                flagged = target.rules.evaluate(parsed[0], process_path=target.process_path)
+            if history is not None and parsed is not None:
+                window_start, window_end = local_time(start_time), local_time(end_time)
+                history.record(target_history_rows(target, parsed, window_start, window_end))
+                history.record(target_alert_rows(target, parsed[0], flagged, window_start, window_end))
+            report_target(target, parsed, start_time, end_time, report_prefix(target, targets), differ, flagged)
+
+
+def alert_rolling_target(target, rolling, run, alert, last_alerted, prefix, history=None):
+    """Alert on associates the rules newly flag over the trailing window; returns who is now alerted"""
+    rules = target.rules
+    columns = rolling.columns()
+    flagged = rules.evaluate(columns, process_path=target.process_path)
+    logging.info(f"{target.name} slice {run.name}: {len(flagged)} associates {rules.label.lower()} over the last {rolling.covered_minutes()} min")
+    flagged_logins = {columns['Login ID'][index] for index, reasons in flagged}
+    window_start = run.window_end.subtract(minutes=rolling.covered_minutes())
+    if history is not None:
+        # Every slice re-evaluates the whole window, so only associates flagged since the last slice are recorded
+        newly_flagged = [(index, reasons) for index, reasons in flagged
+                         if columns['Login ID'][index] not in rolling.flagged]
+        history.record(target_alert_rows(target, columns, newly_flagged, window_start, run.window_end))
+    rolling.flagged = flagged_logins
+    if not alert:
+        return last_alerted
+    # Forget associates who recovered, so they are alerted again if they drop back below
+    still_alerted = last_alerted & flagged_logins
+    if flagged_logins <= still_alerted:
+        return still_alerted
+
+    headers = ['Login ID', 'Associate Name', 'Manager', 'Hours', 'Jobs', 'UPH']
+    data = []
+    for index, reasons in sorted(flagged, key=lambda item: columns['UPH'][item[0]]):
+        data.append([columns['Login ID'][index], columns['Associate Name'][index], columns['Manager'][index],
+                     f"{columns['Hours'][index]:.2f}", f"{columns['Jobs'][index]:.0f}", f"{columns['UPH'][index]:.2f}"])
+        if len(rules.rules) > 1:
+            data[-1].append('; '.join(reasons))
+    if len(rules.rules) > 1:
+        headers.append('Reason')
+    table_str = tabulate(data, headers=headers, tablefmt='pipe')
+    send_slack_message(
+        target.workflow_url,
+        f"{prefix} Low UPH Alert - {len(data)} Associates {rules.label} (rolling)",
+        f"```\nAssociates {rules.label} Case, trailing {rolling.covered_minutes()} min:\n\n{table_str}\n```",
+        time_range_footer(window_start.strftime(FCLM_TIME_FORMAT), run.window_end.strftime(FCLM_TIME_FORMAT))
+    )
+    return flagged_logins
+
+
+def run_rolling_slice(fclm, targets, rolling, run, alert, last_alerted, history=None):
+    """Fold one short slice into every target's trailing window and alert on newly flagged associates"""
+    start_time = run.window_start.strftime(FCLM_TIME_FORMAT)
+    end_time = run.window_end.strftime(FCLM_TIME_FORMAT)
+    with span('uph_slice', start=start_time, end=end_time, targets=len(targets)), cycle_deadline('rolling'):
+        pages = fetch_pages(fclm, targets, start_time, end_time)
+        mark_missing_pages(pages, targets)
+        for target, parsed in parse_pages(pages, targets):
+            if parsed is None:
+                continue
+            if history is not None:
+                history.record(target_history_rows(target, parsed, run.window_start, run.window_end))
+            rolling[target.name].add_slice(run.window_end.timestamp(), associate_totals(parsed))
+            last_alerted[target.name] = alert_rolling_target(
+                target, rolling[target.name], run, alert, last_alerted[target.name], report_prefix(target, targets), history)
+
+
+def normal_run(fclm, targets, config=None):
+    config = config or {}
+    parse_cache.configure(config)
+    http_settings.configure(config)
+    history = HistoryStore.from_config(config)
+    rolling_settings = get_setting(config, 'schedules', 'rolling_uph', {})
+    if rolling_settings.get('enabled'):
+        rolling_run(fclm, targets, config, rolling_settings, history)
+        return
+
+    # Fires at each hour boundary; the persisted schedule state stops restarts from
+    # re-sending an hour and catches up the hour that ended while the script was down
+    delay_minutes = get_setting(config, 'schedules', 'hourly', {}).get('delay_minutes', 0)
+    scheduler = ReportScheduler.from_config("FluidLoadMonitor", hourly_timetable(delay_minutes), config, 'hourly')
+    differ = ReportDiff.from_config("FluidLoadMonitor", config)
+
+    def handle(run):
+        logging.info(f"[⏰ {run.fire_time.format('YYYY-MM-DD HH:mm:ss')}] Fetching Fluid Load data for {run.name}...")
+        start_time = run.window_start.strftime(FCLM_TIME_FORMAT)
+        end_time = run.window_end.strftime(FCLM_TIME_FORMAT)
+        try:
+            run_hour(fclm, targets, start_time, end_time, differ, history)
+        except Exception as e:
+            logging.error(f"❌ Error occurred: {e}")
+            traceback.print_exc()
 
-
-def normal_run(fclm, workflow_url, process_id, table_id):
-    sent_hours_today = set()  # Track hours sent today
-    last_date = None  # Track date changes
-
-    while True:
+    try:
+        scheduler.run_forever(handle)
+    except KeyboardInterrupt:
+        logging.info("Interrupted by user.")
+
+
+def rolling_run(fclm, targets, config, settings, history=None):
+    # Fetches bucket_minutes slices and keeps a trailing window per associate, so a slow
+    # associate is flagged within one slice instead of at the end of the clock hour
+    bucket_minutes = settings.get('bucket_minutes', 15)
+    rolling = {target.name: RollingUPH(bucket_minutes, settings.get('window_minutes', 60)) for target in targets}
+    last_alerted = {target.name: set() for target in targets}
+    scheduler = ReportScheduler.from_config(
+        "FluidLoadMonitorRolling", interval_timetable(bucket_minutes, settings.get('delay_minutes', 1)), config, 'rolling_uph')
+
+    def handle(run):
+        # Catch-up slices only rebuild the window; alerting on stale data would just be noise
+        alert = clock.now(scheduler.tz) < run.fire_time.add(minutes=bucket_minutes)
         try:
-            now = datetime.now()
-            current_date = now.date()
-            current_hour = now.hour
-            
-            # Reset sent hours on new day
-            if last_date != current_date:
-                sent_hours_today.clear()
-                last_date = current_date
-                logging.info(f"New day detected: {current_date}. Clearing sent hours tracker.")
-            
-            # Create unique hour identifier with date and hour
-            hour_id = f"{current_date}_{current_hour}"
-            
-            # Only process if we haven't sent for this hour today
-            if hour_id not in sent_hours_today:
-                logging.info(f"[⏰ {now.strftime('%Y-%m-%d %H:%M:%S')}] Fetching Fluid Load data for hour {current_hour} (first time today)...")
-
-                start_time, end_time = get_time_range()
-                html_content = fclm.get_html_data(process_id, start_time, end_time)
-
-                if html_content:
-                    result = parse_table(html_content, table_id)
-                    if result:
-                        headers, data = result
-                        if data:
-                            logging.info(f"Found {len(data)} associates below 190 UPH")
-                            logging.info(tabulate(data, headers=headers, tablefmt='fancy_grid'))
-
-                            table_str = tabulate(data, headers=headers, tablefmt='pipe')
-                            title = f"PSC2 Low UPH Alert - {len(data)} Associates Below 190 UPH"
-                            metrics = f"```\nAssociates Below 190 UPH Case:\n\n{table_str}\n```"
-                            footer = f"Time Range: {start_time} to {end_time}"
-                            send_slack_message(workflow_url, title, metrics, footer)
-                        else:
-                            logging.info("✅ All associates above 190 UPH.")
-                            send_slack_message(
-                                workflow_url,
-                                "PSC2 UPH Status - All Clear",
-                                "All associates are at or above 190 UPH Case",
-                                f"Time Range: {start_time} to {end_time}"
-                            )
-                    else:
-                        logging.warning("No table data parsed.")
-                else:
-                    logging.warning("No HTML content retrieved.")
-
-                # Mark this hour as sent
-                sent_hours_today.add(hour_id)
-                logging.info(f"Completed processing for hour {current_hour}. Added to sent tracker.")
-                
-            elif current_hour != getattr(normal_run, 'last_logged_hour', None):
-                logging.info(f"Hour {current_hour} already processed today - skipping")
-                normal_run.last_logged_hour = current_hour
-
-            # Sleep 1 min then loop again
-            time.sleep(60)
-
-        except KeyboardInterrupt:
-            logging.info("Interrupted by user.")
-            break
+            run_rolling_slice(fclm, targets, rolling, run, alert, last_alerted, history)
         except Exception as e:
             logging.error(f"❌ Error occurred: {e}")
             traceback.print_exc()
-            time.sleep(300)
+
+    try:
+        scheduler.run_forever(handle)
+    except KeyboardInterrupt:
+        logging.info("Interrupted by user.")
 
 
 def main():
     # HARDCODED VALUES - No user input needed
     fc = "PSC2"
-    process_id = "01003021"
-    table_id = "4300032947"
-    workflow_url = "https://hooks.slack.com/triggers/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"
 
+    config = load_config()
+    setup_logging(config, "FluidLoadMonitor")
     logging.info("🚀 Starting automated Fluid Load monitoring for PSC2...")
     
     # NO STARTUP NOTIFICATION - Only send hourly metrics during scheduled times
     
+    recorder.configure(config, "FluidLoadMonitor")
+    negotiated_hosts.configure(config)
+    recorder.attach(webhook_session)
+    channel.add_command_handler('profile', profile_command)
+    channel.add_command_handler('heap', heap_command)
+    start_tracking_from_config(config)
+    targets = load_targets(config)
+    logging.info(f"Monitoring {len(targets)} target(s): {', '.join(t.name for t in targets)}")
     fclm = FCLM(fc)
     
     try:
-        normal_run(fclm, workflow_url, process_id, table_id)
+        normal_run(fclm, targets, config)
     except Exception as e:
         logging.error(f"Unhandled error: {e}")
         traceback.print_exc()
@@ -251,7 +601,7 @@ def main():
         # Send error notification
         try:
             send_slack_message(
-                workflow_url,
+                targets[0].workflow_url,
                 "❌ Fluid Load Monitor Error",
                 f"Error occurred in Fluid Load Monitor:\n```\n{str(e)}\n```",
                 "Monitor may need attention"
@@ -261,4 +611,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
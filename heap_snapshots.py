@@ -0,0 +1,184 @@
+import os
+import time
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from monitor_channel import channel
+from monitor_config import get_setting
+
+DEFAULT_REPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+DEFAULT_INTERVAL = 1800
+DEFAULT_FRAMES = 1
+DEFAULT_TOP = 25
+DEFAULT_WINDOW = 300
+
+# Allocations made by tracemalloc itself and the import machinery are never a leak in the scripts
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+class HeapTracker:
+    """Reports the allocation sites that grew between tracemalloc snapshots taken every interval seconds.
+
+    tracemalloc cannot sample and slows allocation-heavy code several times over while it
+    traces, so with a window the tracker only traces for the last window seconds of each
+    interval. Each report then shows what was allocated during the window and is still
+    alive, and sites that keep growing window after window are the leaks.
+    """
+
+    def __init__(self, name: str, interval: float = DEFAULT_INTERVAL, frames: int = DEFAULT_FRAMES,
+                 top: int = DEFAULT_TOP, snapshots: int = None, window: float = None, directory: str = None):
+        self.name = name
+        self.interval = interval
+        self.window = window if window and window < interval else None
+        self.frames = max(int(frames), 1)
+        self.top = top
+        self.snapshots = snapshots
+        self.directory = directory or DEFAULT_REPORT_DIR
+        self.path = os.path.join(self.directory, f"heap_{name}_{datetime.now().strftime('%Y%m%dT%H%M%S')}.txt")
+        self.previous: Optional[tracemalloc.Snapshot] = None
+        self.taken = 0
+        self.grown: Counter = Counter()  # reports each reported site has appeared in
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if tracemalloc.is_tracing():
+            # Someone else owns tracing, so it cannot be switched off between windows
+            self.window = None
+        os.makedirs(self.directory, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name="heap-snapshots", daemon=True)
+        self.thread.start()
+        what = f"for {self.window:.0f}s of every {self.interval:.0f}s" if self.window else f"every {self.interval:.0f}s"
+        logging.info(f"Tracking allocations {what} with {self.frames} frame(s), reporting to {self.path}")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+    def _run(self):
+        owns_tracing = not tracemalloc.is_tracing()
+        try:
+            if owns_tracing and not self.window:
+                tracemalloc.start(self.frames)
+            if not self.window:
+                self.previous = self._snapshot()
+            # Real time on purpose, like the profiler: snapshots follow the process, not monitor_clock
+            while not self.stop_event.wait(self.interval - (self.window or 0)):
+                if self.window:
+                    tracemalloc.start(self.frames)
+                    self.previous = self._snapshot()
+                    if self.stop_event.wait(self.window):
+                        break
+                self.take()
+                if self.window:
+                    self.previous = None
+                    tracemalloc.stop()
+                if self.snapshots and self.taken >= self.snapshots:
+                    break
+        except Exception as e:
+            logging.error(f"Allocation tracking failed: {e}")
+        finally:
+            self.previous = None
+            if owns_tracing and tracemalloc.is_tracing():
+                tracemalloc.stop()
+            _finished(self)
+            logging.info(f"Allocation tracking stopped after {self.taken} reports, see {self.path}")
+
+    def take(self):
+        """Snapshot the heap and append the growth since the previous snapshot to the report"""
+        started = time.perf_counter()
+        snapshot = self._snapshot()
+        group_by = 'traceback' if self.frames > 1 else 'lineno'
+        stats = snapshot.compare_to(self.previous, group_by)
+        self.previous = snapshot
+        self.taken += 1
+
+        current, peak = tracemalloc.get_traced_memory()
+        growth = sum(stat.size_diff for stat in stats)
+        growing = [stat for stat in stats if stat.size_diff > 0][:self.top]
+        for stat in growing:
+            self.grown[stat.traceback] += 1
+        with open(self.path, "at", encoding="utf-8") as f:
+            f.write(self.render(growing, current, peak, growth, time.perf_counter() - started))
+        channel.gauge('heap_traced_bytes', current)
+        channel.gauge('heap_growth_bytes', growth)
+
+    def render(self, growing: List[tracemalloc.StatisticDiff], current: int, peak: int, growth: int,
+               seconds: float) -> str:
+        since = f"in the last {self.window:.0f}s" if self.window else "since the last snapshot"
+        lines = [
+            f"=== Report {self.taken} at {datetime.now().isoformat(timespec='seconds')}: "
+            f"traced {current / 1024 / 1024:.1f} MB (peak {peak / 1024 / 1024:.1f} MB), "
+            f"{growth / 1024:+.1f} KB {since}, snapshot took {seconds:.2f}s",
+            f"{'Growth KB':>10}  {'Total KB':>10}  {'Blocks +':>9}  {'Reports':>7}  Site",
+        ]
+        for stat in growing:
+            frames = stat.traceback.format()[::-1] if self.frames > 1 else [str(stat.traceback[0])]
+            lines.append(f"{stat.size_diff / 1024:>10.1f}  {stat.size / 1024:>10.1f}  {stat.count_diff:>+9}  "
+                         f"{self.grown[stat.traceback]:>7}  {frames[0].strip()}")
+            lines.extend(f"{'':>44}{frame.strip()}" for frame in frames[1:] if frame.strip())
+        return "\n".join(lines) + "\n\n"
+
+
+active: Optional[HeapTracker] = None
+active_lock = threading.Lock()
+
+
+def _finished(tracker: HeapTracker):
+    global active
+    with active_lock:
+        if active is tracker:
+            active = None
+
+
+def start_tracking(interval: float = DEFAULT_INTERVAL, frames: int = DEFAULT_FRAMES, top: int = DEFAULT_TOP,
+                   snapshots: int = None, window: float = None, directory: str = None) -> Optional[HeapTracker]:
+    """Start allocation tracking in this process; None if it is already running"""
+    global active
+    with active_lock:
+        if active is not None:
+            return None
+        active = HeapTracker(channel.name, interval, frames, top, snapshots, window, directory)
+        tracker = active
+    tracker.start()
+    return tracker
+
+
+def start_tracking_from_config(config: Dict) -> Optional[HeapTracker]:
+    """Leave allocation tracking on for the life of the script when allocations.enabled is set"""
+    if not get_setting(config, 'allocations', 'enabled', False):
+        return None
+    return start_tracking(
+        get_setting(config, 'allocations', 'interval_minutes', DEFAULT_INTERVAL / 60) * 60,
+        get_setting(config, 'allocations', 'frames', DEFAULT_FRAMES),
+        get_setting(config, 'allocations', 'top', DEFAULT_TOP),
+        window=(get_setting(config, 'allocations', 'window_minutes', DEFAULT_WINDOW / 60) or 0) * 60,
+        directory=get_setting(config, 'allocations', 'dir'),
+    )
+
+
+def heap_command(message: Dict):
+    """Control channel handler for the supervisor's 'heap' command"""
+    if message.get('stop'):
+        with active_lock:
+            tracker = active
+        if tracker is None:
+            logging.warning("Ignoring heap stop command, allocation tracking is not running")
+        else:
+            tracker.stop()
+        return
+    if start_tracking(message.get('interval') or DEFAULT_INTERVAL, message.get('frames') or DEFAULT_FRAMES,
+                      message.get('top') or DEFAULT_TOP, message.get('snapshots'), message.get('window'),
+                      message.get('directory')) is None:
+        logging.warning("Ignoring heap command, allocation tracking is already running")
@@ -0,0 +1,322 @@
+import os
+import queue
+import atexit
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from monitor_config import get_setting
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history", "metrics.db")
+# Rows waiting for the writer thread; when it falls this far behind, new rows are dropped
+DEFAULT_MAX_QUEUED_ROWS = 100000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS associate_metrics (
+    report TEXT NOT NULL,
+    process_id TEXT NOT NULL,
+    process_path TEXT,
+    table_name TEXT NOT NULL,
+    window_start TEXT NOT NULL,
+    window_end TEXT NOT NULL,
+    date TEXT NOT NULL,
+    employee_id TEXT NOT NULL,
+    name TEXT,
+    units REAL,
+    paid_hours REAL,
+    rate REAL,
+    jobs REAL,
+    recorded_at TEXT NOT NULL,
+    PRIMARY KEY (report, table_name, window_start, window_end, employee_id)
+);
+CREATE INDEX IF NOT EXISTS idx_associate_metrics_employee_date ON associate_metrics (employee_id, date);
+CREATE INDEX IF NOT EXISTS idx_associate_metrics_date_table ON associate_metrics (date, table_name);
+
+CREATE TABLE IF NOT EXISTS uph_alerts (
+    report TEXT NOT NULL,
+    process_id TEXT NOT NULL,
+    process_path TEXT,
+    table_name TEXT NOT NULL,
+    window_start TEXT NOT NULL,
+    window_end TEXT NOT NULL,
+    date TEXT NOT NULL,
+    employee_id TEXT NOT NULL,
+    name TEXT,
+    manager TEXT,
+    hours REAL,
+    jobs REAL,
+    uph REAL,
+    reason TEXT,
+    recorded_at TEXT NOT NULL,
+    PRIMARY KEY (report, table_name, window_start, window_end, employee_id)
+);
+CREATE INDEX IF NOT EXISTS idx_uph_alerts_employee_date ON uph_alerts (employee_id, date);
+CREATE INDEX IF NOT EXISTS idx_uph_alerts_date_table ON uph_alerts (date, table_name);
+
+CREATE TABLE IF NOT EXISTS lucy_outcomes (
+    fc TEXT NOT NULL,
+    appointment_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    load_type TEXT NOT NULL,
+    dock_door TEXT,
+    arrival_time TEXT NOT NULL,
+    closed_time TEXT NOT NULL,
+    threshold_seconds REAL NOT NULL,
+    elapsed_seconds REAL NOT NULL,
+    compliant INTEGER NOT NULL,
+    recorded_at TEXT NOT NULL,
+    PRIMARY KEY (fc, appointment_id)
+);
+CREATE INDEX IF NOT EXISTS idx_lucy_outcomes_date_load_type ON lucy_outcomes (date, load_type);
+
+CREATE TABLE IF NOT EXISTS daily_rates (
+    date TEXT NOT NULL,
+    report TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    associates INTEGER NOT NULL,
+    units REAL,
+    paid_hours REAL,
+    rate REAL,
+    PRIMARY KEY (date, report, table_name)
+);
+
+CREATE TABLE IF NOT EXISTS daily_alerts (
+    date TEXT NOT NULL,
+    report TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    alerts INTEGER NOT NULL,
+    associates INTEGER NOT NULL,
+    PRIMARY KEY (date, report, table_name)
+);
+
+CREATE TABLE IF NOT EXISTS daily_lucy (
+    date TEXT NOT NULL,
+    load_type TEXT NOT NULL,
+    loads INTEGER NOT NULL,
+    met INTEGER NOT NULL,
+    missed INTEGER NOT NULL,
+    miss_rate REAL NOT NULL,
+    avg_elapsed_seconds REAL,
+    PRIMARY KEY (date, load_type)
+);
+"""
+
+# Daily rollups are rebuilt for every date a batch touches, so dashboards never aggregate raw rows
+ROLLUPS = {
+    'associate_metrics': ("daily_rates", """
+        INSERT INTO daily_rates
+        SELECT date, report, table_name, COUNT(DISTINCT employee_id), SUM(units), SUM(paid_hours),
+               CASE WHEN SUM(paid_hours) > 0 THEN SUM(units) / SUM(paid_hours) END
+        FROM associate_metrics WHERE date = ? GROUP BY date, report, table_name
+    """),
+    'uph_alerts': ("daily_alerts", """
+        INSERT INTO daily_alerts
+        SELECT date, report, table_name, COUNT(*), COUNT(DISTINCT employee_id)
+        FROM uph_alerts WHERE date = ? GROUP BY date, report, table_name
+    """),
+    'lucy_outcomes': ("daily_lucy", """
+        INSERT INTO daily_lucy
+        SELECT date, load_type, COUNT(*), SUM(compliant), COUNT(*) - SUM(compliant),
+               1.0 * (COUNT(*) - SUM(compliant)) / COUNT(*), AVG(elapsed_seconds)
+        FROM lucy_outcomes WHERE date = ? GROUP BY date, load_type
+    """),
+}
+
+
+class HistoryRow(NamedTuple):
+    report: str
+    process_id: str
+    process_path: Optional[str]
+    table_name: str
+    window_start: datetime
+    window_end: datetime
+    employee_id: str
+    name: str
+    units: float
+    paid_hours: float
+    rate: float
+    jobs: Optional[float] = None
+
+
+class AlertRow(NamedTuple):
+    report: str
+    process_id: str
+    process_path: Optional[str]
+    table_name: str
+    window_start: datetime
+    window_end: datetime
+    employee_id: str
+    name: str
+    manager: str
+    hours: float
+    jobs: float
+    uph: float
+    reason: str
+
+
+class LucyOutcome(NamedTuple):
+    fc: str
+    appointment_id: str
+    load_type: str
+    dock_door: str
+    arrival_time: datetime
+    closed_time: datetime
+    threshold_seconds: float
+    elapsed_seconds: float
+    compliant: bool
+
+
+def _metric_values(row: HistoryRow, recorded_at: str) -> Tuple:
+    return (row.report, row.process_id, row.process_path, row.table_name,
+            row.window_start.isoformat(), row.window_end.isoformat(), row.window_start.strftime("%Y-%m-%d"),
+            row.employee_id, row.name, row.units, row.paid_hours, row.rate, row.jobs, recorded_at)
+
+
+def _alert_values(row: AlertRow, recorded_at: str) -> Tuple:
+    return (row.report, row.process_id, row.process_path, row.table_name,
+            row.window_start.isoformat(), row.window_end.isoformat(), row.window_start.strftime("%Y-%m-%d"),
+            row.employee_id, row.name, row.manager, row.hours, row.jobs, row.uph, row.reason, recorded_at)
+
+
+def _lucy_values(row: LucyOutcome, recorded_at: str) -> Tuple:
+    return (row.fc, row.appointment_id, row.arrival_time.strftime("%Y-%m-%d"), row.load_type, row.dock_door,
+            row.arrival_time.isoformat(), row.closed_time.isoformat(), row.threshold_seconds,
+            row.elapsed_seconds, int(row.compliant), recorded_at)
+
+
+# Row type -> (table, insert statement, row to values, position of the date in the values)
+WRITERS = {
+    HistoryRow: ('associate_metrics', """
+        INSERT OR REPLACE INTO associate_metrics
+            (report, process_id, process_path, table_name, window_start, window_end, date,
+             employee_id, name, units, paid_hours, rate, jobs, recorded_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, _metric_values, 6),
+    AlertRow: ('uph_alerts', """
+        INSERT OR REPLACE INTO uph_alerts
+            (report, process_id, process_path, table_name, window_start, window_end, date,
+             employee_id, name, manager, hours, jobs, uph, reason, recorded_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, _alert_values, 6),
+    LucyOutcome: ('lucy_outcomes', """
+        INSERT OR REPLACE INTO lucy_outcomes
+            (fc, appointment_id, date, load_type, dock_door, arrival_time, closed_time,
+             threshold_seconds, elapsed_seconds, compliant, recorded_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, _lucy_values, 2),
+}
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open the history database, creating the schema if needed"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Several scripts write to the same file, so wait on their locks instead of failing
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class HistoryStore:
+    """Appends report rows, alerts and LUCY outcomes to SQLite from a background thread in batched transactions"""
+
+    def __init__(self, path: str = None, batch_size: int = 500, flush_interval: float = 5,
+                 max_queued_rows: int = DEFAULT_MAX_QUEUED_ROWS):
+        self.path = path or DEFAULT_HISTORY_PATH
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # 0 leaves the queue unbounded, for a batch job that must not lose rows
+        self.queue: "queue.Queue[Optional[NamedTuple]]" = queue.Queue(max_queued_rows)
+        self.disabled = False
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_config(cls, config: Dict) -> Optional["HistoryStore"]:
+        """HistoryStore for the config.json history section, or None if history is turned off"""
+        if not get_setting(config, 'history', 'enabled', False):
+            return None
+        return cls(
+            get_setting(config, 'history', 'path'),
+            get_setting(config, 'history', 'batch_size', 500),
+            get_setting(config, 'history', 'flush_interval_seconds', 5),
+            get_setting(config, 'history', 'max_queued_rows', DEFAULT_MAX_QUEUED_ROWS),
+        )
+
+    def record(self, rows: Iterable[NamedTuple]):
+        """Queue rows for writing; never blocks the report, and drops rows the writer cannot take"""
+        if self.disabled or not self.thread.is_alive():
+            return
+        for row in rows:
+            try:
+                self.queue.put_nowait(row)
+            except queue.Full:
+                self.dropped += 1
+
+    def _write_loop(self):
+        try:
+            conn = connect(self.path)
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"History store disabled, cannot open {self.path}: {e}")
+            self.disabled = True
+            return
+
+        stopping = False
+        while not stopping:
+            batch: List[NamedTuple] = []
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            # Gather whatever else is already queued, up to one batch
+            while True:
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if self.dropped:
+                logging.warning(f"History writer fell behind, {self.dropped} rows were dropped")
+                self.dropped = 0
+            if batch:
+                self._write(conn, batch)
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: List[NamedTuple]):
+        recorded_at = datetime.now().isoformat(timespec='seconds')
+        by_type: Dict[type, List] = {}
+        for row in batch:
+            by_type.setdefault(type(row), []).append(row)
+        try:
+            with conn:
+                for row_type, rows in by_type.items():
+                    table, insert, to_values, date_index = WRITERS[row_type]
+                    values = [to_values(row, recorded_at) for row in rows]
+                    conn.executemany(insert, values)
+                    rollup_table, rollup = ROLLUPS[table]
+                    for date in {value[date_index] for value in values}:
+                        conn.execute(f"DELETE FROM {rollup_table} WHERE date = ?", (date,))
+                        conn.execute(rollup, (date,))
+            logging.debug(f"Wrote {len(batch)} history rows")
+        except Exception as e:
+            # Only this batch is lost; the writer carries on with the next one
+            logging.error(f"Failed to write {len(batch)} history rows: {e}")
+
+    def close(self, timeout: float = 10):
+        """Flush queued rows and stop the writer"""
+        if self.thread.is_alive():
+            try:
+                self.queue.put(None, timeout=timeout)
+            except queue.Full:
+                logging.warning("History writer still behind at exit, unwritten rows are lost")
+                return
+            self.thread.join(timeout)
@@ -0,0 +1,374 @@
+import os
+import sys
+import gzip
+import json
+import time
+import logging
+import argparse
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_client import Session
+from monitor_clock import clock
+from monitor_config import get_setting, load_config
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CASSETTE_DIR = os.path.join(MODULE_DIR, "cassettes")
+DEFAULT_BENCH_DIR = os.path.join(MODULE_DIR, "bench_output")
+
+# Header the replay adapter uses to tell the stand-in server which host a request was meant for
+HOST_HEADER = "X-Cassette-Host"
+
+# Response headers worth replaying; bodies are stored decoded, so encoding headers are dropped
+KEPT_HEADERS = ("Content-Type",)
+
+RequestKey = Tuple[str, str, str, str]
+
+
+def request_key(method: str, host: str, path: str, query: str) -> RequestKey:
+    """Match key for an interaction; query parameters are sorted so their order does not matter"""
+    return method.upper(), host.lower(), path, urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+
+
+def _body_text(body) -> Optional[str]:
+    if body is None:
+        return None
+    return body.decode("utf-8", "replace") if isinstance(body, bytes) else str(body)
+
+
+class CassetteRecorder:
+    """Appends every request and response on attached sessions to a gzipped JSON-lines cassette"""
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.lock = threading.Lock()
+
+    def configure(self, config: Dict, name: str):
+        """Start recording if config.json cassettes.record is on"""
+        if not get_setting(config, 'cassettes', 'record', False):
+            return
+        directory = get_setting(config, 'cassettes', 'dir', DEFAULT_CASSETTE_DIR)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{name}_{datetime.now().strftime('%Y%m%dT%H%M%S')}.jsonl.gz")
+        logging.warning(f"Recording HTTP traffic to {self.path}")
+
+    def attach(self, session: requests.Session):
+        """Record this session's traffic; does nothing unless recording is configured"""
+        if self.path is None:
+            return
+        adapter = RecordingAdapter(self)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+    def write(self, interaction: Dict):
+        line = json.dumps(interaction) + "\n"
+        with self.lock:
+            # Each append is its own gzip member; readers see one continuous stream
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+
+
+recorder = CassetteRecorder()
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Transport adapter that passes requests through and saves each exchange with its timing"""
+
+    def __init__(self, cassette_recorder: CassetteRecorder, **kwargs):
+        super().__init__(**kwargs)
+        self.recorder = cassette_recorder
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        response = super().send(request, **kwargs)
+        # Reading the body here includes the transfer in the recorded time
+        content = response.content
+        elapsed = time.perf_counter() - started
+        # Negotiate challenges are left out; replayed sessions do not authenticate
+        if response.status_code != 401:
+            try:
+                self.recorder.write({
+                    'time': datetime.now().isoformat(timespec='seconds'),
+                    'method': request.method,
+                    'url': request.url,
+                    'request_body': _body_text(request.body),
+                    'status': response.status_code,
+                    'headers': {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+                    'body': content.decode(response.encoding or 'utf-8', 'replace'),
+                    'elapsed': round(elapsed, 4),
+                })
+            except (OSError, ValueError) as e:
+                logging.error(f"Failed to record {request.method} {request.url}: {e}")
+        return response
+
+
+def load_cassettes(paths: List[str]) -> List[Dict]:
+    interactions = []
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    interactions.append(json.loads(line))
+    return interactions
+
+
+class CassetteServer:
+    """Local stand-in for FCLM, the appointment service and Slack that answers from cassettes.
+
+    Requests are matched on method, host, path and query; repeats of the same request get the
+    recorded responses in order, then the last one again. A request whose query was never
+    recorded (e.g. a different time window) falls back to the responses for its path sharing the
+    most query parameters, such as the same processId, and then to any response from the same
+    host, which covers webhooks posted to another workflow URL.
+    speed scales the recorded latency: 1 replays it as recorded, 10 ten times faster, 0 not at all.
+    """
+
+    def __init__(self, interactions: List[Dict], speed: float = 1.0, host: str = "127.0.0.1", port: int = 0,
+                 on_post: Callable[[float], None] = None):
+        self.speed = speed
+        self.on_post = on_post  # called with the clock time of every POST, e.g. to measure alert latency
+        self.exact: Dict[RequestKey, List[Dict]] = {}
+        self.by_path: Dict[Tuple[str, str, str], List[Dict]] = {}
+        self.by_host: Dict[Tuple[str, str], List[Dict]] = {}
+        for interaction in interactions:
+            parts = urlsplit(interaction['url'])
+            key = request_key(interaction['method'], parts.netloc, parts.path, parts.query)
+            self.exact.setdefault(key, []).append(interaction)
+            self.by_path.setdefault(key[:3], []).append(interaction)
+            self.by_host.setdefault(key[:2], []).append(interaction)
+        self.served: Dict[tuple, int] = {}
+        self.requests = 0
+        self.unmatched = 0
+        self.posts: List[Tuple[float, str, Optional[str]]] = []  # (clock time, host and path, body)
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.address = "%s:%d" % self.httpd.server_address[:2]
+        self.thread: Optional[threading.Thread] = None
+
+    def _closest(self, key: RequestKey) -> Tuple[RequestKey, Optional[List[Dict]]]:
+        """Recorded requests for the same path that share the most query parameters with key"""
+        candidates = self.by_path.get(key[:3])
+        if not candidates:
+            return key[:3], None
+        wanted = set(parse_qsl(key[3]))
+        shared = [len(wanted & set(parse_qsl(urlsplit(c['url']).query))) for c in candidates]
+        best = max(shared)
+        closest = [c for c, count in zip(candidates, shared) if count == best]
+        return key[:3] + (urlsplit(closest[0]['url']).query,), closest
+
+    def match(self, method: str, host: str, path: str, query: str, body: Optional[str]) -> Optional[Dict]:
+        key = request_key(method, host, path, query)
+        if method.upper() == "POST" and self.on_post is not None:
+            self.on_post(clock.time())
+        with self.lock:
+            self.requests += 1
+            if method.upper() == "POST":
+                self.posts.append((clock.time(), f"{host}{path}", body))
+            for match_key, candidates in ((key, self.exact.get(key)), self._closest(key),
+                                          (key[:2], self.by_host.get(key[:2]))):
+                if candidates:
+                    index = self.served.get(match_key, 0)
+                    self.served[match_key] = index + 1
+                    return candidates[min(index, len(candidates) - 1)]
+            self.unmatched += 1
+            return None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = _body_text(self.rfile.read(length)) if length else None
+                path, _, query = self.path.partition("?")
+                host = self.headers.get(HOST_HEADER, self.headers.get("Host", ""))
+                interaction = server.match(self.command, host, path, query, body)
+                if interaction is None:
+                    logging.warning(f"No recorded response for {self.command} {host}{self.path}")
+                    self._reply(404, {"Content-Type": "text/plain"}, "Not recorded\n")
+                    return
+                if server.speed:
+                    time.sleep(interaction['elapsed'] / server.speed)
+                self._reply(interaction['status'], interaction.get('headers', {}), interaction['body'])
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def _reply(self, status: int, headers: Dict[str, str], body: str):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logging.debug(f"Replay request: {format % args}")
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="cassette-server", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Transport adapter that sends every request to a CassetteServer instead of the real host"""
+
+    def __init__(self, address: str, **kwargs):
+        super().__init__(**kwargs)
+        self.address = address
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.headers[HOST_HEADER] = parts.netloc
+        request.url = urlunsplit(("http", self.address, parts.path, parts.query, ""))
+        return super().send(request, **kwargs)
+
+
+def replay_session(session: requests.Session, server: CassetteServer) -> requests.Session:
+    """Point a session at the stand-in server"""
+    adapter = ReplayAdapter(server.address)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.auth = None
+    return session
+
+
+def replay_fclm(cls, server: CassetteServer, fc: str = "PSC2"):
+    """An FCLM client of any of the scripts that skips Midway/Kerberos and talks to the stand-in"""
+    fclm = cls.__new__(cls)
+    fclm.fc = fc
+    fclm.cookie = {}
+    fclm.session = replay_session(Session('fetch', hedge=True), server)
+    # Pre-warming re-authenticates; against the stand-in there is nothing to do
+    fclm.authenticate = lambda: None
+    return fclm
+
+
+def quarter_cycle(server: CassetteServer, config: Dict):
+    """One run_quarter for the most recent finished quarter"""
+    import pendulum
+    import WorkingRate
+    from backfill import quarter_windows
+    from report_scheduler import DEFAULT_TIMEZONE
+
+    replay_session(WorkingRate.webhook_session, server)
+    fclm = replay_fclm(WorkingRate.FCLM, server)
+    tz = get_setting(config, 'schedules', 'timezone', DEFAULT_TIMEZONE)
+    today = pendulum.today(tz).date()
+    windows = [w for w in quarter_windows(today.subtract(days=1), today, WorkingRate.get_quarters(config), tz=tz)
+               if w.end <= pendulum.now(tz)]
+    window = windows[-1]
+    url = "https://hooks.slack.com/triggers/replay"
+
+    def cycle():
+        WorkingRate.run_quarter(fclm, url, window.quarter, window.start, window.end)
+    return cycle
+
+
+def fluid_cycle(server: CassetteServer, config: Dict):
+    """One fluid load hour for every configured target"""
+    import fluid_load_monitor
+
+    replay_session(fluid_load_monitor.webhook_session, server)
+    fclm = replay_fclm(fluid_load_monitor.FCLM, server)
+    targets = fluid_load_monitor.load_targets(config)
+    start_time, end_time = fluid_load_monitor.get_time_range()
+
+    def cycle():
+        fluid_load_monitor.run_hour(fclm, targets, start_time, end_time)
+    return cycle
+
+
+def arrivals_cycle(server: CassetteServer, config: Dict):
+    """One collect_arrivals poll, keeping LUCY state between cycles like the live loop does"""
+    import collect_arrivals
+
+    replay_session(collect_arrivals.webhook_session, server)
+    fclm = replay_fclm(collect_arrivals.FCLM, server)
+    monitor = collect_arrivals.ArrivalsMonitor(fclm.fc)
+
+    def cycle():
+        monitor.poll(fclm)
+    return cycle
+
+
+PIPELINES = {
+    'quarter': quarter_cycle,
+    'fluid': fluid_cycle,
+    'arrivals': arrivals_cycle,
+}
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def bench(pipeline: str, cassettes: List[str], cycles: int = 5, speed: float = 0, config: Dict = None) -> Dict:
+    """Run full cycles of a pipeline against replayed traffic and time them"""
+    config = config or {}
+    server = CassetteServer(load_cassettes(cassettes), speed)
+    server.start()
+    try:
+        cycle = PIPELINES[pipeline](server, config)
+        wall, cpu = [], []
+        for _ in range(cycles):
+            wall_started, cpu_started = time.perf_counter(), time.process_time()
+            cycle()
+            wall.append(time.perf_counter() - wall_started)
+            cpu.append(time.process_time() - cpu_started)
+    finally:
+        server.stop()
+    return {
+        'pipeline': pipeline,
+        'cassettes': [os.path.basename(path) for path in cassettes],
+        'cycles': cycles,
+        'speed': speed,
+        'wall_seconds': {'p50': _percentile(wall, 0.5), 'p95': _percentile(wall, 0.95), 'max': max(wall), 'total': sum(wall)},
+        'cpu_seconds_per_cycle': sum(cpu) / cycles,
+        'requests': server.requests,
+        'unmatched_requests': server.unmatched,
+        'webhook_posts': len(server.posts),
+        'recorded_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark report pipelines offline against recorded HTTP traffic")
+    parser.add_argument("pipeline", choices=sorted(PIPELINES))
+    parser.add_argument("cassettes", nargs="+", help="Cassette files recorded with cassettes.record")
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--speed", type=float, default=0, help="Latency speed-up: 1 = as recorded, 0 = no delay (default)")
+    parser.add_argument("--output", help="JSON file to write (default: bench_output/<pipeline>_<time>.json)")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own logging")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    result = bench(args.pipeline, args.cassettes, args.cycles, args.speed, load_config())
+
+    output = args.output or os.path.join(DEFAULT_BENCH_DIR, f"{args.pipeline}_{datetime.now().strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "wt", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    json.dump(result, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+import io
+import json
+import math
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+
+try:
+    import ijson
+except ImportError:  # without ijson, read_json buffers the decompressed body once
+    ijson = None
+
+from monitor_channel import channel
+from monitor_config import get_setting
+
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 60
+# A cycle that ran over still gets this long to post what it has
+DEFAULT_MIN_SEND_TIMEOUT = 10
+
+STAGES = ('fetch', 'parse', 'send')
+DEFAULT_STAGE_SHARES = {'fetch': 0.6, 'parse': 0.25, 'send': 0.15}
+
+# Whole-cycle budgets in seconds; a cycle without one only gets the default timeouts
+DEFAULT_BUDGETS = {
+    'quarter': 240,
+    'hourly': 300,
+    'rolling': 240,
+    'arrivals': 45,
+}
+
+# A GET still running after this percentile of the endpoint's recent latencies gets a duplicate
+DEFAULT_HEDGE_PERCENTILE = 0.95
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+DEFAULT_HEDGE_MIN_DELAY = 2
+DEFAULT_LATENCY_HISTORY = 200
+MAX_HEDGE_WORKERS = 16
+
+# Consecutive failures that open an endpoint's circuit, and how long it stays open before a probe
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_OPEN_SECONDS = 60
+DEFAULT_MAX_OPEN_SECONDS = 900
+
+
+class BodySizes(NamedTuple):
+    wire: int  # bytes received, before Content-Encoding is undone
+    decoded: int
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Raised instead of starting a request when its cycle stage has no budget left"""
+
+
+class CircuitOpen(requests.exceptions.ConnectionError):
+    """Raised instead of sending to an endpoint whose circuit is open"""
+
+
+class Deadline:
+    """Time budget for one report cycle, split into fetch, parse and send shares.
+
+    A stage may run until only the later stages' shares are left, so time an early stage
+    does not use rolls over to the stages after it.
+    """
+
+    def __init__(self, name: str, seconds: float = None, shares: Dict[str, float] = None):
+        self.name = name
+        self.seconds = seconds if seconds else math.inf
+        shares = shares or DEFAULT_STAGE_SHARES
+        total = sum(shares.values()) or 1
+        self.reserve: Dict[str, float] = {}  # stage -> seconds held back for the stages after it
+        later = 0.0
+        for stage in reversed(STAGES):
+            self.reserve[stage] = self.seconds * later / total if later and math.isfinite(self.seconds) else 0.0
+            later += shares.get(stage, 0)
+        self.started = time.monotonic()
+        self.exceeded: Set[str] = set()  # stages that ran out of budget
+        self.missing: List[str] = []  # parts of the report left out
+        self.token = None
+
+    def remaining(self, stage: str = None) -> float:
+        left = self.seconds - (time.monotonic() - self.started)
+        return left - self.reserve.get(stage, 0) if stage else left
+
+    def allows(self, stage: str) -> bool:
+        """Whether stage still has budget; records the overrun if not"""
+        if self.remaining(stage) > 0:
+            return True
+        self.exceeded.add(stage)
+        return False
+
+    def timeout(self, stage: str, connect: float, read: float, min_send: float) -> Tuple[float, float]:
+        """(connect, read) timeouts for a request made in stage, capped by what is left of its budget"""
+        left = self.remaining(stage)
+        if stage == 'send':
+            left = max(left, min_send)
+        elif left <= 0:
+            self.exceeded.add(stage)
+            raise DeadlineExceeded(f"{self.name} cycle has no {stage} budget left")
+        return min(connect, left), min(read, left)
+
+    def mark_missing(self, what: str):
+        """Record a part of the report that is left out, so what is posted can be marked partial"""
+        self.missing.append(what)
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.missing)
+
+    def partial_note(self) -> str:
+        reason = "cycle deadline exceeded" if self.exceeded else "fetch failed"
+        return f"⚠️ Partial data ({reason}), missing: {', '.join(self.missing)}"
+
+    def finish(self):
+        """End the cycle: later requests fall back to the default timeouts"""
+        if self.token is not None:
+            current.reset(self.token)
+            self.token = None
+        if self.exceeded:
+            channel.increment('cycle_deadline_exceeded_total', cycle=self.name)
+            logging.warning(f"{self.name} cycle ran out of budget in {', '.join(sorted(self.exceeded))} "
+                            f"after {time.monotonic() - self.started:.1f}s of {self.seconds:.0f}s")
+
+
+class HttpSettings:
+    """Timeouts, cycle budgets, hedging and circuit breaker settings from config.json http"""
+
+    def __init__(self):
+        self.connect = DEFAULT_CONNECT_TIMEOUT
+        self.read = DEFAULT_READ_TIMEOUT
+        self.min_send = DEFAULT_MIN_SEND_TIMEOUT
+        self.budgets = dict(DEFAULT_BUDGETS)
+        self.shares = dict(DEFAULT_STAGE_SHARES)
+        self.hedge_enabled = True
+        self.hedge_percentile = DEFAULT_HEDGE_PERCENTILE
+        self.hedge_min_samples = DEFAULT_HEDGE_MIN_SAMPLES
+        self.hedge_min_delay = DEFAULT_HEDGE_MIN_DELAY
+        self.latency_history = DEFAULT_LATENCY_HISTORY
+        self.failure_threshold = DEFAULT_FAILURE_THRESHOLD
+        self.open_seconds = DEFAULT_OPEN_SECONDS
+        self.max_open_seconds = DEFAULT_MAX_OPEN_SECONDS
+
+    def configure(self, config: Dict):
+        self.connect = get_setting(config, 'http', 'connect_timeout', self.connect)
+        self.read = get_setting(config, 'http', 'read_timeout', self.read)
+        self.min_send = get_setting(config, 'http', 'min_send_timeout', self.min_send)
+        self.budgets.update(get_setting(config, 'http', 'cycle_budgets', {}))
+        self.shares.update(get_setting(config, 'http', 'stage_shares', {}))
+        hedge = get_setting(config, 'http', 'hedge', {})
+        self.hedge_enabled = hedge.get('enabled', self.hedge_enabled)
+        self.hedge_percentile = hedge.get('percentile', self.hedge_percentile)
+        self.hedge_min_samples = hedge.get('min_samples', self.hedge_min_samples)
+        self.hedge_min_delay = hedge.get('min_delay_seconds', self.hedge_min_delay)
+        self.latency_history = hedge.get('history', self.latency_history)
+        breaker = get_setting(config, 'http', 'circuit_breaker', {})
+        self.failure_threshold = breaker.get('failure_threshold', self.failure_threshold)
+        self.open_seconds = breaker.get('open_seconds', self.open_seconds)
+        self.max_open_seconds = breaker.get('max_open_seconds', self.max_open_seconds)
+
+    def for_stage(self, stage: str) -> Tuple[float, float]:
+        deadline = current.get()
+        if deadline is None:
+            return self.connect, self.read
+        return deadline.timeout(stage, self.connect, self.read, self.min_send)
+
+
+http_settings = HttpSettings()
+
+current: ContextVar[Optional[Deadline]] = ContextVar('cycle_deadline', default=None)
+
+
+def current_deadline() -> Deadline:
+    """The running cycle's deadline, or an unlimited one outside a cycle"""
+    return current.get() or Deadline('none')
+
+
+def start_cycle(name: str) -> Deadline:
+    """Start a report cycle under its configured budget; requests made until finish() take their timeouts from it"""
+    deadline = Deadline(name, http_settings.budgets.get(name), http_settings.shares)
+    deadline.token = current.set(deadline)
+    return deadline
+
+
+@contextmanager
+def cycle_deadline(name: str) -> Iterator[Deadline]:
+    deadline = start_cycle(name)
+    try:
+        yield deadline
+    finally:
+        deadline.finish()
+
+
+class Endpoint:
+    """Recent latencies and circuit breaker state for one host and path"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: Deque[float] = deque(maxlen=http_settings.latency_history)
+        self.failures = 0
+        self.opened_at: Optional[float] = None  # monotonic time the circuit opened, None while closed
+        self.open_for = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None until enough latencies have been seen"""
+        with self.lock:
+            samples = sorted(self.latencies)
+        if len(samples) < http_settings.hedge_min_samples:
+            return None
+        index = min(int(http_settings.hedge_percentile * len(samples)), len(samples) - 1)
+        return max(samples[index], http_settings.hedge_min_delay)
+
+    def admit(self):
+        """Raise CircuitOpen while the circuit is open; once it has been open long enough, let one probe through"""
+        with self.lock:
+            if self.opened_at is None:
+                return
+            waited = time.monotonic() - self.opened_at
+            if waited < self.open_for or self.probing:
+                raise CircuitOpen(f"Circuit open for {self.name}, next probe in {max(self.open_for - waited, 0):.0f}s")
+            self.probing = True
+        logging.info(f"Probing {self.name} after its circuit was open for {waited:.0f}s")
+
+    def record(self, elapsed: Optional[float]):
+        """Record a completed request's latency, or a failure when elapsed is None"""
+        with self.lock:
+            if elapsed is not None:
+                self.latencies.append(elapsed)
+                recovered = self.opened_at is not None
+                self.failures = 0
+                self.opened_at = None
+                self.open_for = 0.0
+                self.probing = False
+            else:
+                self.failures += 1
+                if not self.probing and (self.opened_at is not None or self.failures < http_settings.failure_threshold):
+                    return
+                # A failed probe keeps the circuit open twice as long, up to the limit
+                self.open_for = min(self.open_for * 2, http_settings.max_open_seconds) if self.probing else http_settings.open_seconds
+                self.opened_at = time.monotonic()
+                self.probing = False
+                open_for = self.open_for
+        if elapsed is not None:
+            if recovered:
+                logging.info(f"Circuit closed for {self.name}, it is responding again")
+                channel.gauge('http_circuit_open', 0, endpoint=self.name)
+            return
+        logging.warning(f"Circuit opened for {self.name} after {self.failures} failures, probing again in {open_for:.0f}s")
+        channel.increment('http_circuit_opened_total', endpoint=self.name)
+        channel.gauge('http_circuit_open', 1, endpoint=self.name)
+
+
+endpoints: Dict[str, Endpoint] = {}
+endpoints_lock = threading.Lock()
+
+
+def endpoint_for(url: str) -> Endpoint:
+    """Shared state for the endpoint a URL belongs to: its host and first two path segments"""
+    parts = urlsplit(url)
+    name = parts.netloc + "/".join(parts.path.split("/")[:3])
+    with endpoints_lock:
+        endpoint = endpoints.get(name)
+        if endpoint is None:
+            endpoint = endpoints[name] = Endpoint(name)
+        return endpoint
+
+
+hedge_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _hedge_pool() -> ThreadPoolExecutor:
+    global hedge_pool
+    with endpoints_lock:
+        if hedge_pool is None:
+            hedge_pool = ThreadPoolExecutor(max_workers=MAX_HEDGE_WORKERS, thread_name_prefix="http-hedge")
+        return hedge_pool
+
+
+def _close_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class Session(requests.Session):
+    """requests.Session whose requests always time out, with per-endpoint circuit breaking.
+
+    Timeouts come from the current cycle deadline's budget for stage, or from the configured
+    defaults outside a cycle. An explicit timeout= still wins. With hedge, a GET that runs
+    longer than the endpoint usually takes is sent again and the first response wins.
+    """
+
+    def __init__(self, stage: str = 'fetch', hedge: bool = False):
+        super().__init__()
+        self.stage = stage
+        self.hedge = hedge
+        # gzip and deflate, plus br and zstd only when brotli / zstandard are installed to decode them
+        self.headers['Accept-Encoding'] = DEFAULT_ACCEPT_ENCODING
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = http_settings.for_stage(self.stage)
+        endpoint = endpoint_for(url)
+        endpoint.admit()
+        delay = endpoint.hedge_delay() if self.hedge and http_settings.hedge_enabled and method.upper() == 'GET' else None
+        try:
+            if delay is None:
+                return self._attempt(endpoint, method, url, kwargs)
+            return self._hedged(endpoint, delay, method, url, kwargs)
+        except requests.exceptions.Timeout:
+            # A timeout cut short by the budget is an overrun, not a slow server
+            if self._budget_spent():
+                current.get().exceeded.add(self.stage)
+            raise
+
+    def _budget_spent(self) -> bool:
+        deadline = current.get()
+        return deadline is not None and deadline.remaining(self.stage) <= 0
+
+    def _attempt(self, endpoint: Endpoint, method, url, kwargs, answered: threading.Event = None):
+        """Send one request; answered is shared by hedged attempts and set once either gets a good response"""
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, **kwargs)
+        except Exception as e:
+            # Neither a hedge failing after its sibling answered nor a timeout cut short by the
+            # cycle budget says anything about the endpoint, so the circuit breaker skips them
+            overrun = isinstance(e, requests.exceptions.Timeout) and self._budget_spent()
+            if not overrun and (answered is None or not answered.is_set()):
+                endpoint.record(None)
+            raise
+        if response.status_code < 500:
+            endpoint.record(time.perf_counter() - started)
+            if answered is not None:
+                answered.set()
+        elif answered is None or not answered.is_set():
+            endpoint.record(None)
+        if not kwargs.get('stream'):
+            record_sizes(endpoint, response, BodySizes(response.raw.tell(), len(response.content)))
+        return response
+
+    def _hedged(self, endpoint: Endpoint, delay: float, method, url, kwargs):
+        """Send the request, and once more if it is still running after delay; the first good response wins"""
+        pool = _hedge_pool()
+        answered = threading.Event()
+        # Each attempt runs in its own copy of this context, so both see the cycle's deadline
+        primary = pool.submit(contextvars.copy_context().run, self._attempt, endpoint, method, url, kwargs, answered)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        logging.info(f"{endpoint.name} slower than {delay:.1f}s, sending a hedged request")
+        channel.increment('http_hedged_requests_total', endpoint=endpoint.name)
+        hedge = pool.submit(contextvars.copy_context().run, self._attempt, endpoint, method, url, kwargs, answered)
+        pending = {primary, hedge}
+        fallback = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None or future.result().status_code >= 500:
+                    fallback = fallback or future
+                    continue
+                if future is hedge:
+                    channel.increment('http_hedge_wins_total', endpoint=endpoint.name)
+                for other in pending:
+                    other.add_done_callback(_close_response)
+                return future.result()
+        # Neither attempt succeeded: report the first one's outcome
+        return fallback.result()
+
+
+def record_sizes(endpoint: Endpoint, response: requests.Response, sizes: BodySizes):
+    encoding = response.headers.get('Content-Encoding', 'identity')
+    channel.increment('http_wire_bytes_total', sizes.wire, endpoint=endpoint.name, encoding=encoding)
+    channel.increment('http_decoded_bytes_total', sizes.decoded, endpoint=endpoint.name, encoding=encoding)
+    logging.debug(f"{endpoint.name}: {sizes.wire} bytes {encoding} on the wire, {sizes.decoded} decoded")
+
+
+class _BodyReader(io.RawIOBase):
+    """A streamed response body as a file, decompressed as it is read"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.decoded = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.raw.read(len(buffer), decode_content=True)
+        buffer[:len(data)] = data
+        self.decoded += len(data)
+        return len(data)
+
+
+def read_json(response: requests.Response) -> Tuple[Any, BodySizes]:
+    """Decode a response requested with stream=True as JSON while its body arrives.
+
+    With ijson installed the decompressed text is never held in memory as a whole. Returns
+    the document and the body's size on the wire and decompressed.
+    """
+    endpoint = endpoint_for(response.url)
+    with response:
+        # The cassette recorder reads every body up front, so this one may be in memory already
+        if response._content_consumed:
+            sizes = BodySizes(response.raw.tell(), len(response.content))
+            data = json.loads(response.content)
+        else:
+            reader = _BodyReader(response.raw)
+            stream = io.BufferedReader(reader, buffer_size=64 * 1024)
+            data = next(ijson.items(stream, '', use_float=True)) if ijson is not None else json.load(stream)
+            sizes = BodySizes(response.raw.tell(), reader.decoded)
+    record_sizes(endpoint, response, sizes)
+    return data, sizes
@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import time
+import select
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from monitor_clock import clock
+
+# Environment variables the token monitor sets on every child it starts
+CHANNEL_ADDR_ENV = "MONITOR_CHANNEL_ADDR"
+CHILD_NAME_ENV = "MONITOR_CHILD_NAME"
+
+# Long sleeps are split into slices so a heartbeat goes out at least this often
+SLEEP_SLICE_SECONDS = 5
+# Slack added to each declared deadline to absorb scheduling jitter
+HEARTBEAT_SLACK_SECONDS = 5
+
+# How long each phase may take before the next heartbeat is due
+PHASE_DEADLINES = {
+    'startup': 300,
+    'fetch': 300,
+    'parse': 120,
+    'send': 60,
+}
+
+MAX_DATAGRAM_BYTES = 65507
+
+
+class MonitorChannel:
+    """Child side of the monitor channel: sends heartbeats to the token monitor over local UDP"""
+
+    def __init__(self, address: str = None, name: str = None):
+        address = address or os.environ.get(CHANNEL_ADDR_ENV)
+        self.name = name or os.environ.get(CHILD_NAME_ENV) or os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        self.iteration = 0
+        self.iteration_started: Optional[float] = None
+        self.phase = "startup"
+        self.address: Optional[Tuple[str, int]] = None
+        self.sock: Optional[socket.socket] = None
+        self.commands: Dict[str, Callable[[Dict], None]] = {}
+        self.listener: Optional[threading.Thread] = None
+
+        if address:
+            try:
+                host, port = address.rsplit(":", 1)
+                self.address = (host, int(port))
+                self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.sock.setblocking(False)
+            except (ValueError, OSError) as e:
+                logging.warning(f"Monitor channel disabled, bad address {address!r}: {e}")
+                self.address = None
+                self.sock = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sock is not None
+
+    def send(self, message: Dict):
+        """Send a message to the supervisor without ever blocking the caller"""
+        if self.sock is None:
+            return
+        message['name'] = self.name
+        message['pid'] = os.getpid()
+        message['time'] = time.time()
+        try:
+            self.sock.sendto(json.dumps(message).encode("utf-8"), self.address)
+        except (OSError, ValueError):
+            pass
+
+    def add_command_handler(self, command: str, handler: Callable[[Dict], None]):
+        """Run handler on a background thread whenever the supervisor sends this command"""
+        self.commands[command] = handler
+        if self.sock is not None and self.listener is None:
+            self.listener = threading.Thread(target=self._listen, name="monitor-commands", daemon=True)
+            self.listener.start()
+
+    def _listen(self):
+        # Commands arrive on the same socket heartbeats leave from, so the supervisor
+        # replies to the address it already knows from this child's heartbeats
+        while True:
+            try:
+                readable, _, _ = select.select([self.sock], [], [], 1.0)
+                if not readable:
+                    continue
+                data, addr = self.sock.recvfrom(MAX_DATAGRAM_BYTES)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError:
+                # Windows reports an unreachable supervisor as an error on the next receive
+                time.sleep(1.0)
+                continue
+
+            if addr != self.address:
+                continue
+            try:
+                message = json.loads(data.decode("utf-8"))
+            except ValueError:
+                continue
+            handler = self.commands.get(message.get('command')) if message.get('type') == 'command' else None
+            if handler is None:
+                logging.warning(f"Ignoring unknown monitor command {message.get('command')!r}")
+                continue
+            logging.info(f"Received monitor command {message['command']!r}")
+            try:
+                handler(message)
+            except Exception as e:
+                logging.error(f"Monitor command {message['command']!r} failed: {e}")
+
+    def heartbeat(self, phase: str, expected_in: float = None):
+        """Report the current phase and promise another heartbeat within expected_in seconds"""
+        if expected_in is None:
+            expected_in = PHASE_DEADLINES.get(phase, 60)
+        self.phase = phase
+        self.send({
+            'type': 'heartbeat',
+            'phase': phase,
+            'iteration': self.iteration,
+            'next_deadline': time.time() + expected_in + HEARTBEAT_SLACK_SECONDS
+        })
+
+    def next_iteration(self):
+        """Mark the start of a new main-loop iteration"""
+        self.iteration += 1
+        self.iteration_started = time.perf_counter()
+
+    def observe(self, metric: str, value: float, **labels):
+        """Record one histogram observation in the token monitor's metrics"""
+        self.send({'type': 'metric', 'kind': 'histogram', 'metric': metric, 'value': value, 'labels': labels})
+
+    def increment(self, metric: str, amount: float = 1, **labels):
+        """Increment a counter in the token monitor's metrics"""
+        self.send({'type': 'metric', 'kind': 'counter', 'metric': metric, 'value': amount, 'labels': labels})
+
+    def gauge(self, metric: str, value: float, **labels):
+        """Set a gauge in the token monitor's metrics"""
+        self.send({'type': 'metric', 'kind': 'gauge', 'metric': metric, 'value': value, 'labels': labels})
+
+    @contextmanager
+    def timed(self, metric: str, failure_metric: str = None, **labels):
+        """Observe the duration of the block, counting failure_metric if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            if failure_metric:
+                self.increment(failure_metric, **labels)
+            raise
+        finally:
+            self.observe(metric, time.perf_counter() - start, **labels)
+
+    def sleep(self, seconds: float, phase: str = "sleep"):
+        """time.sleep replacement that keeps heartbeating through long waits; follows monitor_clock"""
+        if self.iteration_started is not None:
+            # Everything since the iteration started was work, so report it before idling
+            self.observe('loop_iteration_seconds', time.perf_counter() - self.iteration_started)
+            self.iteration_started = None
+        end = clock.time() + max(seconds, 0)
+        while True:
+            remaining = end - clock.time()
+            if remaining <= 0:
+                break
+            step = min(remaining, SLEEP_SLICE_SECONDS) if self.enabled else remaining
+            self.heartbeat(phase, expected_in=step)
+            clock.sleep(step)
+
+
+class ChannelServer:
+    """Supervisor side of the monitor channel: receives child messages and tracks heartbeat deadlines"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(1.0)
+        self.address = "%s:%d" % self.sock.getsockname()
+        self.heartbeats: Dict[str, Dict] = {}
+        self.handlers: Dict[str, List[Callable[[Dict], None]]] = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def add_handler(self, message_type: str, handler: Callable[[Dict], None]):
+        """Register a callback for a message type sent by children"""
+        self.handlers.setdefault(message_type, []).append(handler)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._receive_loop, name="monitor-channel", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def _receive_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                data, addr = self.sock.recvfrom(MAX_DATAGRAM_BYTES)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self.stop_event.is_set():
+                    break
+                continue
+
+            try:
+                message = json.loads(data.decode("utf-8"))
+            except ValueError:
+                logging.warning(f"Ignoring malformed monitor channel message from {addr}")
+                continue
+
+            message['addr'] = addr
+            message['received_at'] = time.time()
+            if message.get('type') == 'heartbeat':
+                with self.lock:
+                    self.heartbeats[message.get('name')] = message
+
+            for handler in self.handlers.get(message.get('type'), []):
+                try:
+                    handler(message)
+                except Exception as e:
+                    logging.error(f"Monitor channel handler failed for {message.get('type')}: {e}")
+
+    def send_command(self, addr: Tuple[str, int], command: str, **args):
+        """Send a command to the child listening on addr (the address its heartbeats come from)"""
+        message = dict(args, type='command', command=command)
+        self.sock.sendto(json.dumps(message).encode("utf-8"), tuple(addr))
+
+    def last_heartbeat(self, name: str) -> Optional[Dict]:
+        with self.lock:
+            return self.heartbeats.get(name)
+
+    def forget(self, name: str):
+        """Drop heartbeat state for a child, e.g. after it was restarted"""
+        with self.lock:
+            self.heartbeats.pop(name, None)
+
+    def overdue(self, grace: float = 0) -> List[Dict]:
+        """Return the last heartbeat of every child that has missed its declared deadline"""
+        now = time.time()
+        with self.lock:
+            return [hb for hb in self.heartbeats.values() if now > hb.get('next_deadline', now) + grace]
+
+
+# Shared instance used by the monitored scripts; a no-op when not started by the token monitor
+channel = MonitorChannel()
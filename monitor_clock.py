@@ -0,0 +1,68 @@
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+import pendulum
+
+
+class SimulationComplete(BaseException):
+    """Raised by a virtual clock when its simulated run is over.
+
+    A BaseException, so the scripts' catch-all error handling lets it through.
+    """
+
+
+class Clock:
+    """Time source for the scripts; real time unless a virtual clock is installed"""
+
+    def __init__(self):
+        self.source: Optional["VirtualClock"] = None
+
+    def use(self, source: Optional["VirtualClock"]):
+        """Drive the scripts from source, or from real time again with None"""
+        self.source = source
+
+    def time(self) -> float:
+        return self.source.time() if self.source else time.time()
+
+    def sleep(self, seconds: float):
+        if self.source:
+            self.source.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def now(self, tz=None) -> pendulum.DateTime:
+        return pendulum.from_timestamp(self.time(), tz=tz or pendulum.local_timezone())
+
+    def local_now(self) -> datetime:
+        """Naive local time, the replacement for datetime.now()"""
+        return datetime.fromtimestamp(self.time())
+
+
+clock = Clock()
+
+
+class VirtualClock:
+    """Simulated time: sleeps return immediately and jump the clock forward, while work still
+    takes its real duration, so latencies include actual processing time.
+
+    on_advance is called with the new time after every sleep.
+    """
+
+    def __init__(self, start: float, end: float = None, on_advance: Callable[[float], None] = None):
+        self.offset = start - time.perf_counter()
+        self.end = end
+        self.on_advance = on_advance
+        self.last_wake = start
+
+    def time(self) -> float:
+        return self.offset + time.perf_counter()
+
+    def sleep(self, seconds: float):
+        self.offset += max(seconds, 0)
+        now = self.time()
+        self.last_wake = now
+        if self.on_advance is not None:
+            self.on_advance(now)
+        if self.end is not None and now >= self.end:
+            raise SimulationComplete()
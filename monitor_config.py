@@ -0,0 +1,25 @@
+import os
+import json
+import logging
+from typing import Dict
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
+
+def load_config(path: str = None) -> Dict:
+    """Load config.json, falling back to an empty config if it is missing or invalid"""
+    path = path or CONFIG_PATH
+    try:
+        with open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logging.warning(f"Config file not found at {path}, using defaults")
+    except (OSError, ValueError) as e:
+        logging.error(f"Failed to load config file {path}: {e}")
+    return {}
+
+
+def get_setting(config: Dict, section: str, key: str, default=None):
+    """Read a single setting from a config section, returning default if unset"""
+    value = config.get(section, {}).get(key)
+    return default if value is None else value
@@ -0,0 +1,228 @@
+import os
+import re
+import sys
+import copy
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from monitor_config import get_setting
+
+DEFAULT_LEVEL = "INFO"
+DEFAULT_MAX_LOG_SIZE_MB = 100
+DEFAULT_RETENTION_DAYS = 7
+# Records waiting for the writer thread; when it falls this far behind, new records are dropped
+QUEUE_SIZE = 10000
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else on a record came from extra= and is a field
+RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+FIELD_PATTERN = re.compile(r'(\w+)=("(?:[^"\\]|\\.)*"|\S*)')
+UNESCAPES = {'n': '\n', '"': '"', '\\': '\\'}
+
+
+def _quote(value) -> str:
+    text = str(value)
+    if text and not any(c in text for c in ' ="\\\n'):
+        return text
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+def _unquote(value: str) -> str:
+    if not value.startswith('"'):
+        return value
+    return re.sub(r'\\(.)', lambda m: UNESCAPES.get(m.group(1), m.group(1)), value[1:-1])
+
+
+def record_fields(record: logging.LogRecord) -> Dict:
+    """The extra= fields attached to a record"""
+    return {key: value for key, value in vars(record).items() if key not in RECORD_ATTRS}
+
+
+class KeyValueFormatter(logging.Formatter):
+    """One line per record: ts, level, logger, the static fields, msg, then any extra= fields"""
+
+    def __init__(self, static: Dict = None):
+        super().__init__()
+        self.static = static or {}
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+        }
+        if record.name != 'root':
+            fields['logger'] = record.name
+        fields.update(self.static)
+        fields['msg'] = record.getMessage()
+        fields.update(record_fields(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            fields['exc'] = record.exc_text
+        return " ".join(f"{key}={_quote(value)}" for key, value in fields.items())
+
+
+class TextFormatter(logging.Formatter):
+    """The usual console format, with a forwarded record's script in front of its message"""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        script = getattr(record, 'script', None)
+        if script is None:
+            return line
+        head, sep, message = line.partition(f" - {record.levelname} - ")
+        return f"{head}{sep}[{script}] {message}"
+
+
+def parse_record(line: str) -> Optional[Dict[str, str]]:
+    """Fields of a line written by KeyValueFormatter, or None for any other output"""
+    if not line.startswith("ts="):
+        return None
+    return {key: _unquote(value) for key, value in FIELD_PATTERN.findall(line)}
+
+
+class RotatingLogFile(logging.handlers.BaseRotatingHandler):
+    """Log file that rotates at midnight and whenever it passes max_bytes.
+
+    Rotated files are named after the time they were rotated, and those last written more
+    than retention_days ago are deleted.
+    """
+
+    def __init__(self, filename: str, max_bytes: int, retention_days: float):
+        super().__init__(filename, 'a', encoding='utf-8')
+        self.max_bytes = max_bytes
+        self.retention = retention_days * 86400
+        # A file left over from an earlier day is rotated on the first record
+        started = os.path.getmtime(self.baseFilename) if os.path.getsize(self.baseFilename) else time.time()
+        self.rollover_at = self._next_midnight(started)
+        self.prune()
+
+    @staticmethod
+    def _next_midnight(after: float) -> float:
+        day = datetime.fromtimestamp(after).date() + timedelta(days=1)
+        return datetime(day.year, day.month, day.day).timestamp()
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if record.created >= self.rollover_at:
+            return True
+        if self.stream is None:
+            self.stream = self._open()
+        return self.max_bytes > 0 and self.stream.tell() >= self.max_bytes
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        target = f"{self.baseFilename}.{stamp}"
+        count = 1
+        while os.path.exists(target):
+            target = f"{self.baseFilename}.{stamp}.{count}"
+            count += 1
+        if os.path.exists(self.baseFilename):
+            self.rotate(self.baseFilename, target)
+        self.rollover_at = self._next_midnight(time.time())
+        self.prune()
+        self.stream = self._open()
+
+    def prune(self):
+        if self.retention <= 0:
+            return
+        directory, base = os.path.split(self.baseFilename)
+        cutoff = time.time() - self.retention
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            try:
+                if name.startswith(base + ".") and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                # Rotated files are best effort; a locked one goes on the next rotation
+                pass
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread and never waits for it; records are dropped if it falls behind"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now, but leave formatting to the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            if self.dropped:
+                dropped = logging.makeLogRecord({'name': 'monitor_logging', 'levelno': logging.WARNING,
+                                                 'levelname': 'WARNING', 'dropped': self.dropped,
+                                                 'msg': "Log writer fell behind, records were dropped"})
+                self.queue.put_nowait(dropped)
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(config: Dict, name: str, log_file: str = None, structured_console: bool = True):
+    """Route all logging through a queue to a background writer thread.
+
+    The console gets key=value records, which the token monitor parses from a script's
+    stderr, or the usual text format when structured_console is off. log_file, if given,
+    gets key=value records and rotates by monitoring.max_log_size_mb and
+    monitoring.log_retention_days.
+    """
+    global listener
+    level = get_setting(config, 'monitoring', 'log_level', DEFAULT_LEVEL)
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(KeyValueFormatter({'script': name}) if structured_console else TextFormatter())
+    handlers = [console]
+    if log_file:
+        file_handler = RotatingLogFile(
+            log_file,
+            int(get_setting(config, 'monitoring', 'max_log_size_mb', DEFAULT_MAX_LOG_SIZE_MB) * 1024 * 1024),
+            get_setting(config, 'monitoring', 'log_retention_days', DEFAULT_RETENTION_DAYS),
+        )
+        file_handler.setFormatter(KeyValueFormatter({'script': name}))
+        handlers.append(file_handler)
+
+    if listener is not None:
+        listener.stop()
+    log_queue = queue.Queue(QUEUE_SIZE)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(NonBlockingQueueHandler(log_queue))
+    root.setLevel(level)
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+
+
+def stop_logging():
+    """Write out queued records; registered to run at exit"""
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,244 @@
+import math
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Help text for metrics reported by the scripts and the token monitor
+METRIC_HELP = {
+    'fclm_fetch_seconds': "Latency of FCLM functionRollup requests (get_html_data)",
+    'fclm_fetch_failures_total': "FCLM functionRollup requests that failed",
+    'appointment_fetch_seconds': "Latency of dock appointment requests, including decoding (get_appointment_data)",
+    'appointment_fetch_failures_total': "Dock appointment requests that failed",
+    'parse_seconds': "Time spent parsing one report table",
+    'parse_cache_hits_total': "Report pages whose parse was reused because the page was unchanged",
+    'parse_cache_misses_total': "Report pages that had to be parsed",
+    'parse_cache_bytes': "Approximate memory held by each script's parse cache",
+    'webhook_send_seconds': "Latency of Slack webhook posts",
+    'webhook_failures_total': "Slack webhook posts that failed",
+    'quarter_report_latency_seconds': "Time from quarter end to the quarter report reaching Slack",
+    'quarter_report_slo_misses_total': "Quarter reports delivered later than schedules.quarters.latency_slo_seconds",
+    'loop_iteration_seconds': "Work time of one main-loop iteration, excluding sleeps",
+    'script_restarts_total': "Times the token monitor started each script",
+    'script_rss_bytes': "Resident memory of each script",
+    'script_cpu_seconds': "CPU time used by each script's current process so far",
+    'script_threads': "Thread count of each script",
+    'script_heartbeat_age_seconds': "Seconds since each script last sent a heartbeat",
+    'token_seconds_to_expiry': "Seconds until the midway token expires",
+    'http_wire_bytes_total': "Response body bytes received, before decompression",
+    'http_decoded_bytes_total': "Response body bytes after decompression",
+    'kerberos_requests_total': "FCLM requests made with Negotiate authentication",
+    'kerberos_challenges_total': "Negotiate 401 challenges that cost an extra round trip",
+    'kerberos_handshakes_total': "Negotiate tokens generated, up front or after a challenge",
+    'kerberos_handshake_seconds': "Latency a Negotiate handshake added to its request",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict) -> LabelKey:
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str = ""):
+        self.name = name
+        self.help = help_text
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(key)} {_format_value(v)}" for key, v in self.values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self.values[_label_key(labels)] = value
+
+    def clear(self):
+        self.values.clear()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str = "", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[LabelKey, List] = {}  # label key -> [bucket counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = [[0] * len(self.buckets), 0.0, 0]
+            self.series[key] = series
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in self.series.items():
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Thread-safe collection of metrics rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+        self.collectors: List[Callable[[], None]] = []
+        self.lock = threading.RLock()
+
+    def _get(self, cls, name: str):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = cls(name, METRIC_HELP.get(name, ""))
+                self.metrics[name] = metric
+            elif type(metric) is not cls:
+                raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str) -> Counter:
+        return self._get(Counter, name)
+
+    def gauge(self, name: str) -> Gauge:
+        return self._get(Gauge, name)
+
+    def histogram(self, name: str) -> Histogram:
+        return self._get(Histogram, name)
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Register a callback that refreshes gauges right before each scrape"""
+        self.collectors.append(collector)
+
+    def record_message(self, message: Dict):
+        """Apply a metric message sent by a script over the monitor channel"""
+        labels = dict(message.get('labels') or {})
+        labels['script'] = message.get('name', 'unknown')
+        kind = message.get('kind')
+        name = message.get('metric')
+        value = float(message.get('value', 0))
+        with self.lock:
+            if kind == 'histogram':
+                self.histogram(name).observe(value, **labels)
+            elif kind == 'counter':
+                self.counter(name).inc(value, **labels)
+            elif kind == 'gauge':
+                self.gauge(name).set(value, **labels)
+            else:
+                logging.warning(f"Ignoring metric {name} with unknown kind {kind!r}")
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                logging.error(f"Metrics collector failed: {e}")
+
+        lines = []
+        with self.lock:
+            for name in sorted(self.metrics):
+                metric = self.metrics[name]
+                if metric.help:
+                    lines.append(f"# HELP {name} {metric.help}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves a registry on a local HTTP /metrics endpoint; other read-only routes can be added to routes,
+    and control actions to post_routes"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.routes: Dict[str, Callable] = {'/metrics': self._metrics}
+        self.post_routes: Dict[str, Callable] = {}
+        handler = self._make_handler()
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.address = "%s:%d" % self.httpd.server_address[:2]
+        self.thread: Optional[threading.Thread] = None
+
+    def _metrics(self, query: str):
+        return 200, "text/plain; version=0.0.4; charset=utf-8", self.registry.render()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self._dispatch(server.routes)
+
+            def do_POST(self):
+                # Control routes take their arguments from the query string; any body is ignored
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                self._dispatch(server.post_routes)
+
+            def _dispatch(self, routes: Dict[str, Callable]):
+                path, _, query = self.path.partition("?")
+                route = routes.get(path)
+                if route is None:
+                    self._reply(404, "text/plain", "Not found\n")
+                    return
+                try:
+                    status, content_type, body = route(query)
+                except Exception as e:
+                    logging.error(f"Error serving {path}: {e}")
+                    status, content_type, body = 500, "text/plain", "Internal error\n"
+                self._reply(status, content_type, body)
+
+            def _reply(self, status: int, content_type: str, body: str):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logging.debug(f"Metrics request: {format % args}")
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-server", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,294 @@
+import os
+import sys
+import copy
+import json
+import time
+import uuid
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from requests_kerberos import HTTPKerberosAuth, OPTIONAL
+
+from monitor_channel import channel
+from monitor_config import get_setting
+from report_scheduler import DEFAULT_STATE_DIR
+
+# How a host that has challenged us once is authenticated from then on
+COOKIE = 'cookie'  # the session cookie it set after the handshake is enough
+PREEMPTIVE = 'preemptive'  # every request carries a Negotiate token up front
+
+STATE_FILE = "negotiate_hosts.json"
+STAND_IN_COOKIE = "negotiate_stand_in"
+
+
+class NegotiatedHosts:
+    """How each host wanted to be authenticated the last time it challenged us, kept across restarts"""
+
+    def __init__(self, path: str = None):
+        self.path = path  # None keeps the state in memory only
+        self.modes: Dict[str, Dict] = {}  # host -> {'mode': COOKIE or PREEMPTIVE, 'cookies': session cookie names}
+        self.lock = threading.Lock()
+
+    def configure(self, config: Dict):
+        self.path = os.path.join(get_setting(config, 'schedules', 'state_dir') or DEFAULT_STATE_DIR, STATE_FILE)
+        try:
+            with open(self.path, "rt", encoding="utf-8") as f:
+                self.modes = json.load(f)
+        except FileNotFoundError:
+            self.modes = {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable negotiate state {self.path}: {e}")
+            self.modes = {}
+
+    def get(self, host: str) -> Optional[Dict]:
+        return self.modes.get(host)
+
+    def learn(self, host: str, mode: str, cookies: List[str] = ()):
+        state = {'mode': mode, 'cookies': sorted(cookies)}
+        with self.lock:
+            if self.modes.get(host) == state:
+                return
+            self.modes[host] = state
+            modes = dict(self.modes)
+        if mode == COOKIE:
+            logging.info(f"{host} keeps Negotiate sessions in cookie(s) {', '.join(state['cookies'])}")
+        else:
+            logging.info(f"{host} needs a Negotiate token on every request")
+        if self.path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump(modes, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Could not save negotiate state {self.path}: {e}")
+
+
+negotiated_hosts = NegotiatedHosts(os.path.join(DEFAULT_STATE_DIR, STATE_FILE))
+
+
+class NegotiateAuth(HTTPKerberosAuth):
+    """HTTPKerberosAuth that stops paying for a 401 round trip on every fresh connection.
+
+    The first challenge from a host decides how later requests authenticate: if the server
+    answered the handshake with a session cookie, that cookie carries the session on any
+    connection and a token is only sent up front while there is no cookie yet (after a
+    restart); otherwise every request sends a token up front. A host whose session cookie
+    is challenged anyway is switched to tokens on every request. Service tickets are cached
+    by GSSAPI, so an up-front token costs no KDC round trip.
+
+    Each request is authenticated by its own copy holding the SPNEGO context, so concurrent
+    requests on one session (hedges, parallel page fetches) never verify a response against
+    a context another request replaced. The copies count into the session's instance.
+    """
+
+    def __init__(self, mutual_authentication=OPTIONAL, hosts: NegotiatedHosts = None, **kwargs):
+        super().__init__(mutual_authentication=mutual_authentication, **kwargs)
+        self.hosts = hosts or negotiated_hosts
+        self.requests = 0
+        self.handshakes = 0
+        self.challenges = 0
+        self.added_seconds = 0.0
+        self.counts_lock = threading.Lock()
+        self.owner = self  # the instance copies count into
+
+    def __call__(self, request):
+        attempt = copy.copy(self)
+        attempt.context = {}
+        attempt.auth_done = False
+        return attempt._authenticate(request)
+
+    def _authenticate(self, request):
+        host = urlparse(request.url).hostname
+        self._count(host, requests=1)
+        if self._needs_token(host, request) and 'Authorization' not in request.headers:
+            started = time.perf_counter()
+            header = self.generate_request_header(None, host, is_preemptive=True)
+            if header is not None:
+                request.headers['Authorization'] = header
+                self._handshake(host, 'preemptive', time.perf_counter() - started)
+        return super().__call__(request)
+
+    def handle_401(self, response, **kwargs):
+        host = urlparse(response.url).hostname
+        started = time.perf_counter()
+        result = super().handle_401(response, **kwargs)
+        if result is response:
+            # Not a Negotiate challenge, nothing was retried
+            return result
+        # The 401 itself plus making the token; the retry is the request we would have sent anyway
+        added = response.elapsed.total_seconds() + time.perf_counter() - started - result.elapsed.total_seconds()
+        self._count(host, challenges=1)
+        self._handshake(host, 'challenge', max(added, 0.0))
+        if result.status_code != 401:
+            previous = self.hosts.get(host)
+            cookies = list(result.cookies.keys())
+            cookie_failed = previous is not None and previous['mode'] == COOKIE and \
+                self._has_cookie(response.request, previous['cookies'])
+            if cookies and not cookie_failed and (previous is None or previous['mode'] == COOKIE):
+                self.hosts.learn(host, COOKIE, cookies)
+            else:
+                self.hosts.learn(host, PREEMPTIVE)
+        return result
+
+    def _needs_token(self, host: str, request) -> bool:
+        state = self.hosts.get(host)
+        if state is None:
+            return False
+        return state['mode'] == PREEMPTIVE or not self._has_cookie(request, state['cookies'])
+
+    @staticmethod
+    def _has_cookie(request, names: List[str]) -> bool:
+        sent = request.headers.get('Cookie', '')
+        return any(f"{name}=" in sent for name in names)
+
+    def _count(self, host: str, requests: int = 0, challenges: int = 0):
+        with self.counts_lock:
+            self.owner.requests += requests
+            self.owner.challenges += challenges
+        if requests:
+            channel.increment('kerberos_requests_total', requests, host=host)
+        if challenges:
+            channel.increment('kerberos_challenges_total', challenges, host=host)
+
+    def _handshake(self, host: str, kind: str, seconds: float):
+        with self.counts_lock:
+            self.owner.handshakes += 1
+            self.owner.added_seconds += seconds
+        channel.increment('kerberos_handshakes_total', host=host, kind=kind)
+        channel.observe('kerberos_handshake_seconds', seconds, host=host, kind=kind)
+
+
+class NegotiateStandIn:
+    """Local server that challenges with Negotiate and accepts any token.
+
+    With session_cookie it answers an authenticated request with a session cookie and lets
+    that cookie in afterwards, like the FCLM portal; without it every request needs a token.
+    """
+
+    def __init__(self, session_cookie: bool = True, host: str = "127.0.0.1", port: int = 0):
+        self.session_cookie = session_cookie
+        self.sessions = set()
+        self.challenges = 0
+        self.tokens = 0
+        self.cookie_logins = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.address = "%s:%d" % self.httpd.server_address[:2]
+        self.thread: Optional[threading.Thread] = None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so a retry after a challenge goes over the same connection
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                cookies = dict(part.strip().split("=", 1) for part in self.headers.get("Cookie", "").split(";")
+                               if "=" in part)
+                authorization = self.headers.get("Authorization", "")
+                with server.lock:
+                    if cookies.get(STAND_IN_COOKIE) in server.sessions:
+                        server.cookie_logins += 1
+                        self._reply(200)
+                        return
+                    if not authorization.startswith("Negotiate "):
+                        server.challenges += 1
+                        self._reply(401, {"WWW-Authenticate": "Negotiate"})
+                        return
+                    server.tokens += 1
+                    headers = {}
+                    if server.session_cookie:
+                        session = uuid.uuid4().hex
+                        server.sessions.add(session)
+                        headers["Set-Cookie"] = f"{STAND_IN_COOKIE}={session}; Path=/"
+                self._reply(200, headers)
+
+            def _reply(self, status: int, headers: Dict[str, str] = None):
+                data = b"ok\n" if status == 200 else b"Unauthorized\n"
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logging.debug(f"Stand-in request: {format % args}")
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="negotiate-stand-in", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def compare(count: int, hostname: str, session_cookie: bool, connections: int) -> Dict:
+    """Send count requests through plain HTTPKerberosAuth and NegotiateAuth and count the round trips"""
+    from http_client import Session
+
+    results = {}
+    for name in ("HTTPKerberosAuth", "NegotiateAuth"):
+        server = NegotiateStandIn(session_cookie)
+        server.start()
+        if name == "NegotiateAuth":
+            auth = NegotiateAuth(hosts=NegotiatedHosts(), hostname_override=hostname)
+        else:
+            auth = HTTPKerberosAuth(mutual_authentication=OPTIONAL, hostname_override=hostname)
+        url = f"http://{server.address}/reports/functionRollup"
+        started = time.perf_counter()
+        try:
+            for _ in range(connections):
+                # A new session per batch stands in for a restart: no connections, no cookies
+                session = Session('fetch')
+                session.auth = auth
+                for _ in range(count // connections):
+                    session.get(url).raise_for_status()
+                session.close()
+        finally:
+            server.stop()
+        sent = count // connections * connections
+        results[name] = {
+            'requests': sent,
+            'round_trips': sent + server.challenges,
+            'challenges': server.challenges,
+            'tokens_sent': server.tokens,
+            'cookie_requests': server.cookie_logins,
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+        if isinstance(auth, NegotiateAuth):
+            results[name]['added_seconds'] = round(auth.added_seconds, 4)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count Negotiate round trips against a local stand-in")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--connections", type=int, default=5, help="Fresh sessions the requests are spread over")
+    parser.add_argument("--hostname", default="fclm-portal.amazon.com",
+                        help="Service host to get Kerberos tickets for; the stand-in accepts any token")
+    parser.add_argument("--no-session-cookie", action="store_true",
+                        help="Make the stand-in require a token on every request")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    results = compare(args.requests, args.hostname, not args.no_session_cookie, max(args.connections, 1))
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
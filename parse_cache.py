@@ -0,0 +1,81 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, TypeVar
+
+from monitor_channel import channel
+from monitor_config import get_setting
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_MB = 64
+
+T = TypeVar('T')
+
+
+def content_hash(content: str) -> bytes:
+    """Fast 128-bit digest of a response body"""
+    return hashlib.blake2b(content.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+class ParseCache:
+    """LRU of parse results keyed by (request key, page hash), so byte-identical pages skip parsing.
+
+    Cached results are shared, so callers must treat them as read-only. An entry's memory cost is
+    approximated by the size of the page it was parsed from.
+    """
+
+    def __init__(self, name: str, max_entries: int = DEFAULT_MAX_ENTRIES, max_mb: float = DEFAULT_MAX_MB):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.entries: OrderedDict = OrderedDict()  # (key, page hash) -> (parsed result, page size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def configure(self, config: Dict):
+        """Apply the config.json parse_cache limits"""
+        with self.lock:
+            self.max_entries = get_setting(config, 'parse_cache', 'max_entries', self.max_entries)
+            self.max_bytes = int(get_setting(config, 'parse_cache', 'max_mb', self.max_bytes / (1024 * 1024)) * 1024 * 1024)
+            self._evict()
+
+    def _evict(self):
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            _, (_, size) = self.entries.popitem(last=False)
+            self.bytes -= size
+
+    def get_or_parse(self, key: Hashable, content: str, parse: Callable[[str], T]) -> T:
+        """Return the cached result for an identical page under this key, or parse and cache it"""
+        cache_key = (key, content_hash(content))
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is not None:
+                self.entries.move_to_end(cache_key)
+                self.hits += 1
+        if entry is not None:
+            channel.increment('parse_cache_hits_total', cache=self.name)
+            logging.debug(f"Parse cache hit for {key}")
+            return entry[0]
+
+        result = parse(content)
+        size = len(content)
+        with self.lock:
+            self.misses += 1
+            if size <= self.max_bytes:
+                previous = self.entries.pop(cache_key, None)
+                if previous is not None:
+                    self.bytes -= previous[1]
+                self.entries[cache_key] = (result, size)
+                self.bytes += size
+                self._evict()
+            cached_bytes = self.bytes
+        channel.increment('parse_cache_misses_total', cache=self.name)
+        channel.gauge('parse_cache_bytes', cached_bytes, cache=self.name)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.bytes, 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,115 @@
+import os
+import time
+import logging
+from collections import deque
+from typing import Deque, NamedTuple, Optional
+
+try:
+    import psutil
+except ImportError:  # psutil is only needed where /proc is unavailable (e.g. Windows)
+    psutil = None
+
+PROC_ROOT = "/proc"
+
+if hasattr(os, "sysconf"):
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+    CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+else:
+    PAGE_SIZE = 4096
+    CLOCK_TICKS = 100
+
+
+class ProcessSample(NamedTuple):
+    time: float
+    rss_bytes: int
+    cpu_seconds: float
+    threads: int
+
+
+def _sample_from_proc(pid: int) -> Optional[ProcessSample]:
+    with open(os.path.join(PROC_ROOT, str(pid), "stat"), "rt") as f:
+        stat = f.read()
+    # The command name may contain spaces, so split after its closing parenthesis
+    fields = stat[stat.rindex(")") + 2:].split()
+    utime, stime = int(fields[11]), int(fields[12])
+    threads = int(fields[17])
+    rss_pages = int(fields[21])
+    return ProcessSample(
+        time=time.time(),
+        rss_bytes=rss_pages * PAGE_SIZE,
+        cpu_seconds=(utime + stime) / CLOCK_TICKS,
+        threads=threads
+    )
+
+
+def _sample_from_psutil(pid: int) -> Optional[ProcessSample]:
+    process = psutil.Process(pid)
+    with process.oneshot():
+        cpu = process.cpu_times()
+        return ProcessSample(
+            time=time.time(),
+            rss_bytes=process.memory_info().rss,
+            cpu_seconds=cpu.user + cpu.system,
+            threads=process.num_threads()
+        )
+
+
+def sample_process(pid: int) -> Optional[ProcessSample]:
+    """Sample RSS, CPU time and thread count for a process, or None if it can't be read"""
+    try:
+        if os.path.isdir(PROC_ROOT):
+            return _sample_from_proc(pid)
+        if psutil is not None:
+            return _sample_from_psutil(pid)
+    except Exception as e:
+        logging.debug(f"Could not sample process {pid}: {e}")
+    return None
+
+
+def sampling_supported() -> bool:
+    return os.path.isdir(PROC_ROOT) or psutil is not None
+
+
+class ResourceHistory:
+    """Fixed-size ring buffer of samples for one process"""
+
+    def __init__(self, pid: int, maxlen: int):
+        self.pid = pid
+        self.samples: Deque[ProcessSample] = deque(maxlen=maxlen)
+
+    def add(self, sample: ProcessSample):
+        self.samples.append(sample)
+
+    @property
+    def latest(self) -> Optional[ProcessSample]:
+        return self.samples[-1] if self.samples else None
+
+    def cpu_percent(self) -> float:
+        """CPU usage between the last two samples, as a percentage of one core"""
+        if len(self.samples) < 2:
+            return 0.0
+        previous, latest = self.samples[-2], self.samples[-1]
+        elapsed = latest.time - previous.time
+        if elapsed <= 0:
+            return 0.0
+        return 100.0 * (latest.cpu_seconds - previous.cpu_seconds) / elapsed
+
+    def rss_growth_mb_per_hour(self, window_seconds: float) -> Optional[float]:
+        """Least-squares RSS slope over the window, or None until half the window is covered"""
+        if not self.samples:
+            return None
+        cutoff = self.samples[-1].time - window_seconds
+        window = [s for s in self.samples if s.time >= cutoff]
+        if len(window) < 3 or window[-1].time - window[0].time < window_seconds / 2:
+            return None
+
+        t0 = window[0].time
+        xs = [s.time - t0 for s in window]
+        ys = [s.rss_bytes / (1024 * 1024) for s in window]
+        mean_x = sum(xs) / len(xs)
+        mean_y = sum(ys) / len(ys)
+        variance = sum((x - mean_x) ** 2 for x in xs)
+        if variance == 0:
+            return None
+        covariance = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+        return covariance / variance * 3600
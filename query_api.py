@@ -0,0 +1,200 @@
+import os
+import json
+import sqlite3
+import logging
+from urllib.parse import parse_qs
+from urllib.request import pathname2url
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from history_store import DEFAULT_HISTORY_PATH
+from monitor_config import get_setting
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Filters shared by every table keyed by date
+DATE_FILTERS = {
+    'date': "date = ?",
+    'from': "date >= ?",
+    'to': "date <= ?",
+}
+
+
+class Endpoint(NamedTuple):
+    table: str
+    columns: Tuple[str, ...]  # select expressions, each ending in its output name
+    filters: Dict[str, str]  # query parameter -> SQL condition
+    order: str
+    group_by: Optional[str] = None
+    required: Tuple[str, ...] = ()
+    description: str = ""
+
+
+ENDPOINTS = {
+    '/api/rates': Endpoint(
+        'associate_metrics',
+        ('report', 'table_name', 'date', 'window_start', 'window_end', 'employee_id', 'name',
+         'units', 'paid_hours', 'rate', 'jobs'),
+        dict(DATE_FILTERS, employee_id="employee_id = ?", table="table_name = ?", report="report = ?"),
+        "date DESC, window_start DESC, table_name, employee_id",
+        description="Per-associate rates for each reported window (quarters, fluid load hours and slices)",
+    ),
+    '/api/rates/associate': Endpoint(
+        'associate_metrics',
+        ('date', 'report', 'table_name', 'SUM(units) AS units', 'SUM(paid_hours) AS paid_hours',
+         'CASE WHEN SUM(paid_hours) > 0 THEN SUM(units) / SUM(paid_hours) END AS rate', 'COUNT(*) AS windows'),
+        dict(DATE_FILTERS, employee_id="employee_id = ?", table="table_name = ?", report="report = ?"),
+        "date DESC, report, table_name",
+        group_by="date, report, table_name",
+        required=('employee_id',),
+        description="One associate's daily totals and rate per table",
+    ),
+    '/api/rates/daily': Endpoint(
+        'daily_rates',
+        ('date', 'report', 'table_name', 'associates', 'units', 'paid_hours', 'rate'),
+        dict(DATE_FILTERS, table="table_name = ?", report="report = ?"),
+        "date DESC, report, table_name",
+        description="Precomputed daily totals and rate per table",
+    ),
+    '/api/alerts': Endpoint(
+        'uph_alerts',
+        ('report', 'table_name', 'date', 'window_start', 'window_end', 'employee_id', 'name', 'manager',
+         'hours', 'jobs', 'uph', 'reason'),
+        dict(DATE_FILTERS, employee_id="employee_id = ?", table="table_name = ?", manager="manager = ?"),
+        "date DESC, window_start DESC, table_name, employee_id",
+        description="Associates flagged by the UPH alert rules, per window",
+    ),
+    '/api/alerts/daily': Endpoint(
+        'daily_alerts',
+        ('date', 'report', 'table_name', 'alerts', 'associates'),
+        dict(DATE_FILTERS, table="table_name = ?"),
+        "date DESC, report, table_name",
+        description="Precomputed daily alert counts per table",
+    ),
+    '/api/lucy': Endpoint(
+        'lucy_outcomes',
+        ('fc', 'appointment_id', 'date', 'load_type', 'dock_door', 'arrival_time', 'closed_time',
+         'threshold_seconds', 'elapsed_seconds', 'compliant'),
+        dict(DATE_FILTERS, fc="fc = ?", load_type="load_type = ?", compliant="compliant = ?"),
+        "date DESC, arrival_time DESC",
+        description="LUCY compliance outcome of each closed live load",
+    ),
+    '/api/lucy/daily': Endpoint(
+        'daily_lucy',
+        ('date', 'load_type', 'loads', 'met', 'missed', 'miss_rate', 'avg_elapsed_seconds'),
+        dict(DATE_FILTERS, load_type="load_type = ?"),
+        "date DESC, load_type",
+        description="Precomputed daily LUCY loads, misses and miss rate per load type",
+    ),
+}
+
+
+class QueryError(ValueError):
+    """A query parameter the endpoint cannot serve; answered with HTTP 400"""
+
+
+def _json(status: int, body: Dict) -> Tuple[int, str, str]:
+    return status, "application/json; charset=utf-8", json.dumps(body, default=str)
+
+
+class QueryAPI:
+    """Read-only JSON queries over the history store, served from the token monitor's HTTP server"""
+
+    def __init__(self, path: str = None, page_size: int = DEFAULT_PAGE_SIZE, max_page_size: int = MAX_PAGE_SIZE):
+        self.path = path or DEFAULT_HISTORY_PATH
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+
+    @classmethod
+    def from_config(cls, config: Dict) -> Optional["QueryAPI"]:
+        """QueryAPI for the config.json query_api section, or None if it is turned off"""
+        if not get_setting(config, 'query_api', 'enabled', True):
+            return None
+        return cls(
+            get_setting(config, 'history', 'path'),
+            get_setting(config, 'query_api', 'page_size', DEFAULT_PAGE_SIZE),
+            get_setting(config, 'query_api', 'max_page_size', MAX_PAGE_SIZE),
+        )
+
+    def register(self, server):
+        """Add the /api routes to a MetricsServer"""
+        server.routes['/api'] = self._index
+        for route, endpoint in ENDPOINTS.items():
+            server.routes[route] = lambda query, endpoint=endpoint: self.handle(endpoint, query)
+
+    def _index(self, query: str):
+        return _json(200, {'endpoints': {
+            route: {'description': endpoint.description, 'filters': sorted(endpoint.filters),
+                    'required': list(endpoint.required)}
+            for route, endpoint in ENDPOINTS.items()
+        }})
+
+    def _connect(self) -> sqlite3.Connection:
+        # Read-only, so a bad query can never block or modify the scripts' writes
+        conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(self.path))}?mode=ro", uri=True, timeout=5)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def build_query(self, endpoint: Endpoint, params: Dict[str, str]) -> Tuple[str, list, int, int]:
+        """SQL, arguments, limit and offset for one request"""
+        try:
+            limit = min(int(params.pop('limit', self.page_size)), self.max_page_size)
+            offset = int(params.pop('offset', 0))
+        except ValueError:
+            raise QueryError("limit and offset must be integers")
+        if limit < 1 or offset < 0:
+            raise QueryError("limit must be positive and offset not negative")
+
+        unknown = set(params) - set(endpoint.filters)
+        if unknown:
+            raise QueryError(f"Unknown filters {sorted(unknown)}; allowed: {sorted(endpoint.filters)}")
+        missing = [name for name in endpoint.required if name not in params]
+        if missing:
+            raise QueryError(f"Missing required filters {missing}")
+
+        conditions = []
+        args = []
+        for name, value in params.items():
+            if name == 'compliant':
+                if value.lower() not in ('true', 'false', '1', '0'):
+                    raise QueryError("compliant must be true or false")
+                value = int(value.lower() in ('true', '1'))
+            conditions.append(endpoint.filters[name])
+            args.append(value)
+
+        sql = f"SELECT {', '.join(endpoint.columns)} FROM {endpoint.table}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if endpoint.group_by:
+            sql += f" GROUP BY {endpoint.group_by}"
+        # One extra row tells whether there is a next page without a COUNT(*)
+        sql += f" ORDER BY {endpoint.order} LIMIT ? OFFSET ?"
+        args += [limit + 1, offset]
+        return sql, args, limit, offset
+
+    def handle(self, endpoint: Endpoint, query: str):
+        params = {name: values[-1] for name, values in parse_qs(query).items()}
+        try:
+            sql, args, limit, offset = self.build_query(endpoint, params)
+        except QueryError as e:
+            return _json(400, {'error': str(e)})
+
+        if not os.path.exists(self.path):
+            return _json(503, {'error': "No history recorded yet"})
+        try:
+            conn = self._connect()
+            try:
+                rows = [dict(row) for row in conn.execute(sql, args)]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.error(f"Query on {endpoint.table} failed: {e}")
+            return _json(503, {'error': "History store unavailable"})
+
+        more = len(rows) > limit
+        return _json(200, {
+            'rows': rows[:limit],
+            'limit': limit,
+            'offset': offset,
+            'next_offset': offset + limit if more else None,
+        })
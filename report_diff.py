@@ -0,0 +1,127 @@
+import os
+import json
+import logging
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from monitor_config import get_setting
+from report_scheduler import DEFAULT_STATE_DIR
+
+# Smallest change in each column that counts as material; other columns must match exactly
+DEFAULT_TOLERANCE = {
+    'UPH': 5.0,
+    'Rate': 1.0,
+    'Hours': 0.25,
+    'Paid Hours': 0.25,
+    'Grand Total': 5.0,
+}
+
+Row = Dict[str, object]
+
+
+class RowDiff(NamedTuple):
+    new: List[Row]
+    changed: List[Tuple[Row, Row]]  # (last sent, current)
+    resolved: List[Row]
+
+    @property
+    def empty(self) -> bool:
+        return not (self.new or self.changed or self.resolved)
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value))
+    except ValueError:
+        return None
+
+
+class ReportDiff:
+    """Remembers the rows last sent for each report and reduces a new result set to what changed"""
+
+    def __init__(self, name: str, state_dir: str = None, tolerance: Dict[str, float] = None):
+        self.state_path = os.path.join(state_dir or DEFAULT_STATE_DIR, f"{name}_last_sent.json")
+        self.tolerance = dict(DEFAULT_TOLERANCE, **(tolerance or {}))
+        self.sent: Dict[str, Dict[str, Row]] = self._load_state()
+
+    @classmethod
+    def from_config(cls, name: str, config: Dict) -> Optional["ReportDiff"]:
+        """ReportDiff for the config.json report_diff section, or None if differential reporting is off"""
+        if not get_setting(config, 'report_diff', 'enabled', False):
+            return None
+        return cls(name, get_setting(config, 'schedules', 'state_dir'), get_setting(config, 'report_diff', 'tolerance'))
+
+    def _load_state(self) -> Dict[str, Dict[str, Row]]:
+        try:
+            with open(self.state_path, "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable report state {self.state_path}: {e}")
+            return {}
+
+    def _save_state(self):
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump(self.sent, f, default=str)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logging.error(f"Failed to save report state {self.state_path}: {e}")
+
+    def _changed(self, previous: Row, current: Row, columns: Sequence[str]) -> bool:
+        for column in columns:
+            old, new = previous.get(column), current.get(column)
+            old_number, new_number = _number(old), _number(new)
+            if old_number is None or new_number is None:
+                if str(old) != str(new):
+                    return True
+            elif abs(new_number - old_number) > self.tolerance.get(column, 0):
+                return True
+        return False
+
+    def diff(self, report: str, rows: Dict[str, Row], columns: Sequence[str]) -> RowDiff:
+        """Compare rows keyed by associate with the last sent rows of this report on the given columns"""
+        previous = self.sent.get(report, {})
+        new, changed = [], []
+        for key, row in rows.items():
+            last = previous.get(key)
+            if last is None:
+                new.append(row)
+            elif self._changed(last, row, columns):
+                changed.append((last, row))
+        resolved = [row for key, row in previous.items() if key not in rows]
+        return RowDiff(new, changed, resolved)
+
+    def commit(self, report: str, rows: Dict[str, Row], result: RowDiff, key_column: str):
+        """Record what was sent; unchanged rows keep their old baseline so slow drift still shows up"""
+        baseline = dict(self.sent.get(report, {}))
+        for row in result.resolved:
+            baseline.pop(str(row[key_column]), None)
+        for row in result.new:
+            baseline[str(row[key_column])] = row
+        for _, row in result.changed:
+            baseline[str(row[key_column])] = row
+        self.sent[report] = {key: baseline[key] for key in rows if key in baseline}
+        self._save_state()
+
+
+def diff_tables(result: RowDiff, headers: List[str], columns: Sequence[str]) -> List[Tuple[str, List[List]]]:
+    """(heading, rows) sections for a diff; changed cells read 'old → new'"""
+    sections = []
+    if result.new:
+        sections.append(("🆕 New", [[row.get(h, '-') for h in headers] for row in result.new]))
+    if result.changed:
+        changed_rows = []
+        for old, new in result.changed:
+            changed_rows.append([
+                f"{old.get(h, '-')} → {new.get(h, '-')}" if h in columns and str(old.get(h)) != str(new.get(h)) else new.get(h, '-')
+                for h in headers
+            ])
+        sections.append(("🔁 Changed", changed_rows))
+    if result.resolved:
+        sections.append(("✅ Resolved", [[row.get(h, '-') for h in headers] for row in result.resolved]))
+    return sections
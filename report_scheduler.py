@@ -0,0 +1,203 @@
+import os
+import json
+import logging
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import pendulum
+
+from monitor_channel import channel
+from monitor_clock import clock as default_clock
+from monitor_config import get_setting
+
+DEFAULT_TIMEZONE = "America/Los_Angeles"
+DEFAULT_STATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "state")
+
+# How far ahead to look for the next fire time before giving up (days)
+MAX_LOOKAHEAD_DAYS = 7
+
+
+class ScheduledRun(NamedTuple):
+    fire_time: pendulum.DateTime
+    name: str
+    window_start: pendulum.DateTime
+    window_end: pendulum.DateTime
+
+
+def _wall_time(day: pendulum.Date, minutes: int, tz: str) -> pendulum.DateTime:
+    """The wall-clock time minutes after day's midnight in tz; negative minutes reach into the day before.
+
+    A time skipped by a DST change resolves to the same offset past the change, and an
+    ambiguous one to its later occurrence.
+    """
+    day = day.add(days=minutes // 1440)
+    minutes %= 1440
+    return pendulum.datetime(day.year, day.month, day.day, minutes // 60, minutes % 60, tz=tz)
+
+
+def quarter_timetable(quarters, delay_minutes: int = 1) -> Callable:
+    """Timetable firing delay_minutes after each quarter ends.
+
+    quarters is a list of (name, (start_hour, start_minute), (end_hour, end_minute)) as returned
+    by WorkingRate.get_quarters. A negative delay fires before the quarter ends. A quarter that
+    wraps midnight belongs to the day it ends on.
+    """
+    def timetable(day: pendulum.Date, tz: str) -> List[ScheduledRun]:
+        runs = []
+        for name, start, end in quarters:
+            window_end = pendulum.datetime(day.year, day.month, day.day, end[0], end[1], tz=tz)
+            window_start = pendulum.datetime(day.year, day.month, day.day, start[0], start[1], tz=tz)
+            if window_start > window_end:
+                window_start = window_start.subtract(days=1)
+            runs.append(ScheduledRun(window_end.add(minutes=delay_minutes), name, window_start, window_end))
+        return runs
+    return timetable
+
+
+def hourly_timetable(delay_minutes: int = 0, window_hours: int = 1) -> Callable:
+    """Timetable firing at every hour boundary for the window_hours that just ended"""
+    def timetable(day: pendulum.Date, tz: str) -> List[ScheduledRun]:
+        runs = []
+        for hour in range(24):
+            window_end = _wall_time(day, hour * 60, tz)
+            if runs and window_end <= runs[-1].window_end:
+                # An hour skipped by the spring DST change
+                continue
+            window_start = _wall_time(day, (hour - window_hours) * 60, tz)
+            runs.append(ScheduledRun(window_end.add(minutes=delay_minutes), f"Hour {hour:02d}", window_start, window_end))
+        return runs
+    return timetable
+
+
+def parse_quarters(entries) -> List:
+    """Convert config.json quarter entries ({"name", "start": "HH:MM", "end": "HH:MM"}) to get_quarters tuples"""
+    quarters = []
+    for entry in entries:
+        start_hour, start_minute = (int(part) for part in entry['start'].split(':'))
+        end_hour, end_minute = (int(part) for part in entry['end'].split(':'))
+        quarters.append((entry['name'], (start_hour, start_minute), (end_hour, end_minute)))
+    return quarters
+
+
+def interval_timetable(interval_minutes: int, delay_minutes: int = 0) -> Callable:
+    """Timetable firing every interval_minutes (a divisor of a day) for the interval that just ended"""
+    def timetable(day: pendulum.Date, tz: str) -> List[ScheduledRun]:
+        runs = []
+        for minute in range(0, 24 * 60, interval_minutes):
+            window_end = _wall_time(day, minute, tz)
+            if runs and window_end <= runs[-1].window_end:
+                # An interval skipped by the spring DST change
+                continue
+            window_start = runs[-1].window_end if runs else _wall_time(day, -interval_minutes, tz)
+            runs.append(ScheduledRun(window_end.add(minutes=delay_minutes), window_end.format('HH:mm'), window_start, window_end))
+        return runs
+    return timetable
+
+
+class ReportScheduler:
+    """Sleeps until the next report fire time and catches up runs missed while the process was down"""
+
+    def __init__(self, name: str, timetable: Callable, tz: str = DEFAULT_TIMEZONE,
+                 state_dir: str = None, catch_up_hours: float = 12, clock: Callable = None):
+        self.name = name
+        self.timetable = timetable
+        self.tz = tz
+        self.state_path = os.path.join(state_dir or DEFAULT_STATE_DIR, f"{name}_schedule.json")
+        self.catch_up = pendulum.duration(seconds=int(catch_up_hours * 3600))
+        self.clock = clock or (lambda: default_clock.now(self.tz))
+        self.timetables: Dict[pendulum.Date, List[ScheduledRun]] = {}
+        self.last_fired: Optional[pendulum.DateTime] = self._load_state()
+
+    @classmethod
+    def from_config(cls, name: str, timetable: Callable, config: Dict, report: str) -> "ReportScheduler":
+        """Build a scheduler from the config.json schedules section; report selects the per-report settings"""
+        schedules = config.get('schedules', {})
+        return cls(
+            name,
+            timetable,
+            tz=get_setting(config, 'schedules', 'timezone', DEFAULT_TIMEZONE),
+            state_dir=get_setting(config, 'schedules', 'state_dir'),
+            catch_up_hours=get_setting(schedules, report, 'catch_up_hours', 12),
+        )
+
+    def _load_state(self) -> Optional[pendulum.DateTime]:
+        try:
+            with open(self.state_path, "rt", encoding="utf-8") as f:
+                return pendulum.parse(json.load(f)['last_fired']).in_timezone(self.tz)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Ignoring unreadable schedule state {self.state_path}: {e}")
+            return None
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({'last_fired': self.last_fired.isoformat()}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def runs_for_day(self, day: pendulum.Date) -> List[ScheduledRun]:
+        """Precomputed, fire-time ordered timetable for one calendar day"""
+        runs = self.timetables.get(day)
+        if runs is None:
+            runs = sorted(self.timetable(day, self.tz), key=lambda run: run.fire_time)
+            # Only today's neighbours are ever needed, so don't let the cache grow
+            self.timetables = {d: r for d, r in self.timetables.items() if abs(d.toordinal() - day.toordinal()) <= 1}
+            self.timetables[day] = runs
+        return runs
+
+    def due_runs(self, now: pendulum.DateTime) -> List[ScheduledRun]:
+        """Runs whose fire time has passed since the last fired run, within the catch-up window"""
+        earliest = now - self.catch_up
+        if self.last_fired is not None and self.last_fired > earliest:
+            earliest = self.last_fired
+
+        due = []
+        day = earliest.date()
+        while day <= now.date():
+            due.extend(run for run in self.runs_for_day(day) if earliest < run.fire_time <= now)
+            day = day.add(days=1)
+        if self.last_fired is None:
+            # First start without saved state: send the latest report only, not the whole backlog
+            return due[-1:]
+        return due
+
+    def next_run(self, now: pendulum.DateTime) -> Optional[ScheduledRun]:
+        day = now.date()
+        for _ in range(MAX_LOOKAHEAD_DAYS):
+            for run in self.runs_for_day(day):
+                if run.fire_time > now:
+                    return run
+            day = day.add(days=1)
+        return None
+
+    def mark_fired(self, run: ScheduledRun):
+        self.last_fired = run.fire_time
+        try:
+            self._save_state()
+        except OSError as e:
+            logging.error(f"Failed to save schedule state {self.state_path}: {e}")
+
+    def run_forever(self, handler: Callable[[ScheduledRun], None]):
+        """Call handler for every run as it comes due, sleeping exactly until the next fire time"""
+        while True:
+            channel.next_iteration()
+            now = self.clock()
+            for run in self.due_runs(now):
+                late = (now - run.fire_time).total_seconds()
+                if late > 60:
+                    logging.info(f"Catching up missed {run.name} ({run.window_start} to {run.window_end}), {late / 60:.0f} min late")
+                try:
+                    handler(run)
+                except Exception as e:
+                    logging.error(f"{self.name} run {run.name} failed: {e}")
+                self.mark_fired(run)
+
+            upcoming = self.next_run(self.clock())
+            if upcoming is None:
+                logging.warning(f"{self.name} has nothing scheduled in the next {MAX_LOOKAHEAD_DAYS} days")
+                channel.sleep(3600)
+                continue
+            wait = max((upcoming.fire_time - self.clock()).total_seconds(), 0)
+            logging.info(f"Next {self.name} run: {upcoming.name} at {upcoming.fire_time.format('YYYY-MM-DD HH:mm')} (sleeping {wait:.0f}s)")
+            channel.sleep(wait)
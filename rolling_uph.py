@@ -0,0 +1,102 @@
+from collections import deque
+from typing import Deque, Dict, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+
+class SliceTotals(NamedTuple):
+    name: str
+    manager: str
+    hours: float
+    jobs: float
+    units: float
+
+
+class AssociateWindow:
+    """Ring buffer of one associate's slices with running totals for the trailing window"""
+
+    __slots__ = ('name', 'manager', 'slices', 'hours', 'jobs', 'units')
+
+    def __init__(self, name: str, manager: str):
+        self.name = name
+        self.manager = manager
+        self.slices: Deque[Tuple[int, float, float, float]] = deque()
+        self.hours = 0.0
+        self.jobs = 0.0
+        self.units = 0.0
+
+    def add(self, bucket: int, totals: SliceTotals):
+        if self.slices and bucket <= self.slices[-1][0]:
+            return  # Already counted, e.g. a replayed catch-up slice
+        self.name, self.manager = totals.name, totals.manager
+        self.slices.append((bucket, totals.hours, totals.jobs, totals.units))
+        self.hours += totals.hours
+        self.jobs += totals.jobs
+        self.units += totals.units
+
+    def evict(self, oldest_bucket: int):
+        """Drop slices older than oldest_bucket, subtracting them from the running totals"""
+        while self.slices and self.slices[0][0] < oldest_bucket:
+            _, hours, jobs, units = self.slices.popleft()
+            self.hours -= hours
+            self.jobs -= jobs
+            self.units -= units
+        if not self.slices:
+            self.hours = self.jobs = self.units = 0.0
+
+    @property
+    def uph(self) -> float:
+        return self.units / self.hours if self.hours > 0 else 0.0
+
+
+class RollingUPH:
+    """Trailing-window UPH per associate, updated incrementally from short FCLM slices"""
+
+    def __init__(self, bucket_minutes: int = 15, window_minutes: int = 60):
+        self.bucket_seconds = bucket_minutes * 60
+        self.window_buckets = max(window_minutes // bucket_minutes, 1)
+        self.associates: Dict[str, AssociateWindow] = {}
+        self.latest_bucket: Optional[int] = None
+        # Logins the alert rules flagged over the window at the last slice
+        self.flagged: Set[str] = set()
+
+    def bucket_index(self, bucket_end_timestamp: float) -> int:
+        return int(bucket_end_timestamp // self.bucket_seconds)
+
+    def add_slice(self, bucket_end_timestamp: float, totals: Dict[str, SliceTotals]):
+        """Add one slice and slide every associate's window forward to it"""
+        bucket = self.bucket_index(bucket_end_timestamp)
+        for login, slice_totals in totals.items():
+            window = self.associates.get(login)
+            if window is None:
+                window = self.associates[login] = AssociateWindow(slice_totals.name, slice_totals.manager)
+            window.add(bucket, slice_totals)
+
+        if self.latest_bucket is None or bucket > self.latest_bucket:
+            self.latest_bucket = bucket
+        oldest = self.latest_bucket - self.window_buckets + 1
+        for login in list(self.associates):
+            window = self.associates[login]
+            window.evict(oldest)
+            if not window.slices:
+                del self.associates[login]
+
+    def covered_minutes(self) -> int:
+        """How much of the trailing window the buffered slices span"""
+        if not self.associates:
+            return 0
+        oldest = min(window.slices[0][0] for window in self.associates.values())
+        return (self.latest_bucket - oldest + 1) * self.bucket_seconds // 60
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Trailing-window totals as the columns alert rules are evaluated over"""
+        # An associate with no paid hours in the window has no rate to judge
+        windows = [(login, w) for login, w in self.associates.items() if w.hours > 0]
+        return {
+            'Login ID': np.array([login for login, _ in windows], dtype=object),
+            'Associate Name': np.array([w.name for _, w in windows], dtype=object),
+            'Manager': np.array([w.manager for _, w in windows], dtype=object),
+            'Hours': np.array([w.hours for _, w in windows], dtype=float),
+            'Jobs': np.array([w.jobs for _, w in windows], dtype=float),
+            'UPH': np.array([w.uph for _, w in windows], dtype=float),
+        }
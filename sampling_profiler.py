@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from monitor_channel import channel
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+DEFAULT_INTERVAL = 0.01
+DEFAULT_SECONDS = 60
+# Upper bound for any profile, including one that waits for a number of cycles
+MAX_SECONDS = 3600
+TOP_FUNCTIONS = 30
+# Threads that only exist to serve the profiler and would just add idle samples
+IGNORED_THREADS = {"sampling-profiler", "monitor-commands"}
+
+Stack = Tuple[str, ...]
+
+
+class SamplingProfiler:
+    """Samples every thread's Python stack at a fixed interval from a background thread.
+
+    Nothing is hooked into the profiled code, so the overhead is one walk of each thread's
+    frames per interval and the process keeps running normally.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.labels: Dict[object, str] = {}
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def _label(self, code) -> str:
+        label = self.labels.get(code)
+        if label is None:
+            # ';' separates frames in collapsed stacks, so it cannot appear in a label
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+            self.labels[code] = label
+        return label
+
+    def sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if names.get(ident) in IGNORED_THREADS:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+        self.samples += 1
+
+    def run(self, seconds: float, cycles: int = None):
+        """Sample until seconds pass or the script completes cycles more main-loop iterations"""
+        deadline = time.monotonic() + seconds
+        start_iteration = channel.iteration
+        while not self.stop_event.is_set() and time.monotonic() < deadline:
+            if cycles and channel.iteration - start_iteration > cycles:
+                break
+            self.sample()
+            # Real time on purpose: the profile follows the process, not monitor_clock
+            time.sleep(self.interval)
+
+    def collapsed(self) -> str:
+        """Stacks in the collapsed format read by flamegraph.pl and speedscope"""
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def summary(self, top: int = TOP_FUNCTIONS) -> str:
+        """Functions ranked by samples where they were running (self) and on the stack (total)"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack[1:]):
+                total[label] += count
+
+        thread_samples = sum(self.stacks.values()) or 1
+        lines = [f"{self.samples} samples every {self.interval * 1000:.0f} ms, {thread_samples} thread stacks", ""]
+        for title, counts in (("Self", own), ("Total", total)):
+            lines.append(f"{title:>8}  {'%':>6}  Function")
+            for label, count in counts.most_common(top):
+                lines.append(f"{count:>8}  {100 * count / thread_samples:>5.1f}%  {label}")
+            lines.append("")
+        return "\n".join(lines)
+
+
+active: Optional[SamplingProfiler] = None
+active_lock = threading.Lock()
+
+
+def write_profile(profiler: SamplingProfiler, name: str, directory: str = None) -> List[str]:
+    directory = directory or DEFAULT_PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"profile_{name}_{datetime.now().strftime('%Y%m%dT%H%M%S')}")
+    paths = [f"{stem}.collapsed", f"{stem}.txt"]
+    with open(paths[0], "wt", encoding="utf-8") as f:
+        f.write(profiler.collapsed())
+    with open(paths[1], "wt", encoding="utf-8") as f:
+        f.write(profiler.summary())
+    return paths
+
+
+def start_profile(seconds: float = DEFAULT_SECONDS, cycles: int = None, interval: float = DEFAULT_INTERVAL,
+                  directory: str = None) -> bool:
+    """Profile this process in the background; False if a profile is already running"""
+    global active
+    with active_lock:
+        if active is not None:
+            return False
+        active = SamplingProfiler(interval)
+        profiler = active
+    seconds = min(seconds or (MAX_SECONDS if cycles else DEFAULT_SECONDS), MAX_SECONDS)
+
+    def run():
+        global active
+        try:
+            profiler.run(seconds, cycles)
+            paths = write_profile(profiler, channel.name, directory)
+            logging.info(f"Profile of {profiler.samples} samples written to {paths[0]} and {paths[1]}")
+            channel.send({'type': 'profile_done', 'samples': profiler.samples, 'files': paths})
+        except Exception as e:
+            logging.error(f"Profiling failed: {e}")
+        finally:
+            with active_lock:
+                active = None
+
+    what = f"{cycles} cycles (at most {seconds:.0f}s)" if cycles else f"{seconds:.0f}s"
+    logging.info(f"Profiling for {what} every {interval * 1000:.0f} ms")
+    profiler.thread = threading.Thread(target=run, name="sampling-profiler", daemon=True)
+    profiler.thread.start()
+    return True
+
+
+def profile_command(message: Dict):
+    """Control channel handler for the supervisor's 'profile' command"""
+    if not start_profile(message.get('seconds'), message.get('cycles'),
+                         message.get('interval') or DEFAULT_INTERVAL, message.get('directory')):
+        logging.warning("Ignoring profile command, a profile is already running")
@@ -0,0 +1,205 @@
+import os
+import sys
+import copy
+import json
+import time
+import logging
+import argparse
+import tempfile
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pendulum
+
+from http_cassette import DEFAULT_BENCH_DIR, CassetteServer, load_cassettes, replay_fclm, replay_session
+from monitor_clock import SimulationComplete, VirtualClock, clock
+from monitor_config import get_setting, load_config
+from process_stats import sample_process
+from report_scheduler import DEFAULT_TIMEZONE, quarter_timetable
+
+WORKFLOW_URL = "https://hooks.slack.com/triggers/soak"
+
+
+class SoakStats:
+    """CPU time and RSS for every simulated hour, sampled when the virtual clock moves past it"""
+
+    def __init__(self, start: float, end: float):
+        self.hour = int(start // 3600)
+        self.end = end
+        self.cpu_mark = time.process_time()
+        self.hours: List[Dict] = []  # CPU and memory used in each simulated hour
+        self.rss_start = self._rss()
+
+    @staticmethod
+    def _rss() -> Optional[float]:
+        sample = sample_process(os.getpid())
+        return sample.rss_bytes / (1024 * 1024) if sample else None
+
+    def on_advance(self, now: float):
+        # The last sleep may overshoot the end of the simulation; those hours were never simulated
+        hour = int(min(now, self.end) // 3600)
+        if hour == self.hour:
+            return
+        cpu = time.process_time()
+        rss = self._rss()
+        # One sleep can span several hours; the ones slept through used no CPU but still count
+        for skipped in range(self.hour, hour):
+            self.hours.append(dict(
+                hour=pendulum.from_timestamp(skipped * 3600).isoformat(),
+                cpu_seconds=round(cpu - self.cpu_mark, 4) if skipped == self.hour else 0.0,
+                rss_mb=rss,
+            ))
+        self.hour, self.cpu_mark = hour, cpu
+
+
+def quarter_soak(server: CassetteServer, config: Dict, virtual: VirtualClock) -> Tuple[Callable, Callable]:
+    """WorkingRate.normal_run; alerts are due when their quarter ends"""
+    import WorkingRate
+
+    replay_session(WorkingRate.webhook_session, server)
+    fclm = replay_fclm(WorkingRate.FCLM, server)
+    tz = get_setting(config, 'schedules', 'timezone', DEFAULT_TIMEZONE)
+    timetable = quarter_timetable(WorkingRate.get_quarters(config), delay_minutes=0)
+
+    def due(posted: float) -> float:
+        day = pendulum.from_timestamp(posted, tz=tz).date()
+        ends = [run.window_end.timestamp() for d in (day.subtract(days=1), day) for run in timetable(d, tz)]
+        return max((end for end in ends if end <= posted), default=posted)
+
+    return lambda: WorkingRate.normal_run(fclm, WORKFLOW_URL, config), due
+
+
+def fluid_soak(server: CassetteServer, config: Dict, virtual: VirtualClock) -> Tuple[Callable, Callable]:
+    """fluid_load_monitor.normal_run; alerts are due at the end of their hour or rolling slice"""
+    import fluid_load_monitor
+
+    replay_session(fluid_load_monitor.webhook_session, server)
+    fclm = replay_fclm(fluid_load_monitor.FCLM, server)
+    targets = fluid_load_monitor.load_targets(config)
+    rolling = get_setting(config, 'schedules', 'rolling_uph', {})
+    period = rolling.get('bucket_minutes', 15) * 60 if rolling.get('enabled') else 3600
+
+    def due(posted: float) -> float:
+        return posted // period * period
+
+    return lambda: fluid_load_monitor.normal_run(fclm, targets, config), due
+
+
+def arrivals_soak(server: CassetteServer, config: Dict, virtual: VirtualClock) -> Tuple[Callable, Callable]:
+    """collect_arrivals.run_monitor; alerts are due when the poll that raised them started"""
+    import collect_arrivals
+
+    replay_session(collect_arrivals.webhook_session, server)
+    fclm = replay_fclm(collect_arrivals.FCLM, server)
+    monitor = collect_arrivals.ArrivalsMonitor(fclm.fc)
+
+    def due(posted: float) -> float:
+        return virtual.last_wake
+
+    return lambda: collect_arrivals.run_monitor(fclm, monitor), due
+
+
+PIPELINES = {
+    'quarter': quarter_soak,
+    'fluid': fluid_soak,
+    'arrivals': arrivals_soak,
+}
+
+
+def _summary(values: List[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        'p50': round(ordered[len(ordered) // 2], 3),
+        'p95': round(ordered[min(int(0.95 * len(ordered)), len(ordered) - 1)], 3),
+        'max': round(ordered[-1], 3),
+    }
+
+
+def soak(pipeline: str, cassettes: List[str], start: pendulum.DateTime, days: float, speed: float = 0,
+         config: Dict = None) -> Dict:
+    """Run a monitor's real loop for days of simulated time against replayed traffic"""
+    config = copy.deepcopy(config or {})
+    # Keep the simulation away from the live schedule state, history and cassettes
+    config.setdefault('schedules', {})['state_dir'] = tempfile.mkdtemp(prefix="soak_state_")
+    config.setdefault('history', {})['enabled'] = False
+    config.setdefault('cassettes', {})['record'] = False
+
+    begin = start.timestamp()
+    end = begin + days * 86400
+    stats = SoakStats(begin, end)
+    virtual = VirtualClock(begin, end, stats.on_advance)
+    latencies: List[float] = []
+    server = CassetteServer(load_cassettes(cassettes), speed, on_post=lambda posted: latencies.append(posted - due(posted)))
+    run, due = PIPELINES[pipeline](server, config, virtual)
+    server.start()
+    clock.use(virtual)
+    real_started = time.perf_counter()
+    try:
+        try:
+            run()
+        except SimulationComplete:
+            pass
+    finally:
+        clock.use(None)
+        server.stop()
+    real_seconds = time.perf_counter() - real_started
+
+    rss = [hour['rss_mb'] for hour in stats.hours if hour['rss_mb'] is not None]
+    cpu = [hour['cpu_seconds'] for hour in stats.hours]
+    return {
+        'pipeline': pipeline,
+        'cassettes': [os.path.basename(path) for path in cassettes],
+        'simulated_start': start.isoformat(),
+        'simulated_days': days,
+        'real_seconds': round(real_seconds, 2),
+        'speedup': round(days * 86400 / real_seconds) if real_seconds else None,
+        'alerts': len(server.posts),
+        'alert_latency_seconds': _summary(latencies),
+        'requests': server.requests,
+        'unmatched_requests': server.unmatched,
+        'cpu_seconds_per_simulated_hour': {
+            'mean': round(sum(cpu) / len(cpu), 4) if cpu else None,
+            'max': max(cpu) if cpu else None,
+        },
+        'rss_mb': {
+            'start': stats.rss_start,
+            'end': rss[-1] if rss else None,
+            'max': max(rss) if rss else None,
+            'growth_per_simulated_day': round((rss[-1] - rss[0]) / days, 2) if len(rss) > 1 else None,
+        },
+        'hours': stats.hours,
+        'recorded_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a monitor for simulated days against recorded HTTP traffic")
+    parser.add_argument("pipeline", choices=sorted(PIPELINES))
+    parser.add_argument("cassettes", nargs="+", help="Cassette files recorded with cassettes.record")
+    parser.add_argument("--days", type=float, default=3, help="Simulated days to run (default 3)")
+    parser.add_argument("--start", help="Simulated start, e.g. 2024-05-01T06:00 (default: today 00:00)")
+    parser.add_argument("--speed", type=float, default=0, help="Replay latency speed-up: 1 = as recorded, 0 = no delay (default)")
+    parser.add_argument("--output", help="JSON file to write (default: bench_output/soak_<pipeline>_<time>.json)")
+    parser.add_argument("--verbose", action="store_true", help="Show the monitor's own logging")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    config = load_config()
+    tz = get_setting(config, 'schedules', 'timezone', DEFAULT_TIMEZONE)
+    start = pendulum.parse(args.start, tz=tz) if args.start else pendulum.today(tz)
+    result = soak(args.pipeline, args.cassettes, start, args.days, args.speed, config)
+
+    output = args.output or os.path.join(DEFAULT_BENCH_DIR, f"soak_{args.pipeline}_{datetime.now().strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "wt", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    summary = {key: value for key, value in result.items() if key != 'hours'}
+    json.dump(summary, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
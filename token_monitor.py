@@ -9,31 +9,77 @@ import sys
 import signal
 import json
 from typing import Dict, List, Optional, Callable
+from urllib.parse import parse_qs
+
+from monitor_config import load_config, get_setting
+from monitor_channel import ChannelServer, CHANNEL_ADDR_ENV, CHILD_NAME_ENV
+from process_stats import ResourceHistory, sample_process, sampling_supported
+from monitor_logging import RECORD_ATTRS, parse_record, setup_logging
+from monitor_metrics import MetricsRegistry, MetricsServer
+from http_client import Session, http_settings
+from query_api import QueryAPI
+from tracing import TRACE_FILE_ENV
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('token_monitor.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 class TokenMonitor:
     """Monitors midway token changes and manages script lifecycle"""
     
-    def __init__(self):
+    def __init__(self, config: Dict = None):
+        self.config = config or {}
         self.cookie_path = os.path.join(os.path.expanduser("~"), ".midway", "cookie")
         self.last_token_time = 0
         self.running_scripts: Dict[str, subprocess.Popen] = {}
         self.script_configs: List[Dict] = []
         self.shutdown_event = threading.Event()
+        self.scripts_lock = threading.RLock()  # Guards running_scripts across monitor threads
         self.startup_notification_sent = False  # Track if startup notification was sent
         
+        # Pre-imported standby interpreters used to make restarts near-instant
+        self.warm_spares: List[subprocess.Popen] = []
+        self.warm_spare_count = get_setting(self.config, 'advanced', 'warm_spare_count', 1)
+        self.warm_spare_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "warm_spare.py")
+        
+        # Heartbeat channel children report progress on, see monitor_channel.py
+        self.channel_server: Optional[ChannelServer] = None
+        self.heartbeat_grace = get_setting(self.config, 'monitoring', 'heartbeat_grace_seconds', 10)
+        self.heartbeat_check_interval = get_setting(self.config, 'monitoring', 'heartbeat_check_interval', 2)
+        
+        # Per-script resource history and leak-triggered recycling
+        self.resource_history: Dict[str, ResourceHistory] = {}
+        self.recycle_pending: Dict[str, tuple] = {}  # script name -> (pid, reason)
+        self.resource_sample_interval = get_setting(self.config, 'monitoring', 'resource_sample_interval', 30)
+        self.resource_history_size = get_setting(self.config, 'monitoring', 'resource_history_size', 720)
+        self.memory_ceiling_mb = get_setting(self.config, 'monitoring', 'memory_ceiling_mb', 1024)
+        self.memory_growth_limit = get_setting(self.config, 'monitoring', 'memory_growth_limit_mb_per_hour', 100)
+        self.memory_growth_window = get_setting(self.config, 'monitoring', 'memory_growth_window_minutes', 60) * 60
+        
+        # Prometheus-style metrics fed by the scripts over the monitor channel
+        self.metrics = MetricsRegistry()
+        self.metrics_server: Optional[MetricsServer] = None
+        self.metrics_host = get_setting(self.config, 'monitoring', 'metrics_host', "127.0.0.1")
+        self.metrics_port = get_setting(self.config, 'monitoring', 'metrics_port', 9108)
+        
+        # Directory for per-script pipeline traces (tracing.py), disabled when unset
+        self.trace_dir = get_setting(self.config, 'monitoring', 'trace_dir')
+        
+        # On-demand sampling profiles of running scripts (sampling_profiler.py)
+        self.profile_interval_ms = get_setting(self.config, 'profiling', 'interval_ms', 10)
+        self.profile_default_seconds = get_setting(self.config, 'profiling', 'default_seconds', 60)
+        self.profile_max_seconds = get_setting(self.config, 'profiling', 'max_seconds', 900)
+        self.profile_dir = get_setting(self.config, 'profiling', 'dir')
+        
+        # Defaults for allocation tracking started on demand (heap_snapshots.py)
+        self.heap_interval_minutes = get_setting(self.config, 'allocations', 'interval_minutes', 30)
+        self.heap_window_minutes = get_setting(self.config, 'allocations', 'window_minutes', 5) or 0
+        self.heap_frames = get_setting(self.config, 'allocations', 'frames', 1)
+        self.heap_top = get_setting(self.config, 'allocations', 'top', 25)
+        self.heap_dir = get_setting(self.config, 'allocations', 'dir')
+        
         # PSC2-webhook-monitor channel URL for monitor/token alerts
         self.monitor_webhook_url = "https://hooks.slack.com/triggers/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"
+        http_settings.configure(self.config)
+        self.webhook_session = Session('send')
         
     def get_token_modification_time(self) -> float:
         """Get the last modification time of the token file"""
@@ -67,6 +113,22 @@ class TokenMonitor:
             logger.error(f"Error validating token: {e}")
             return False
     
+    def get_token_expiry(self) -> Optional[float]:
+        """Get the earliest expiry time in the token file, as scripts refuse any expired cookie"""
+        try:
+            with open(self.cookie_path, "rt") as f:
+                cookie_lines = f.readlines()
+        except OSError:
+            return None
+        
+        expiries = []
+        for line in cookie_lines[4:]:
+            try:
+                expiries.append(int(line.split("\t")[4]))
+            except (IndexError, ValueError):
+                continue
+        return min(expiries) if expiries else None
+    
     def add_script_config(self, name: str, script_path: str, args: List[str] = None, 
                          working_dir: str = None, env_vars: Dict[str, str] = None):
         """Add a script configuration to be managed"""
@@ -83,10 +145,29 @@ class TokenMonitor:
         logger.info(f"Added script config: {name}")
     
     def start_script(self, config: Dict) -> Optional[subprocess.Popen]:
-        """Start a single script"""
+        """Start a single script, preferring a warm spare over a cold interpreter"""
+        started_at = time.time()
+        process = self._activate_warm_spare(config)
+        if process is None:
+            process = self._start_cold(config)
+        if process is None:
+            return None
+        
+        config['restart_count'] += 1
+        config['last_restart'] = time.time()
+        with self.metrics.lock:
+            self.metrics.counter('script_restarts_total').inc(script=config['name'])
+        logger.info(f"Script {config['name']} started in {(time.time() - started_at) * 1000:.0f} ms (PID: {process.pid})")
+        
+        self._attach_output(process, config['name'])
+        self._refill_warm_spares()
+        return process
+    
+    def _start_cold(self, config: Dict) -> Optional[subprocess.Popen]:
+        """Start a script in a fresh interpreter"""
         try:
             env = os.environ.copy()
-            env.update(config['env_vars'])
+            env.update(self._child_env_vars(config))
             
             cmd = [sys.executable, config['script_path']] + config['args']
             
@@ -105,9 +186,6 @@ class TokenMonitor:
                 bufsize=1
             )
             
-            config['restart_count'] += 1
-            config['last_restart'] = time.time()
-            
             # Send automated inputs for interactive scripts
             # Note: The automated versions don't need inputs, but keeping this for compatibility
             if config['name'] == 'CollectArrivals':
@@ -132,31 +210,114 @@ class TokenMonitor:
                 except Exception as e:
                     logger.warning(f"Failed to close stdin for {config['name']}: {e}")
             
-            # Start threads to handle output
-            threading.Thread(
-                target=self._handle_output,
-                args=(process.stdout, config['name'], 'STDOUT'),
-                daemon=True
-            ).start()
-            
-            threading.Thread(
-                target=self._handle_output,
-                args=(process.stderr, config['name'], 'STDERR'),
-                daemon=True
-            ).start()
-            
             return process
             
         except Exception as e:
             logger.error(f"Failed to start script {config['name']}: {e}")
             return None
     
+    def _child_env_vars(self, config: Dict) -> Dict[str, str]:
+        """Environment variables for a child, including how to reach the monitor channel"""
+        env_vars = dict(config['env_vars'])
+        env_vars[CHILD_NAME_ENV] = config['name']
+        if self.channel_server:
+            env_vars[CHANNEL_ADDR_ENV] = self.channel_server.address
+        if self.trace_dir:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            env_vars[TRACE_FILE_ENV] = os.path.join(os.path.abspath(self.trace_dir), f"trace_{config['name']}.jsonl")
+        return env_vars
+    
+    def _attach_output(self, process: subprocess.Popen, name: str):
+        """Start threads forwarding a script's stdout/stderr into the monitor log"""
+        threading.Thread(
+            target=self._handle_output,
+            args=(process.stdout, name, 'STDOUT'),
+            daemon=True
+        ).start()
+        
+        threading.Thread(
+            target=self._handle_output,
+            args=(process.stderr, name, 'STDERR'),
+            daemon=True
+        ).start()
+    
+    def _spawn_warm_spare(self) -> Optional[subprocess.Popen]:
+        """Start a standby interpreter that pre-imports the heavy script dependencies"""
+        try:
+            return subprocess.Popen(
+                [sys.executable, self.warm_spare_path],
+                cwd=os.path.dirname(self.warm_spare_path),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                stdin=subprocess.PIPE,
+                universal_newlines=True,
+                bufsize=1
+            )
+        except Exception as e:
+            logger.error(f"Failed to start warm spare: {e}")
+            return None
+    
+    def _refill_warm_spares(self):
+        """Top the warm spare pool back up to the configured size"""
+        if self.shutdown_event.is_set() or not os.path.exists(self.warm_spare_path):
+            return
+        self.warm_spares = [spare for spare in self.warm_spares if spare.poll() is None]
+        while len(self.warm_spares) < self.warm_spare_count:
+            spare = self._spawn_warm_spare()
+            if spare is None:
+                break
+            self.warm_spares.append(spare)
+            logger.info(f"Warm spare ready for next restart (PID: {spare.pid})")
+    
+    def _activate_warm_spare(self, config: Dict) -> Optional[subprocess.Popen]:
+        """Hand a script to a waiting warm spare, returning None if none is usable"""
+        while self.warm_spares:
+            spare = self.warm_spares.pop(0)
+            if spare.poll() is not None:
+                continue
+            request = {
+                'script_path': config['script_path'],
+                'args': config['args'],
+                'working_dir': config['working_dir'],
+                'env_vars': self._child_env_vars(config)
+            }
+            try:
+                spare.stdin.write(json.dumps(request) + "\n")
+                spare.stdin.flush()
+                spare.stdin.close()
+                logger.info(f"Starting script {config['name']} on warm spare (PID: {spare.pid})")
+                return spare
+            except Exception as e:
+                logger.warning(f"Warm spare {spare.pid} unusable, discarding: {e}")
+                spare.kill()
+        return None
+    
+    def stop_warm_spares(self):
+        """Stop all idle warm spares"""
+        for spare in self.warm_spares:
+            try:
+                spare.kill()
+                spare.wait(timeout=5)
+            except Exception as e:
+                logger.warning(f"Error stopping warm spare {spare.pid}: {e}")
+        self.warm_spares = []
+    
     def _handle_output(self, pipe, script_name: str, stream_type: str):
         """Handle script output in separate thread"""
         try:
             for line in iter(pipe.readline, ''):
-                if line.strip():
+                if not line.strip():
+                    continue
+                fields = parse_record(line.strip())
+                if fields is None:
                     logger.info(f"[{script_name}] {stream_type}: {line.strip()}")
+                    continue
+                # A script's own log record: keep its level and fields, under the monitor's name for it
+                level = logging.getLevelName(fields.pop('level', 'INFO'))
+                message = fields.pop('msg', '')
+                extra = {key: value for key, value in fields.items() if key not in RECORD_ATTRS and key != 'ts'}
+                extra['script'] = script_name
+                logger.log(level if isinstance(level, int) else logging.INFO, message, extra=extra)
         except Exception as e:
             logger.error(f"Error handling output for {script_name}: {e}")
     
@@ -218,8 +379,7 @@ class TokenMonitor:
                 "footer": f"Started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Token Monitor v1.0"
             }
             
-            import requests
-            response = requests.post(self.monitor_webhook_url, json=payload)
+            response = self.webhook_session.post(self.monitor_webhook_url, json=payload)
             response.raise_for_status()
             logger.info("Startup notification sent successfully")
         except Exception as e:
@@ -239,8 +399,7 @@ class TokenMonitor:
                 "footer": f"Token Monitor | {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
             }
             
-            import requests
-            response = requests.post(self.monitor_webhook_url, json=payload)
+            response = self.webhook_session.post(self.monitor_webhook_url, json=payload)
             response.raise_for_status()
             logger.info(f"Status notification sent: {title}")
         except Exception as e:
@@ -255,8 +414,7 @@ class TokenMonitor:
                 "footer": f"Token Monitor | {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
             }
             
-            import requests
-            response = requests.post(self.monitor_webhook_url, json=payload)
+            response = self.webhook_session.post(self.monitor_webhook_url, json=payload)
             response.raise_for_status()
             logger.info(f"Script startup notification sent: {script_name}")
         except Exception as e:
@@ -265,13 +423,255 @@ class TokenMonitor:
     def restart_all_scripts(self):
         """Restart all scripts (usually after token refresh)"""
         logger.info("Restarting all scripts due to token refresh...")
-        self.stop_all_scripts()
-        time.sleep(2)  # Give scripts time to fully stop
+        self.stop_all_scripts()  # stop_script waits for each process to exit
         self.start_all_scripts()
         
         # Send token refresh notification
         self.send_status_notification("🔄 Token Refreshed", "New midway token detected! All scripts have been restarted with fresh authentication.")
     
+    def restart_script(self, config: Dict):
+        """Stop and start a single script"""
+        name = config['name']
+        with self.scripts_lock:
+            self.stop_script(name)
+            if self.channel_server:
+                self.channel_server.forget(name)
+            if self.shutdown_event.is_set():
+                return
+            process = self.start_script(config)
+            if process:
+                self.running_scripts[name] = process
+    
+    def start_channel(self):
+        """Start the heartbeat channel server and its deadline watchdog"""
+        try:
+            self.channel_server = ChannelServer()
+            self.channel_server.add_handler('metric', self.metrics.record_message)
+            self.channel_server.add_handler('profile_done', self._log_profile)
+            self.channel_server.start()
+            logger.info(f"Monitor channel listening on {self.channel_server.address}")
+        except OSError as e:
+            logger.error(f"Failed to start monitor channel, heartbeat checks disabled: {e}")
+            self.channel_server = None
+            return
+        
+        threading.Thread(target=self._watch_heartbeats, name="heartbeat-watchdog", daemon=True).start()
+    
+    def send_command(self, name: str, command: str, **args) -> Optional[str]:
+        """Send a control command to a running script; returns an error message if it cannot be reached"""
+        if not self.channel_server:
+            return "monitor channel is not running"
+        with self.scripts_lock:
+            process = self.running_scripts.get(name)
+            if process is None or process.poll() is not None:
+                return f"{name} is not running"
+            heartbeat = self.channel_server.last_heartbeat(name)
+            if not heartbeat or heartbeat.get('pid') != process.pid:
+                return f"{name} has not reported on the monitor channel yet"
+        try:
+            self.channel_server.send_command(heartbeat['addr'], command, **args)
+        except OSError as e:
+            return f"failed to reach {name}: {e}"
+        logger.info(f"Sent {command} command to {name} (pid {process.pid}): {args}")
+        return None
+    
+    def _log_profile(self, message: Dict):
+        logger.info(f"Profile of {message.get('name')} finished with {message.get('samples')} samples: "
+                    f"{', '.join(message.get('files', []))}")
+    
+    def _control_profile(self, query: str):
+        """POST /control/profile?script=NAME[&seconds=N][&cycles=N][&interval_ms=N]"""
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+        name = params.get('script')
+        if not name:
+            return 400, "text/plain", "script is required\n"
+        try:
+            cycles = int(params['cycles']) if 'cycles' in params else None
+            seconds = float(params.get('seconds') or (self.profile_max_seconds if cycles else self.profile_default_seconds))
+            interval_ms = float(params.get('interval_ms') or self.profile_interval_ms)
+        except ValueError:
+            return 400, "text/plain", "seconds, cycles and interval_ms must be numbers\n"
+        seconds = min(seconds, self.profile_max_seconds)
+        
+        error = self.send_command(name, 'profile', seconds=seconds, cycles=cycles,
+                                 interval=interval_ms / 1000, directory=self.profile_dir)
+        if error:
+            return 409, "text/plain", f"{error}\n"
+        what = f"{cycles} cycles (at most {seconds:.0f}s)" if cycles else f"{seconds:.0f}s"
+        return 202, "text/plain", f"Profiling {name} for {what}; the output files are logged when it finishes\n"
+    
+    def _control_heap(self, query: str):
+        """POST /control/heap?script=NAME[&interval_minutes=N][&window_minutes=N][&snapshots=N][&frames=N][&top=N], or &stop=1"""
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+        name = params.get('script')
+        if not name:
+            return 400, "text/plain", "script is required\n"
+        if params.get('stop'):
+            error = self.send_command(name, 'heap', stop=True)
+            return (409, "text/plain", f"{error}\n") if error else (202, "text/plain", f"Stopping allocation tracking in {name}\n")
+        try:
+            interval_minutes = float(params.get('interval_minutes') or self.heap_interval_minutes)
+            # window_minutes=0 traces the whole interval, so an explicit 0 is kept
+            window_minutes = float(params['window_minutes'] if 'window_minutes' in params else self.heap_window_minutes)
+            snapshots = int(params['snapshots']) if 'snapshots' in params else None
+            frames = int(params.get('frames') or self.heap_frames)
+            top = int(params.get('top') or self.heap_top)
+        except ValueError:
+            return 400, "text/plain", "interval_minutes, window_minutes, snapshots, frames and top must be numbers\n"
+        
+        error = self.send_command(name, 'heap', interval=interval_minutes * 60, window=window_minutes * 60,
+                                 snapshots=snapshots, frames=frames, top=top, directory=self.heap_dir)
+        if error:
+            return 409, "text/plain", f"{error}\n"
+        return 202, "text/plain", f"Tracking allocations in {name} every {interval_minutes:g} minutes\n"
+    
+    def _watch_heartbeats(self):
+        """Restart any child that misses its declared heartbeat deadline"""
+        while not self.shutdown_event.wait(self.heartbeat_check_interval):
+            try:
+                for heartbeat in self.channel_server.overdue(self.heartbeat_grace):
+                    self._handle_missed_heartbeat(heartbeat)
+                self._recycle_at_safe_point()
+            except Exception as e:
+                logger.error(f"Error in heartbeat watchdog: {e}")
+    
+    def _handle_missed_heartbeat(self, heartbeat: Dict):
+        name = heartbeat.get('name')
+        config = next((c for c in self.script_configs if c['name'] == name), None)
+        with self.scripts_lock:
+            process = self.running_scripts.get(name)
+            if config is None or process is None or process.pid != heartbeat.get('pid') or process.poll() is not None:
+                # Stale heartbeat from a process that already exited or was replaced
+                self.channel_server.forget(name)
+                return
+            
+            overdue_seconds = time.time() - heartbeat['next_deadline']
+            logger.warning(
+                f"Script {name} missed its heartbeat deadline by {overdue_seconds:.0f}s "
+                f"(phase: {heartbeat.get('phase')}, iteration: {heartbeat.get('iteration')}) - restarting"
+            )
+            self.restart_script(config)
+        
+        self.send_status_notification(
+            f"⚠️ {name} Restarted (Unresponsive)",
+            f"{name} stopped reporting while in phase '{heartbeat.get('phase')}' "
+            f"(iteration {heartbeat.get('iteration')}) and was restarted."
+        )
+    
+    def start_metrics_server(self):
+        """Serve script and token metrics on a local /metrics endpoint, and history queries under /api"""
+        if not self.metrics_port:
+            return
+        try:
+            self.metrics_server = MetricsServer(self.metrics, self.metrics_host, self.metrics_port)
+        except OSError as e:
+            logger.error(f"Failed to start metrics server on {self.metrics_host}:{self.metrics_port}: {e}")
+            return
+        self.metrics.add_collector(self._collect_metrics)
+        self.metrics_server.post_routes['/control/profile'] = self._control_profile
+        self.metrics_server.post_routes['/control/heap'] = self._control_heap
+        query_api = QueryAPI.from_config(self.config)
+        if query_api is not None:
+            query_api.register(self.metrics_server)
+        self.metrics_server.start()
+        logger.info(f"Metrics available at http://{self.metrics_server.address}/metrics")
+        if query_api is not None:
+            logger.info(f"History queries available at http://{self.metrics_server.address}/api")
+    
+    def _collect_metrics(self):
+        """Refresh supervisor-side gauges right before a scrape"""
+        now = time.time()
+        with self.scripts_lock:
+            running = {name: process.pid for name, process in self.running_scripts.items()}
+        
+        with self.metrics.lock:
+            rss = self.metrics.gauge('script_rss_bytes')
+            cpu = self.metrics.gauge('script_cpu_seconds')
+            threads = self.metrics.gauge('script_threads')
+            heartbeat_age = self.metrics.gauge('script_heartbeat_age_seconds')
+            for gauge in (rss, cpu, threads, heartbeat_age):
+                gauge.clear()
+            
+            for name, pid in running.items():
+                history = self.resource_history.get(name)
+                if history and history.pid == pid and history.latest:
+                    rss.set(history.latest.rss_bytes, script=name)
+                    cpu.set(history.latest.cpu_seconds, script=name)
+                    threads.set(history.latest.threads, script=name)
+                heartbeat = self.channel_server.last_heartbeat(name) if self.channel_server else None
+                if heartbeat and heartbeat.get('pid') == pid:
+                    heartbeat_age.set(now - heartbeat['received_at'], script=name)
+            
+            expiry = self.get_token_expiry()
+            if expiry is not None:
+                self.metrics.gauge('token_seconds_to_expiry').set(expiry - now)
+    
+    def start_resource_sampler(self):
+        """Start sampling memory and CPU of every running script"""
+        if not sampling_supported():
+            logger.warning("Resource sampling unavailable: no /proc and psutil is not installed")
+            return
+        threading.Thread(target=self._sample_resources, name="resource-sampler", daemon=True).start()
+    
+    def _sample_resources(self):
+        while not self.shutdown_event.wait(self.resource_sample_interval):
+            try:
+                with self.scripts_lock:
+                    running = {name: process.pid for name, process in self.running_scripts.items()}
+                for name, pid in running.items():
+                    self._record_sample(name, pid)
+                self._recycle_at_safe_point()
+            except Exception as e:
+                logger.error(f"Error sampling script resources: {e}")
+    
+    def _record_sample(self, name: str, pid: int):
+        sample = sample_process(pid)
+        if sample is None:
+            return
+        
+        history = self.resource_history.get(name)
+        if history is None or history.pid != pid:
+            history = ResourceHistory(pid, self.resource_history_size)
+            self.resource_history[name] = history
+        history.add(sample)
+        
+        if name in self.recycle_pending:
+            return
+        
+        rss_mb = sample.rss_bytes / (1024 * 1024)
+        growth = history.rss_growth_mb_per_hour(self.memory_growth_window)
+        if self.memory_ceiling_mb and rss_mb > self.memory_ceiling_mb:
+            reason = f"RSS {rss_mb:.0f} MB above ceiling of {self.memory_ceiling_mb} MB"
+        elif self.memory_growth_limit and growth is not None and growth > self.memory_growth_limit:
+            reason = f"RSS growing {growth:.1f} MB/hour (limit {self.memory_growth_limit} MB/hour, now {rss_mb:.0f} MB)"
+        else:
+            return
+        
+        logger.warning(f"Script {name} scheduled for recycling: {reason}")
+        self.recycle_pending[name] = (pid, reason)
+    
+    def _recycle_at_safe_point(self):
+        """Restart scripts flagged for recycling once they are idle between cycles"""
+        for name, (pid, reason) in list(self.recycle_pending.items()):
+            config = next((c for c in self.script_configs if c['name'] == name), None)
+            with self.scripts_lock:
+                process = self.running_scripts.get(name)
+                if config is None or process is None or process.pid != pid:
+                    # Already stopped or restarted for another reason
+                    self.recycle_pending.pop(name, None)
+                    continue
+                
+                # Scripts that never heartbeat have no known safe point, so recycle them right away
+                heartbeat = self.channel_server.last_heartbeat(name) if self.channel_server else None
+                if heartbeat and heartbeat.get('pid') == process.pid and heartbeat.get('phase') != 'sleep':
+                    continue
+                
+                logger.info(f"Recycling script {name}: {reason}")
+                self.recycle_pending.pop(name, None)
+                self.restart_script(config)
+            
+            self.send_status_notification(f"♻️ {name} Recycled", f"{name} was restarted between cycles: {reason}")
+    
     def check_script_health(self):
         """Check if scripts are still running and restart if needed"""
         for config in self.script_configs:
@@ -298,31 +698,37 @@ class TokenMonitor:
         # Initial token check
         self.last_token_time = self.get_token_modification_time()
         
+        self.start_channel()
+        self.start_resource_sampler()
+        self.start_metrics_server()
+        
         # Start scripts if token is valid
         if self.is_token_valid():
-            self.start_all_scripts()
+            with self.scripts_lock:
+                self.start_all_scripts()
         else:
             logger.warning("Token is invalid or missing. Please run 'mwinit -o' to authenticate.")
         
         while not self.shutdown_event.is_set():
             try:
-                current_token_time = self.get_token_modification_time()
-                
-                # Check if token file has been updated
-                if current_token_time > self.last_token_time:
-                    logger.info("New token detected!")
-                    self.last_token_time = current_token_time
+                with self.scripts_lock:
+                    current_token_time = self.get_token_modification_time()
                     
-                    # Restart all scripts with new token
-                    self.restart_all_scripts()
-                
-                # Check script health
-                self.check_script_health()
-                
-                # Check token validity
-                if not self.is_token_valid() and self.running_scripts:
-                    logger.warning("Token has expired. Stopping all scripts.")
-                    self.stop_all_scripts()
+                    # Check if token file has been updated
+                    if current_token_time > self.last_token_time:
+                        logger.info("New token detected!")
+                        self.last_token_time = current_token_time
+                        
+                        # Restart all scripts with new token
+                        self.restart_all_scripts()
+                    
+                    # Check script health
+                    self.check_script_health()
+                    
+                    # Check token validity
+                    if not self.is_token_valid() and self.running_scripts:
+                        logger.warning("Token has expired. Stopping all scripts.")
+                        self.stop_all_scripts()
                 
                 # Wait before next check
                 self.shutdown_event.wait(30)  # Check every 30 seconds
@@ -344,7 +750,13 @@ class TokenMonitor:
         """Shutdown the monitor and all scripts"""
         logger.info("Shutting down token monitor...")
         self.shutdown_event.set()
-        self.stop_all_scripts()
+        with self.scripts_lock:
+            self.stop_all_scripts()
+        self.stop_warm_spares()
+        if self.channel_server:
+            self.channel_server.stop()
+        if self.metrics_server:
+            self.metrics_server.stop()
         logger.info("Token monitor shutdown complete")
 
 
@@ -364,8 +776,12 @@ def main():
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
+    config = load_config()
+    setup_logging(config, "token_monitor", get_setting(config, 'monitoring', 'log_file', 'token_monitor.log'),
+                  structured_console=False)
+
     # Create monitor instance
-    monitor = TokenMonitor()
+    monitor = TokenMonitor(config)
     
     # Add your script configurations here
     script_dir = os.path.dirname(os.path.abspath(__file__))
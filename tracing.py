@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import argparse
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+# Set by the token monitor to trace_<name>.jsonl under config.json monitoring.trace_dir, one file per script
+TRACE_FILE_ENV = "MONITOR_TRACE_FILE"
+
+
+class _NullSpan:
+    """Stand-in returned while tracing is disabled; every operation is a no-op"""
+
+    def set(self, **attrs):
+        pass
+
+    def finish(self, error: str = None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed stage of a report cycle, nested under the span that was active when it started"""
+
+    __slots__ = ('tracer', 'name', 'attrs', 'trace_id', 'span_id', 'parent_id', 'start', 'started', 'finished')
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict, parent: Optional["Span"]):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.finished = False
+
+    def set(self, **attrs):
+        """Attach sizes or other details, e.g. bytes fetched or rows parsed"""
+        self.attrs.update(attrs)
+
+    def finish(self, error: str = None):
+        if self.finished:
+            return
+        self.finished = True
+        duration = time.perf_counter() - self.started
+        self.tracer._pop(self)
+        record = {
+            'trace': self.trace_id,
+            'span': self.span_id,
+            'parent': self.parent_id,
+            'name': self.name,
+            'script': self.tracer.script,
+            'start': round(self.start, 6),
+            'duration': round(duration, 6),
+            'attrs': self.attrs,
+        }
+        if error:
+            record['error'] = error
+        self.tracer._write(record)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(error=f"{exc_type.__name__}: {exc}" if exc_type else None)
+        return False
+
+
+class Tracer:
+    """Writes nested spans as JSON lines; costs one attribute check per span when disabled"""
+
+    def __init__(self, path: str = None, script: str = None):
+        self.path = path if path is not None else os.environ.get(TRACE_FILE_ENV)
+        self.enabled = bool(self.path)
+        self.script = script or os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.file = None
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def _pop(self, span: Span):
+        stack = self._stack()
+        if span in stack:
+            del stack[stack.index(span):]
+
+    def _write(self, record: Dict):
+        line = json.dumps(record, default=str) + "\n"
+        with self.lock:
+            try:
+                if self.file is None:
+                    self.file = open(self.path, "a", encoding="utf-8", buffering=1)
+                self.file.write(line)
+            except OSError:
+                # Tracing must never break the report it is measuring
+                self.enabled = False
+
+    def span(self, name: str, **attrs):
+        """Start a span for use in a with block"""
+        if not self.enabled:
+            return NULL_SPAN
+        stack = self._stack()
+        span = Span(self, name, attrs, stack[-1] if stack else None)
+        stack.append(span)
+        return span
+
+    # Same as span(), reads better where the stage is finished explicitly with finish()
+    start_span = span
+
+
+# Shared tracer used by the monitored scripts
+tracer = Tracer()
+span = tracer.span
+start_span = tracer.start_span
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def load_spans(paths: List[str]) -> List[Dict]:
+    spans = []
+    for path in paths:
+        with open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        spans.append(json.loads(line))
+                    except ValueError:
+                        continue
+    return spans
+
+
+def analyze(spans: List[Dict], slowest: int = 10) -> str:
+    """Per-stage percentiles plus the slowest cycles with their stage breakdown"""
+    by_stage = defaultdict(list)
+    children = defaultdict(list)
+    roots = []
+    for s in spans:
+        by_stage[(s.get('script'), s['name'])].append(s['duration'])
+        if s.get('parent'):
+            children[s['parent']].append(s)
+        else:
+            roots.append(s)
+
+    lines = ["Per-stage durations (seconds)", ""]
+    lines.append(f"{'script':<20} {'stage':<22} {'count':>6} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9} {'total':>10}")
+    ranked = sorted(by_stage.items(), key=lambda item: sum(item[1]), reverse=True)
+    for (script, stage), durations in ranked:
+        durations.sort()
+        lines.append(
+            f"{str(script):<20} {stage:<22} {len(durations):>6} "
+            f"{percentile(durations, 50):>9.3f} {percentile(durations, 90):>9.3f} "
+            f"{percentile(durations, 99):>9.3f} {durations[-1]:>9.3f} {sum(durations):>10.2f}"
+        )
+
+    lines += ["", f"Slowest {slowest} cycles", ""]
+    for root in sorted(roots, key=lambda s: s['duration'], reverse=True)[:slowest]:
+        started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(root['start']))
+        attrs = " ".join(f"{k}={v}" for k, v in root.get('attrs', {}).items())
+        lines.append(f"{root['duration']:>9.3f}s  {root.get('script')} {root['name']} @ {started} {attrs}".rstrip())
+        _append_children(lines, children, root['span'], depth=1)
+    return "\n".join(lines)
+
+
+def _append_children(lines: List[str], children: Dict, span_id: str, depth: int):
+    for child in sorted(children.get(span_id, []), key=lambda s: s['start']):
+        attrs = " ".join(f"{k}={v}" for k, v in child.get('attrs', {}).items())
+        error = f" ERROR: {child['error']}" if child.get('error') else ""
+        lines.append(f"{child['duration']:>9.3f}s  {'  ' * depth}{child['name']} {attrs}{error}".rstrip())
+        _append_children(lines, children, child['span'], depth + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize report pipeline traces")
+    parser.add_argument("trace_files", nargs="+", help="JSONL trace files written by the scripts")
+    parser.add_argument("--slowest", type=int, default=10, help="Number of slowest cycles to show")
+    args = parser.parse_args()
+    print(analyze(load_spans(args.trace_files), args.slowest))
+
+
+if __name__ == "__main__":
+    main()
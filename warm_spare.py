@@ -0,0 +1,58 @@
+import os
+import sys
+import json
+import runpy
+import importlib
+
+# Modules the monitored scripts spend most of their startup importing
+PRELOAD_MODULES = [
+    "requests",
+    "requests_kerberos",
+    "urllib3",
+    "pandas",
+    "pendulum",
+    "bs4",
+    "tabulate",
+]
+
+
+def preload_modules():
+    """Import the heavy dependencies so an activated script starts instantly"""
+    for module_name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            print(f"Warm spare could not preload {module_name}: {e}", file=sys.stderr)
+
+
+def wait_for_activation():
+    """Block until the supervisor sends the script to run, or closes the pipe"""
+    line = sys.stdin.readline()
+    if not line.strip():
+        return None
+    return json.loads(line)
+
+
+def run_script(request):
+    """Turn this standby interpreter into the requested script"""
+    script_path = request['script_path']
+    working_dir = request.get('working_dir') or os.path.dirname(script_path)
+
+    os.chdir(working_dir)
+    os.environ.update(request.get('env_vars', {}))
+    sys.argv = [script_path] + request.get('args', [])
+    sys.path[0] = os.path.dirname(os.path.abspath(script_path))
+
+    runpy.run_path(script_path, run_name="__main__")
+
+
+def main():
+    preload_modules()
+    request = wait_for_activation()
+    if request is None:
+        return
+    run_script(request)
+
+
+if __name__ == "__main__":
+    main()